@@ -0,0 +1,71 @@
+"""
+Shared runtime for the agents in agents/: LLM client registry, response cache,
+model cascades, semantic answer cache, run admission and deadlines, node helpers and metrics, bounded conversation state, local classifier, graph loading and local fakes.
+
+Only the light modules are imported with the package; the names in `_LAZY`
+are resolved on first access, so importing the package (or a submodule such
+as `deadline`) does not pull in langchain, numpy or the embedding model until
+an agent actually asks for them. `metrics` and `admission` stay eager: they
+are also submodule names, and a lazy lookup would return the module once
+another submodule had imported it.
+"""
+import importlib
+
+from .admission import AdmissionController, admission
+from .deadline import DeadlineExceeded, with_deadline
+from .metrics import Metrics, metrics
+
+_LAZY = {
+    "ResponseCache": "cache",
+    "Cascade": "cascade",
+    "get_cascade": "cascade",
+    "TextClassifier": "classifier",
+    "FakeChatModel": "fake",
+    "load_graph": "graphs",
+    "LLMRegistry": "llm",
+    "ManagedChatModel": "llm",
+    "ModelGate": "llm",
+    "get_llm": "llm",
+    "registry": "llm",
+    "dual": "nodes",
+    "instrument": "nodes",
+    "SemanticCache": "semantic",
+    "semantic_cache": "semantic",
+}
+
+__all__ = [
+    "AdmissionController",
+    "Cascade",
+    "DeadlineExceeded",
+    "FakeChatModel",
+    "LLMRegistry",
+    "ManagedChatModel",
+    "Metrics",
+    "ModelGate",
+    "ResponseCache",
+    "SemanticCache",
+    "TextClassifier",
+    "admission",
+    "dual",
+    "get_cascade",
+    "get_llm",
+    "instrument",
+    "load_graph",
+    "metrics",
+    "registry",
+    "semantic_cache",
+    "with_deadline",
+]
+
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
@@ -0,0 +1,309 @@
+"""
+Admission control for runs: per-graph limits on runs in flight and queued,
+fast 429s instead of unbounded queues, short graphs first.
+
+`AdmissionMiddleware` is an ASGI middleware on the server's custom app
+(webapp.py), which the LangGraph server applies to all of its routes. It
+holds the run requests (POST /runs, /runs/stream, /runs/wait and the same
+under /threads/{thread_id}/) and lets everything else through untouched.
+The graph comes from the request's `assistant_id`: a graph id, or the id of
+a graph's default assistant; other assistants count as "assistant".
+
+A run request gets a slot when both its graph and the server are under their
+limit, and holds it until its response has been sent (a streamed run holds
+it until the end of the stream). Otherwise it waits in its graph's queue,
+unless it is shed right away with a 429 and a Retry-After estimate:
+
+- queue_full: the graph already has `queue` requests waiting,
+- wait_too_long: the expected wait is longer than ADMISSION_MAX_WAIT,
+- timeout: it has waited ADMISSION_MAX_WAIT without getting a slot.
+
+When a slot frees up it goes to the graph whose runs are expected to be the
+shortest (moving average of its recent run durations), so interactive graphs
+like tool_agent get ahead of fan-out graphs like orchestrator_worker;
+`priority` (lower first) overrides that order. A background run
+(POST .../runs) only holds its slot while it is being created: its execution
+is left to the server's own run queue.
+
+    ADMISSION=1                 0 lets every request through
+    ADMISSION_MAX_RUNS=64       runs in flight in this server, all graphs (0 = unlimited)
+    ADMISSION_CONCURRENCY=0     default per-graph runs in flight (0 = only the server limit)
+    ADMISSION_QUEUE=100         default per-graph queued requests
+    ADMISSION_MAX_WAIT=30       seconds a request may wait for a slot
+    ADMISSION_LIMITS='{"orchestrator_worker": {"concurrency": 8, "queue": 16, "priority": 1}}'
+
+Limits are per server process: with several workers (api_watcher's
+supervisor mode) each one applies them to its own share of the traffic.
+"""
+import asyncio
+import json
+import math
+import os
+import re
+import time
+from collections import deque
+from typing import Optional
+from uuid import UUID, uuid5
+
+from .metrics import SECONDS_BUCKETS, Histogram
+
+# Default assistants are created as uuid5(NAMESPACE_GRAPH, graph_id) (langgraph_api.graph)
+NAMESPACE_GRAPH = UUID("6ba7b821-9dad-11d1-80b4-00c04fd430c8")
+# `attached`: /stream and /wait hold the request for the whole run, a plain POST .../runs only creates it
+RUN_PATH = re.compile(r"^/(?:threads/[^/]+/)?runs(?P<attached>/stream|/wait)?/?$")
+OUTCOMES = ("admitted", "queue_full", "wait_too_long", "timeout", "disconnected")
+# Weight of the latest run in a graph's expected duration
+EWMA_ALPHA = 0.2
+
+
+class Shed(Exception):
+    def __init__(self, graph: str, reason: str, retry_after: int):
+        super().__init__(f"{graph}: {reason}")
+        self.graph = graph
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Graph:
+    """Limits, queue and counters of one graph."""
+
+    def __init__(self, name: str, concurrency: int, queue: int, priority: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_limit = queue
+        self.priority = priority
+        self.in_flight = 0
+        self.queue: deque[asyncio.Future] = deque()
+        self.expected = 0.0  # seconds, 0 until a run has finished
+        self.wait = Histogram(SECONDS_BUCKETS)
+        self.outcomes = dict.fromkeys(OUTCOMES, 0)
+
+    def has_room(self) -> bool:
+        return not self.concurrency or self.in_flight < self.concurrency
+
+
+class AdmissionController:
+    """Slots and queues; runs on the server's event loop, so no lock."""
+
+    def __init__(self, max_runs: int = 64, concurrency: int = 0, queue: int = 100, max_wait: float = 30.0,
+                 limits: Optional[dict] = None, enabled: bool = True):
+        self.enabled = enabled
+        self.max_runs = max_runs
+        self.concurrency = concurrency
+        self.queue = queue
+        self.max_wait = max_wait
+        self.limits = limits or {}
+        self.in_flight = 0
+        self._graphs: dict[str, _Graph] = {}
+        self._known: dict[str, str] = {}  # default assistant id -> graph id
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        return cls(
+            max_runs=int(os.environ.get("ADMISSION_MAX_RUNS", "64")),
+            concurrency=int(os.environ.get("ADMISSION_CONCURRENCY", "0")),
+            queue=int(os.environ.get("ADMISSION_QUEUE", "100")),
+            max_wait=float(os.environ.get("ADMISSION_MAX_WAIT", "30")),
+            limits=json.loads(os.environ.get("ADMISSION_LIMITS") or "{}"),
+            enabled=os.environ.get("ADMISSION", "1") != "0",
+        )
+
+    def graph(self, name: str) -> _Graph:
+        g = self._graphs.get(name)
+        if g is None:
+            limits = self.limits.get(name, {})
+            g = self._graphs[name] = _Graph(
+                name,
+                concurrency=int(limits.get("concurrency", self.concurrency)),
+                queue=int(limits.get("queue", self.queue)),
+                priority=int(limits.get("priority", 0)),
+            )
+        return g
+
+    def graph_of(self, assistant_id: Optional[str]) -> str:
+        if not assistant_id:
+            return "assistant"
+        if not self._known:
+            from .graphs import graph_specs
+
+            self._known = {str(uuid5(NAMESPACE_GRAPH, name)): name for name in graph_specs()}
+        if assistant_id in self._known.values():
+            return assistant_id
+        return self._known.get(assistant_id, "assistant")
+
+    def _has_room(self, g: _Graph) -> bool:
+        return g.has_room() and (not self.max_runs or self.in_flight < self.max_runs)
+
+    def _retry_after(self, g: _Graph, ahead: int) -> int:
+        """Seconds until a request behind `ahead` others of its graph would likely get a slot."""
+        slots = g.concurrency or self.max_runs or 1
+        return max(1, math.ceil((ahead // slots + 1) * (g.expected or 1.0)))
+
+    def _grant(self, g: _Graph) -> None:
+        g.in_flight += 1
+        self.in_flight += 1
+
+    def _dispatch(self) -> None:
+        """Hand free slots to queued requests, shortest expected runs first."""
+        while not self.max_runs or self.in_flight < self.max_runs:
+            ready = [g for g in self._graphs.values() if g.queue and g.has_room()]
+            if not ready:
+                return
+            g = min(ready, key=lambda g: (g.priority, g.expected))
+            waiter = g.queue.popleft()
+            self._grant(g)
+            waiter.set_result(None)
+
+    async def acquire(self, name: str) -> float:
+        """Wait for a slot of `name`; returns the seconds waited, raises Shed."""
+        g = self.graph(name)
+        if not g.queue and self._has_room(g):
+            self._grant(g)
+            g.outcomes["admitted"] += 1
+            g.wait.observe(0.0)
+            return 0.0
+        ahead = len(g.queue)
+        if ahead >= g.queue_limit:
+            g.outcomes["queue_full"] += 1
+            raise Shed(name, "queue_full", self._retry_after(g, ahead))
+        slots = g.concurrency or self.max_runs or 1
+        if g.expected and (ahead // slots + 1) * g.expected > self.max_wait:
+            g.outcomes["wait_too_long"] += 1
+            raise Shed(name, "wait_too_long", self._retry_after(g, ahead))
+        started = time.monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        g.queue.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.max_wait)
+        except asyncio.TimeoutError:
+            if not waiter.done():
+                g.queue.remove(waiter)
+                g.outcomes["timeout"] += 1
+                raise Shed(name, "timeout", self._retry_after(g, len(g.queue))) from None
+        except asyncio.CancelledError:
+            if waiter.done():
+                self.release(name)
+            else:
+                g.queue.remove(waiter)
+            g.outcomes["disconnected"] += 1
+            raise
+        waited = time.monotonic() - started
+        g.outcomes["admitted"] += 1
+        g.wait.observe(waited)
+        return waited
+
+    def release(self, name: str, seconds: Optional[float] = None) -> None:
+        """Free the slot taken by acquire(); `seconds` is how long the run held it."""
+        g = self._graphs[name]
+        g.in_flight -= 1
+        self.in_flight -= 1
+        if seconds is not None:
+            g.expected = seconds if not g.expected else g.expected + EWMA_ALPHA * (seconds - g.expected)
+        self._dispatch()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "in_flight": self.in_flight,
+            "max_runs": self.max_runs,
+            "graphs": {
+                name: {
+                    "in_flight": g.in_flight,
+                    "queued": len(g.queue),
+                    "concurrency": g.concurrency,
+                    "queue_limit": g.queue_limit,
+                    "priority": g.priority,
+                    "expected_seconds": round(g.expected, 3),
+                    "outcomes": dict(g.outcomes),
+                    "wait_seconds": g.wait.summary(),
+                }
+                for name, g in sorted(self._graphs.items())
+            },
+        }
+
+    def histograms(self) -> list[tuple[dict, Histogram]]:
+        return [({"graph": name}, g.wait) for name, g in sorted(self._graphs.items())]
+
+
+admission = AdmissionController.from_env()
+
+
+async def _read_body(receive) -> tuple[bytes, Optional[dict]]:
+    body, message = b"", {"more_body": True}
+    while message.get("more_body"):
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return body, message
+        body += message.get("body", b"")
+    return body, None
+
+
+async def _reject(send, shed: Shed) -> None:
+    payload = json.dumps({
+        "detail": f"Too many runs of {shed.graph} ({shed.reason}), retry in {shed.retry_after}s",
+        "graph": shed.graph,
+        "reason": shed.reason,
+        "retry_after": shed.retry_after,
+    }).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 429,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(payload)).encode()),
+            (b"retry-after", str(shed.retry_after).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": payload})
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying `controller` (the process-wide `admission` by default) to run requests."""
+
+    def __init__(self, app, controller: Optional[AdmissionController] = None):
+        self.app = app
+        self.controller = controller or admission
+
+    async def __call__(self, scope, receive, send):
+        controller = self.controller
+        if scope["type"] != "http" or scope["method"] != "POST" or not controller.enabled:
+            return await self.app(scope, receive, send)
+        run = RUN_PATH.match(scope["path"])
+        if run is None:
+            return await self.app(scope, receive, send)
+        body, disconnect = await _read_body(receive)
+        if disconnect is not None:
+            return
+        try:
+            assistant_id = json.loads(body or b"{}").get("assistant_id")
+        except (ValueError, AttributeError):
+            assistant_id = None  # the server answers the malformed request itself
+        graph = controller.graph_of(assistant_id if isinstance(assistant_id, str) else None)
+
+        # A client that goes away while queued gives its place up
+        watch = asyncio.ensure_future(receive())
+        acquire = asyncio.ensure_future(controller.acquire(graph))
+        done, _ = await asyncio.wait({watch, acquire}, return_when=asyncio.FIRST_COMPLETED)
+        if acquire not in done:
+            acquire.cancel()
+            await asyncio.gather(acquire, return_exceptions=True)
+            return
+        try:
+            acquire.result()
+        except Shed as shed:
+            watch.cancel()
+            return await _reject(send, shed)
+        pending = [{"type": "http.request", "body": body, "more_body": False}]
+
+        async def replay():
+            if pending:
+                return pending.pop()
+            return await watch
+
+        started = time.monotonic()
+        try:
+            await self.app(scope, replay, send)
+        finally:
+            watch.cancel()
+            # Only attached runs tell how long the graph runs; a background create returns at once
+            controller.release(graph, time.monotonic() - started if run["attached"] else None)
@@ -0,0 +1,267 @@
+"""
+Offline batch runner: replay a JSONL file through any graph of langgraph.json,
+without the HTTP server.
+
+    python -m agent_runtime.batch routing requests.jsonl -o out.jsonl [--concurrency 64] [--field body]
+
+Input rows are read lazily, one line at a time. Each row becomes a graph input:
+- {"input": {...}}: used as is,
+- {"messages": [...]}: used as is,
+- otherwise the text of `--field` (default: the first of text / prompt / query /
+  content / body) becomes a single user message.
+
+Runs go through `app.ainvoke` with at most `--concurrency` in flight; provider
+quotas are enforced by the shared LLM registry (LLM_RPM / LLM_TPM /
+LLM_MAX_CONCURRENCY), so a high concurrency keeps them saturated without going over.
+
+Every completed row is appended to the output as soon as it finishes:
+
+    {"line": 12, "id": "user-003", "input_hash": "...", "output": "...", "latency_ms": 812.4}
+
+(`error` instead of `output` when the run failed, `deduplicated: true` when the
+result was copied from an identical input). The output file is also the resume
+journal: rerunning the same command skips the lines that already have an
+`output` and retries the failed ones, so for a line the last row wins.
+
+Identical inputs (same graph input and configurable) run once; the others get
+a copy of the result, including across resumes.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from .graphs import CONFIG, load_graph
+
+TEXT_FIELDS = ("text", "prompt", "query", "content", "body")
+ID_FIELDS = ("id", "request_id")
+
+
+def graph_input(row: Any, field: Optional[str] = None) -> dict:
+    if isinstance(row, str):
+        return {"messages": [{"role": "user", "content": row}]}
+    if not isinstance(row, dict):
+        raise ValueError(f"expected a JSON object or string, got {type(row).__name__}")
+    if isinstance(row.get("input"), dict):
+        return row["input"]
+    if "messages" in row:
+        return {"messages": row["messages"]}
+    fields = (field,) if field else TEXT_FIELDS
+    for name in fields:
+        if isinstance(row.get(name), str):
+            return {"messages": [{"role": "user", "content": row[name]}]}
+    raise ValueError(f"no input: expected 'input', 'messages' or one of {', '.join(fields)}")
+
+
+def input_hash(payload: dict, configurable: dict) -> str:
+    data = json.dumps([payload, configurable], sort_keys=True, default=str)
+    return hashlib.sha256(data.encode()).hexdigest()[:32]
+
+
+def final_output(state: Any) -> Any:
+    """Content of the last message, or the whole state when the graph has no messages."""
+    if isinstance(state, dict) and state.get("messages"):
+        message = state["messages"][-1]
+        return getattr(message, "content", message)
+    return state
+
+
+def read_rows(path: Path) -> Iterator[tuple[int, Any]]:
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if line.strip():
+                yield number, line
+
+
+class Journal:
+    """Append-only JSONL output, also read back to resume an interrupted job."""
+
+    def __init__(self, path: Path, dedup_entries: int):
+        self.path = path
+        self.completed: set[int] = set()
+        self.results: OrderedDict[str, Any] = OrderedDict()
+        self.dedup_entries = dedup_entries
+        if path.exists():
+            self._load()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _load(self) -> None:
+        valid_bytes = 0
+        with open(self.path, "rb") as f:
+            for raw in f:
+                try:
+                    row = json.loads(raw)
+                except ValueError:
+                    break  # torn last line of a killed job
+                valid_bytes += len(raw)
+                if "output" in row:
+                    self.completed.add(row["line"])
+                    self.remember(row["input_hash"], row["output"])
+        # Drop a torn tail so the next append starts on a fresh line
+        if valid_bytes < self.path.stat().st_size:
+            with open(self.path, "r+b") as f:
+                f.truncate(valid_bytes)
+
+    def remember(self, key: str, output: Any) -> None:
+        self.results[key] = output
+        self.results.move_to_end(key)
+        while len(self.results) > self.dedup_entries:
+            self.results.popitem(last=False)
+
+    def write(self, row: dict) -> None:
+        self._file.write(json.dumps(row, default=str, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class BatchRunner:
+    def __init__(
+        self,
+        app: Any,
+        journal: Journal,
+        concurrency: int = 32,
+        configurable: Optional[dict] = None,
+        field: Optional[str] = None,
+        dedup: bool = True,
+    ):
+        self.app = app
+        self.journal = journal
+        self.concurrency = concurrency
+        self.configurable = configurable or {}
+        self.field = field
+        self.dedup = dedup
+        # input_hash -> rows waiting for the in-flight run of the same input
+        self.waiting: dict[str, list[dict]] = {}
+        self.counts = {"read": 0, "skipped": 0, "ran": 0, "deduplicated": 0, "errors": 0}
+        self.started = time.monotonic()
+        self._last_report = 0.0
+
+    async def run(self, rows: Iterator[tuple[int, str]]) -> dict:
+        # Sync nodes run in the loop's default executor (min(32, cpus + 4) threads),
+        # which would otherwise cap concurrency for graphs without async nodes
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(self.concurrency))
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        workers = [asyncio.create_task(self._worker(queue)) for _ in range(self.concurrency)]
+        try:
+            for number, line in rows:
+                self.counts["read"] += 1
+                if number in self.journal.completed:
+                    self.counts["skipped"] += 1
+                    continue
+                job = self._job(number, line)
+                if job is not None:
+                    await queue.put(job)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+        self._report(force=True)
+        return self.counts
+
+    def _job(self, number: int, line: str) -> Optional[dict]:
+        base = {"line": number}
+        try:
+            row = json.loads(line)
+            if isinstance(row, dict):
+                base["id"] = next((row[k] for k in ID_FIELDS if k in row), None)
+            payload = graph_input(row, self.field)
+        except ValueError as e:
+            self._finish({**base, "input_hash": None, "error": f"bad input: {e}"})
+            return None
+        key = input_hash(payload, self.configurable)
+        job = {**base, "input_hash": key}
+        if self.dedup:
+            if key in self.journal.results:
+                self._finish({**job, "output": self.journal.results[key], "deduplicated": True})
+                return None
+            if key in self.waiting:
+                self.waiting[key].append(job)
+                return None
+            self.waiting[key] = []
+        return {**job, "payload": payload}
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        config = {"configurable": self.configurable}
+        while (job := await queue.get()) is not None:
+            payload = job.pop("payload")
+            started = time.monotonic()
+            try:
+                state = await self.app.ainvoke(payload, config)
+                result = {"output": final_output(state)}
+            except Exception as e:  # noqa: BLE001 - a failed row must not stop the batch
+                result = {"error": f"{type(e).__name__}: {e}"}
+            latency = round((time.monotonic() - started) * 1000, 1)
+            self.counts["ran"] += 1
+            self._finish({**job, **result, "latency_ms": latency})
+            followers = self.waiting.pop(job["input_hash"], [])
+            if "output" in result:
+                self.journal.remember(job["input_hash"], result["output"])
+            for follower in followers:
+                self._finish({**follower, **result, "deduplicated": True})
+
+    def _finish(self, row: dict) -> None:
+        if row.get("deduplicated"):
+            self.counts["deduplicated"] += 1
+        if "error" in row:
+            self.counts["errors"] += 1
+        self.journal.write(row)
+        self._report()
+
+    def _report(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._last_report < 5:
+            return
+        self._last_report = now
+        elapsed = now - self.started
+        done = self.counts["ran"] + self.counts["deduplicated"]
+        print(
+            f"[batch] {self.counts['read']} read, {self.counts['skipped']} already done, "
+            f"{self.counts['ran']} ran, {self.counts['deduplicated']} deduplicated, "
+            f"{self.counts['errors']} errors, {done / elapsed if elapsed else 0:.1f} rows/s",
+            file=sys.stderr,
+            flush=True,
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("graph", help="graph id from langgraph.json")
+    parser.add_argument("input", type=Path, help="JSONL file, one request per line")
+    parser.add_argument("-o", "--output", type=Path, help="JSONL results / resume journal (default: <input>.<graph>.out.jsonl)")
+    parser.add_argument("--config", type=Path, default=CONFIG, help="langgraph.json to load the graph from")
+    parser.add_argument("--concurrency", type=int, default=int(os.environ.get("BATCH_CONCURRENCY", "32")))
+    parser.add_argument("--field", help="input field holding the user text")
+    parser.add_argument("--configurable", type=json.loads, default={}, help='JSON, e.g. \'{"voting_mode": "quorum"}\'')
+    parser.add_argument("--no-dedup", dest="dedup", action="store_false", help="run identical inputs separately")
+    parser.add_argument("--dedup-entries", type=int, default=100_000, help="results kept for deduplication")
+    args = parser.parse_args(argv)
+
+    output = args.output or args.input.with_name(f"{args.input.stem}.{args.graph}.out.jsonl")
+    journal = Journal(output, args.dedup_entries)
+    if journal.completed:
+        print(f"[batch] resuming: {len(journal.completed)} lines already in {output}", file=sys.stderr)
+    app = load_graph(args.graph, args.config)
+    runner = BatchRunner(app, journal, args.concurrency, args.configurable, args.field, args.dedup)
+    try:
+        counts = asyncio.run(runner.run(read_rows(args.input)))
+    except KeyboardInterrupt:
+        print(f"[batch] interrupted; rerun the same command to resume from {output}", file=sys.stderr)
+        return 130
+    finally:
+        journal.close()
+    return 1 if counts["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""
+Exact-match LLM response cache.
+
+Keys are a hash of (model, params, normalized prompt). Entries live in an
+in-memory LRU bounded by entry count and bytes, expire after a TTL, and can be
+mirrored to SQLite so they survive server restarts:
+
+    LLM_CACHE=1                     global switch (0 disables every cache lookup)
+    LLM_CACHE_TTL=3600              seconds, 0 = never expire
+    LLM_CACHE_MAX_ENTRIES=10000
+    LLM_CACHE_MAX_BYTES=67108864
+    LLM_CACHE_PATH=/data/llm_cache.sqlite   optional persistent backend
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+
+
+def normalize_prompt(input: Any) -> Any:
+    """Whitespace-insensitive, JSON-serializable form of a str / message list / PromptValue."""
+    if isinstance(input, str):
+        return " ".join(input.split())
+    if hasattr(input, "to_messages"):
+        input = input.to_messages()
+    normalized = []
+    for m in input:
+        if isinstance(m, dict):
+            role, content = m.get("role") or m.get("type"), m.get("content", "")
+        elif isinstance(m, (tuple, list)):
+            role, content = m
+        else:
+            role, content = m.type, m.content
+        if isinstance(content, str):
+            content = " ".join(content.split())
+        normalized.append([role, content])
+    return normalized
+
+
+def cache_key(model: str, params: dict, input: Any) -> str:
+    payload = json.dumps([model, params, normalize_prompt(input)], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class SQLiteBackend:
+    def __init__(self, path: str, max_entries: int):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL, accessed REAL NOT NULL)"
+        )
+        self._writes = 0
+
+    def get(self, key: str) -> Optional[tuple[str, Optional[float]]]:
+        with self._lock:
+            row = self._db.execute("SELECT value, expires FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+            return row
+
+    def put(self, key: str, value: str, expires: Optional[float]) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, value, expires, time.time())
+            )
+            self._writes += 1
+            if self._writes % 256 == 0:
+                self._prune()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def _prune(self) -> None:
+        self._db.execute("DELETE FROM responses WHERE expires IS NOT NULL AND expires < ?", (time.time(),))
+        self._db.execute(
+            "DELETE FROM responses WHERE key IN "
+            "(SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+
+
+class ResponseCache:
+    """LRU + TTL cache of AI messages, optionally backed by SQLite."""
+
+    def __init__(
+        self,
+        ttl: float = 3600,
+        max_entries: int = 10000,
+        max_bytes: int = 64 * 1024 * 1024,
+        path: Optional[str] = None,
+        enabled: bool = True,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.backend = SQLiteBackend(path, max_entries * 10) if path else None
+        self._entries: OrderedDict[str, tuple[str, Optional[float]]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache":
+        return cls(
+            ttl=float(os.environ.get("LLM_CACHE_TTL", "3600")),
+            max_entries=int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "10000")),
+            max_bytes=int(os.environ.get("LLM_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+            path=os.environ.get("LLM_CACHE_PATH") or None,
+            enabled=os.environ.get("LLM_CACHE", "1") not in ("0", "false", "off"),
+        )
+
+    def _store(self, key: str, value: str, expires: Optional[float]) -> None:
+        """Insert into the in-memory LRU. Caller holds the lock."""
+        if key in self._entries:
+            self._bytes -= len(self._entries.pop(key)[0])
+        self._entries[key] = (value, expires)
+        self._bytes += len(value)
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, (old, _) = self._entries.popitem(last=False)
+            self._bytes -= len(old)
+            self.evictions += 1
+
+    def get(self, key: str) -> Optional[BaseMessage]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None and self.backend is not None:
+            entry = self.backend.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > now):
+                with self._lock:
+                    self._store(key, *entry)
+        if entry is not None and entry[1] is not None and entry[1] <= now:
+            self._expire(key)
+            entry = None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        message = messages_from_dict([json.loads(entry[0])])[0]
+        # Fresh id so add_messages appends the reply instead of replacing an earlier one
+        message.id = None
+        message.response_metadata = {**message.response_metadata, "cache_hit": True}
+        return message
+
+    def _expire(self, key: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= len(self._entries.pop(key)[0])
+            self.expirations += 1
+        if self.backend is not None:
+            self.backend.delete(key)
+
+    def put(self, key: str, message: BaseMessage) -> None:
+        value = json.dumps(message_to_dict(message))
+        expires = time.time() + self.ttl if self.ttl else None
+        with self._lock:
+            self._store(key, value, expires)
+        if self.backend is not None:
+            self.backend.put(key, value, expires)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "persistent": self.backend is not None,
+            }
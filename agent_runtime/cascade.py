@@ -0,0 +1,160 @@
+"""
+Model cascades: a node asks the smallest model of its ladder first and only
+escalates to the next one when a verifier rejects the answer.
+
+    critic = get_cascade(("gpt-4o-mini", "gpt-4o"), graph="evaluator_optimizer", node="evaluate",
+                         verifier=matches(r"VERDICT:\\s*(PASS|REVISE)"))
+    msg = critic.invoke(prompt)
+
+A verifier is any callable taking the answer text and returning True to accept
+it: `one_of(labels)` (classification), `matches(regex)` (format),
+`length(min_chars, max_chars)`, `confidence(threshold)` (the model's own
+"CONFIDENCE: 0.8" line, see CONFIDENCE_INSTRUCTION) and `all_of(...)` to
+combine them. The last rung's answer is returned whatever the verifier says;
+so is the last answer obtained when the run's deadline (deadline.py) cuts an
+escalation, counted as a degraded path of the node.
+
+Rungs are ordinary get_llm() models of the same graph, so they share the
+per-model gates, the response cache and single flight; a "claude-*" rung
+goes to Anthropic (langchain-anthropic). The returned message is the accepted
+one, with usage_metadata summed over every rung tried (run token budgets see
+the rejected answers too) and response_metadata["cascade"] naming the model
+that answered and those that were rejected.
+
+Per (graph, node), metrics.py records the calls answered by each rung, the
+escalations and the cascade's latency; the latency saved is estimated
+against the mean latency of the ladder's top model (/runtime/metrics.json,
+"cascades").
+
+    LLM_CASCADE=1       0: every node only uses the first rung of its ladder
+    LLM_LADDERS='{"routing.router": ["claude-3-5-haiku-latest", "gpt-4o"]}'   per-node override
+"""
+import json
+import os
+import re
+import time
+from typing import Any, Callable, Optional, Sequence
+
+from langchain_core.messages import BaseMessage
+
+from .deadline import DeadlineExceeded
+from .llm import ManagedChatModel, registry
+from .metrics import metrics
+
+Verifier = Callable[[str], bool]
+
+CONFIDENCE_INSTRUCTION = "End your answer with a line 'CONFIDENCE: <0 to 1>' rating how sure you are."
+_CONFIDENCE = re.compile(r"confidence\s*[:=]\s*([01](?:\.\d+)?|\.\d+)", re.IGNORECASE)
+
+
+def one_of(labels: Sequence[str]) -> Verifier:
+    """The whole answer is one of `labels` (case and surrounding blanks ignored)."""
+    allowed = {label.lower() for label in labels}
+    return lambda text: text.strip().lower() in allowed
+
+
+def matches(pattern: str, flags: int = re.IGNORECASE) -> Verifier:
+    """`pattern` is found somewhere in the answer."""
+    compiled = re.compile(pattern, flags)
+    return lambda text: compiled.search(text) is not None
+
+
+def length(min_chars: int = 1, max_chars: Optional[int] = None) -> Verifier:
+    return lambda text: min_chars <= len(text.strip()) and (max_chars is None or len(text.strip()) <= max_chars)
+
+
+def confidence(threshold: float = 0.7) -> Verifier:
+    """The answer reports a confidence of at least `threshold` (CONFIDENCE_INSTRUCTION in the prompt)."""
+
+    def verify(text: str) -> bool:
+        found = _CONFIDENCE.findall(text)
+        return bool(found) and float(found[-1]) >= threshold
+
+    return verify
+
+
+def all_of(*verifiers: Verifier) -> Verifier:
+    return lambda text: all(verify(text) for verify in verifiers)
+
+
+def _usage(messages: list[BaseMessage]) -> Optional[dict]:
+    usages = [m.usage_metadata for m in messages if getattr(m, "usage_metadata", None)]
+    if not usages:
+        return None
+    keys = ("input_tokens", "output_tokens", "total_tokens")
+    return {k: sum(u.get(k, 0) or 0 for u in usages) for k in keys}
+
+
+class Cascade:
+    """What a node calls instead of a single model: `invoke` / `ainvoke` up the ladder."""
+
+    def __init__(self, graph: str, node: str, rungs: Sequence[ManagedChatModel], verifier: Verifier,
+                 enabled: bool = True):
+        self.graph = graph
+        self.node = node
+        self.rungs = list(rungs)
+        self.verifier = verifier
+        self.enabled = enabled
+
+    @property
+    def models(self) -> tuple[str, ...]:
+        return tuple(rung.model for rung in self.rungs)
+
+    def _ladder(self) -> list[ManagedChatModel]:
+        return self.rungs if self.enabled else self.rungs[:1]
+
+    def _accepts(self, message: BaseMessage) -> bool:
+        content = message.content if isinstance(message.content, str) else str(message.content)
+        return self.verifier(content)
+
+    def _answer(self, tried: list[BaseMessage], started: float) -> BaseMessage:
+        message = tried[-1]
+        metrics.cascade_answered(self.graph, self.node, self.models, len(tried) - 1, time.perf_counter() - started)
+        if len(tried) == 1:
+            return message
+        return message.model_copy(update={
+            "usage_metadata": _usage(tried),
+            "response_metadata": {
+                **message.response_metadata,
+                "cascade": {"model": self.rungs[len(tried) - 1].model, "rejected": list(self.models[:len(tried) - 1])},
+            },
+        })
+
+    def invoke(self, input: Any, config: Optional[dict] = None, **kwargs: Any) -> BaseMessage:
+        started = time.perf_counter()
+        ladder, tried = self._ladder(), []
+        for i, rung in enumerate(ladder):
+            try:
+                tried.append(rung.invoke(input, config, **kwargs))
+            except DeadlineExceeded:
+                if not tried:
+                    raise
+                metrics.degraded()
+                break
+            if i == len(ladder) - 1 or self._accepts(tried[-1]):
+                break
+        return self._answer(tried, started)
+
+    async def ainvoke(self, input: Any, config: Optional[dict] = None, **kwargs: Any) -> BaseMessage:
+        started = time.perf_counter()
+        ladder, tried = self._ladder(), []
+        for i, rung in enumerate(ladder):
+            try:
+                tried.append(await rung.ainvoke(input, config, **kwargs))
+            except DeadlineExceeded:
+                if not tried:
+                    raise
+                metrics.degraded()
+                break
+            if i == len(ladder) - 1 or self._accepts(tried[-1]):
+                break
+        return self._answer(tried, started)
+
+
+def get_cascade(ladder: Sequence[str], graph: str, node: str, verifier: Verifier, cache: bool = False,
+                **params: Any) -> Cascade:
+    """Cascade over `ladder` (smallest model first) for `node` of `graph`; LLM_LADDERS["graph.node"] overrides it."""
+    override = json.loads(os.environ.get("LLM_LADDERS") or "{}").get(f"{graph}.{node}")
+    models = override.split(",") if isinstance(override, str) else (override or ladder)
+    rungs = [registry.get(model.strip(), graph, cache, **params) for model in models]
+    return Cascade(graph, node, rungs, verifier, enabled=os.environ.get("LLM_CASCADE", "1") != "0")
@@ -0,0 +1,153 @@
+"""
+Run deadlines: one absolute deadline per run, readable by every node and
+enforced on every LLM call.
+
+The deadline is `config["configurable"]["deadline"]` (Unix time, seconds).
+`DeadlineMiddleware` (webapp.py) stamps it on run requests when they reach
+the server: now + the request's `configurable.timeout`, or RUN_TIMEOUTS /
+RUN_TIMEOUT for its graph; a `deadline` sent by the client is kept. Locally:
+
+    app.invoke(inputs, with_deadline(30))
+
+Nodes wrapped by `instrument()` (nodes.py) run with the deadline of their
+run in context. There:
+
+- ManagedChatModel calls get the time left as their timeout (capped by
+  LLM_TIMEOUT) and raise DeadlineExceeded once it is spent, gate and
+  single-flight waits included: async calls are cancelled, sync calls pass
+  `timeout` to the provider client so the HTTP request itself is aborted,
+- `remaining()` gives the seconds left (None without a deadline) and
+  `short_of(seconds)` tells a node to take its degraded path, e.g. return
+  the draft instead of editing it; nodes catch DeadlineExceeded to end the
+  run with what they have.
+
+metrics.py counts, per node, LLM calls cut by the deadline (`deadline_misses`)
+and degraded paths taken (`degraded`).
+
+    RUN_TIMEOUT=120         seconds per run from arrival, 0 = no deadline
+    RUN_TIMEOUTS='{"orchestrator_worker": 300}'
+    LLM_TIMEOUT=60          cap on one LLM call, 0 = none
+"""
+import json
+import os
+import time
+from contextvars import ContextVar
+from typing import Any, Optional
+
+from .admission import RUN_PATH, _read_body, admission
+from .metrics import metrics
+
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", "60"))
+
+_current: ContextVar[Optional[float]] = ContextVar("agent_run_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """The run's deadline passed during (or before) an LLM call."""
+
+
+def with_deadline(seconds: float, config: Optional[dict] = None) -> dict:
+    """`config` with a deadline `seconds` from now."""
+    config = dict(config or {})
+    config["configurable"] = {**config.get("configurable", {}), "deadline": time.time() + seconds}
+    return config
+
+
+def from_config(config: Optional[dict]) -> Optional[float]:
+    deadline = ((config or {}).get("configurable") or {}).get("deadline")
+    return float(deadline) if deadline else None
+
+
+def current_config_deadline() -> Optional[float]:
+    """Deadline of the run whose node is executing (LangGraph's config in context)."""
+    from langgraph.config import get_config
+
+    try:
+        return from_config(get_config())
+    except RuntimeError:  # not inside a runnable
+        return None
+
+
+def enter(deadline: Optional[float]) -> Any:
+    return _current.set(deadline)
+
+
+def leave(token: Any) -> None:
+    _current.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current run's deadline, None without one (may be negative)."""
+    deadline = _current.get()
+    return None if deadline is None else deadline - time.time()
+
+
+def timeout() -> Optional[float]:
+    """Timeout for an LLM call made now: the time left, capped by LLM_TIMEOUT.
+    Raises DeadlineExceeded if the deadline has already passed."""
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded("run deadline already passed")
+    if LLM_TIMEOUT and (left is None or left > LLM_TIMEOUT):
+        return LLM_TIMEOUT
+    return left
+
+
+def short_of(seconds: float) -> bool:
+    """True (and counted as a degraded path of the current node) if less than
+    `seconds` are left before the deadline."""
+    left = remaining()
+    if left is None or left >= seconds:
+        return False
+    metrics.degraded()
+    return True
+
+
+def run_timeout(graph: str, configurable: dict) -> float:
+    if configurable.get("timeout"):
+        return float(configurable["timeout"])
+    per_graph = json.loads(os.environ.get("RUN_TIMEOUTS") or "{}")
+    return float(per_graph.get(graph, os.environ.get("RUN_TIMEOUT", "120")))
+
+
+def _stamp(payload: dict, arrived: float) -> bool:
+    """Set the deadline of a run request's payload; False if it has one or gets none."""
+    config = payload.get("config") or {}
+    configurable = (config.get("configurable") or {}) if isinstance(config, dict) else None
+    if not isinstance(configurable, dict) or configurable.get("deadline"):
+        return False
+    assistant_id = payload.get("assistant_id")
+    seconds = run_timeout(admission.graph_of(assistant_id if isinstance(assistant_id, str) else None), configurable)
+    if seconds <= 0:
+        return False
+    payload["config"] = {**config, "configurable": {**configurable, "deadline": arrived + seconds}}
+    return True
+
+
+class DeadlineMiddleware:
+    """ASGI middleware stamping config.configurable.deadline on run requests (see module docstring)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not RUN_PATH.match(scope["path"]):
+            return await self.app(scope, receive, send)
+        arrived = time.time()
+        body, disconnect = await _read_body(receive)
+        if disconnect is not None:
+            return
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            payload = None  # the server answers the malformed request itself
+        if isinstance(payload, dict) and _stamp(payload, arrived):
+            body = json.dumps(payload).encode()
+            headers = [(k, v) for k, v in scope["headers"] if k != b"content-length"]
+            scope = {**scope, "headers": [*headers, (b"content-length", str(len(body)).encode())]}
+        pending = [{"type": "http.request", "body": body, "more_body": False}]
+
+        async def replay():
+            return pending.pop() if pending else await receive()
+
+        await self.app(scope, replay, send)
@@ -0,0 +1,254 @@
+"""
+`langgraph dev` launcher used by api_watcher.py:
+
+    python -m agent_runtime.devserver --port 8000 --config langgraph.json --no-reload --no-browser
+
+Same arguments as `langgraph dev` (`--no-reload` is required: the reloader
+serves from a child process that does not get the settings below).
+
+Graph loading. The stock server imports and compiles every graph of
+langgraph.json one after the other before answering anything:
+
+    GRAPH_LOADING=warm      (default) graphs are registered without being imported;
+                            a background pool imports them right away and a request
+                            for a graph not loaded yet waits for (or does) its import
+    GRAPH_LOADING=lazy      a graph is imported on its first request only
+    GRAPH_LOADING=eager     stock behaviour
+    GRAPH_WARM_WORKERS=2    threads of the warm-up pool
+
+Load times per graph are logged and exposed as `graphs` in
+/runtime/metrics.json (`agent_graph_load_seconds` in /runtime/metrics).
+Lazy graphs are registered as graph factories, so an import error surfaces on
+the graph's first request instead of at startup (api_watcher's readiness probe
+fetches every graph, which loads them all before traffic is switched).
+
+These loaders replace private langgraph_api hooks (graph._graph_from_spec,
+cli.patch_environment): on a langgraph_api release outside
+PATCHED_API_VERSIONS, or one without those hooks, a warning is logged and the
+stock loading is kept.
+
+Persistence: DEV_STORE=delta (default) stores .langgraph_api as delta logs
+(devstore.py), DEV_STORE=pickle keeps the stock pickles.
+
+Workers. api_watcher's supervisor mode runs WORKER_COUNT servers, each with its
+own in-memory state, behind an nginx upstream hashed on the thread id of the
+URL. Worker WORKER_INDEX only creates threads whose id nginx sends back to it:
+ids are drawn until `worker_for(id, WORKER_COUNT)` is its index.
+"""
+import contextlib
+import logging
+import os
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import ContextVar
+from typing import Any, Callable, Optional
+
+STARTED = time.monotonic()
+logger = logging.getLogger(__name__)
+
+# langgraph_api releases whose private loading hooks the patches below were written against
+PATCHED_API_VERSIONS = ("0.16.",)
+
+
+class LazyGraph:
+    """Loads one graph spec once, from whichever thread asks first; others wait for it."""
+
+    def __init__(self, spec: Any, load: Callable[[Any], Any]):
+        self.spec = spec
+        self._load = load
+        self._lock = threading.Lock()
+        self._future: Optional[Future] = None
+
+    def get(self, trigger: str) -> Any:
+        with self._lock:
+            owner = self._future is None
+            if owner:
+                self._future = Future()
+        if owner:
+            started = time.perf_counter()
+            try:
+                graph = self._load(self.spec)
+            except BaseException as exc:
+                self._future.set_exception(exc)
+                with self._lock:
+                    self._future = None  # retried on the next request, e.g. after a fix
+                raise
+            _loaded(self.spec.id, time.perf_counter() - started, trigger)
+            self._future.set_result(graph)
+        return self._future.result()
+
+    @property
+    def loaded(self) -> bool:
+        future = self._future
+        return future is not None and future.done() and future.exception() is None
+
+
+def _loaded(graph_id: str, seconds: float, trigger: str) -> None:
+    from agent_runtime.metrics import metrics
+
+    uptime = time.monotonic() - STARTED
+    metrics.graph_loaded(graph_id, seconds, trigger, uptime)
+    logger.info("graph %s loaded in %.3fs (%s, %.2fs after start)", graph_id, seconds, trigger, uptime)
+
+
+def _factory(lazy: LazyGraph) -> Callable:
+    """Zero-argument async graph factory for the server: a compiled graph once loaded."""
+    import asyncio
+
+    async def graph():
+        if lazy.loaded:
+            return lazy.get("request")
+        value = await asyncio.get_running_loop().run_in_executor(None, lazy.get, "request")
+        if callable(value):
+            raise TypeError(
+                f"graph {lazy.spec.id!r} is itself a graph factory: run it with GRAPH_LOADING=eager"
+            )
+        return value
+
+    graph.__name__ = graph.__qualname__ = f"lazy_{lazy.spec.id}"
+    return graph
+
+
+def install_graph_loading(mode: Optional[str] = None, workers: Optional[int] = None) -> None:
+    """Replace the server's graph loader according to GRAPH_LOADING (see module docstring)."""
+    from langgraph_api import graph as server_graph
+
+    mode = mode or os.environ.get("GRAPH_LOADING", "warm")
+    workers = workers or int(os.environ.get("GRAPH_WARM_WORKERS", "2"))
+    if not _api_supports(server_graph, "_graph_from_spec"):
+        return
+    if getattr(server_graph._graph_from_spec, "_loading_mode", None):
+        return
+    load = server_graph._graph_from_spec
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="graph-warmup") if mode == "warm" else None
+
+    def _graph_from_spec(spec):
+        if mode == "eager" or spec.variable is None:
+            started = time.perf_counter()
+            graph = load(spec)
+            _loaded(spec.id, time.perf_counter() - started, "startup")
+            return graph
+        lazy = LazyGraph(spec, load)
+        if pool is not None:
+            pool.submit(_warm, lazy)
+        return _factory(lazy)
+
+    _graph_from_spec._loading_mode = mode
+    server_graph._graph_from_spec = _graph_from_spec
+
+
+def _warm(lazy: LazyGraph) -> None:
+    try:
+        lazy.get("warmup")
+    except Exception:
+        logger.exception("warm-up of graph %s failed; it will be retried on its first request", lazy.spec.id)
+
+
+def worker_for(key: str, count: int) -> int:
+    """Index of the server nginx's `hash $key;` picks among `count` equal-weight servers.
+
+    Same expression as ngx_http_upstream_hash_module on the first try:
+    ((crc32(key) >> 16) & 0x7fff) % total weight.
+    """
+    return ((zlib.crc32(key.encode()) >> 16) & 0x7FFF) % count
+
+
+def _owned(new_id: Callable[[], Any], index: int, count: int) -> Callable[[], Any]:
+    def owned_id():
+        while True:
+            value = new_id()
+            if worker_for(str(value), count) == index:
+                return value
+
+    return owned_id
+
+
+# Set while the in-memory runtime copies a thread: its new id must route to this worker
+_copying_thread: ContextVar[bool] = ContextVar("copying_thread", default=False)
+
+
+def _copy_owned(copy: Callable[..., Any]) -> Callable[..., Any]:
+    async def copy_owned(*args: Any, **kwargs: Any) -> Any:
+        token = _copying_thread.set(True)
+        try:
+            return await copy(*args, **kwargs)
+        finally:
+            _copying_thread.reset(token)
+
+    return copy_owned
+
+
+def install_thread_affinity(index: Optional[int] = None, count: Optional[int] = None) -> None:
+    """Make new thread ids route back to this worker (see module docstring)."""
+    index = int(os.environ.get("WORKER_INDEX", "0")) if index is None else index
+    count = int(os.environ.get("WORKER_COUNT", "1")) if count is None else count
+    if count <= 1:
+        return
+    from langgraph_api.api import threads
+    from langgraph_runtime_inmem import ops
+
+    # POST /threads without an id: the route's only uuid7() call
+    threads.uuid7 = _owned(threads.uuid7, index, count)
+    # POST /threads/{id}/copy: inmem Threads.copy mints the new id with ops.uuid4(), which also
+    # mints run, assistant and cron ids; only the calls made inside Threads.copy are redrawn
+    uuid4, owned = ops.uuid4, _owned(ops.uuid4, index, count)
+    ops.uuid4 = lambda: owned() if _copying_thread.get() else uuid4()
+    ops.Threads.copy = staticmethod(_copy_owned(ops.Threads.copy))
+    logger.info("worker %d/%d: new threads are created with ids routed to this worker", index, count)
+
+
+def _api_supports(module: Any, hook: str) -> bool:
+    """Whether `module.hook` can be patched on the installed langgraph_api; logs why not."""
+    import langgraph_api
+
+    version = getattr(langgraph_api, "__version__", "unknown")
+    if not callable(getattr(module, hook, None)):
+        logger.warning("langgraph_api %s has no %s.%s: keeping the stock loading", version, module.__name__, hook)
+        return False
+    if not version.startswith(PATCHED_API_VERSIONS):
+        logger.warning(
+            "langgraph_api %s is not one of %s: keeping the stock loading", version, ", ".join(PATCHED_API_VERSIONS)
+        )
+        return False
+    return True
+
+
+def _when_configured(*installs: Callable[[], None]) -> None:
+    """Run `installs` once `langgraph dev` has set the server's environment.
+
+    langgraph_api.config reads the environment at import time, and importing
+    langgraph_api.graph imports it: graph loading can only be patched from there.
+    """
+    from langgraph_api import cli as server_cli
+
+    if not _api_supports(server_cli, "patch_environment"):
+        return
+    patch_environment = server_cli.patch_environment
+
+    @contextlib.contextmanager
+    def patched(**kwargs):
+        with patch_environment(**kwargs):
+            for install in installs:
+                install()
+            yield
+
+    server_cli.patch_environment = patched
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if os.environ.get("DEV_STORE", "delta") == "delta":
+        from agent_runtime import devstore
+
+        devstore.install()
+    _when_configured(install_graph_loading, install_thread_affinity)
+    from langgraph_cli.cli import cli
+
+    return cli(["dev", *argv])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,785 @@
+"""
+Append-only delta storage for the in-memory dev server (`langgraph dev`).
+
+The dev server keeps threads, checkpoints, runs and the store in
+`PersistentDict`s and flushes each of them every 10 s by pickling the whole
+dict to `.langgraph_api/*.pckl`; every restart unpickles everything. With
+`install()` those dicts are instead persisted as a log of delta records:
+
+- a flush appends only the entries touched since the previous flush, and of
+  those only the ones whose content changed (one record per leaf: a checkpoint,
+  a pending write, a blob, a store item...),
+- records are pickled, zlib-compressed above COMPRESS_MIN bytes, length- and
+  CRC-framed; a torn tail left by a crash is dropped on load,
+- once the log is COMPACT_RATIO times larger than the live data it is rewritten
+  to a snapshot (atomic rename),
+- store vectors go to a raw float32 side file that is memory-mapped on load
+  instead of being unpickled,
+- an existing `.pckl` is migrated on first load (kept as `.pckl.bak`; an
+  empty pickle stays in its place, the server only loads files that exist).
+
+Appends and compaction hold an flock and first replay what another process
+appended since (or its compacted log), so the blue/green servers of
+api_watcher.py can share `.langgraph_api/`: a compaction snapshots both
+servers' writes, and a leaf written by both keeps the last writer's value.
+`install()` patches the server process; devserver.py calls it (DEV_STORE=delta).
+
+    python -m agent_runtime.devstore migrate [.langgraph_api]      # convert the pickles offline
+    python -m agent_runtime.devstore compact [.langgraph_api]
+    python -m agent_runtime.devstore info [.langgraph_api]
+
+    DEVSTORE_COMPACT_RATIO=2          log size / live size that triggers compaction
+    DEVSTORE_COMPACT_MIN_BYTES=1048576
+"""
+import argparse
+import io
+import json
+import mmap
+import os
+import pickle
+import struct
+import sys
+import time
+import weakref
+import zlib
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+    fcntl = None
+
+MAGIC = b"LGDL\x01"
+SUFFIX = ".lgdl"
+_HEADER = struct.Struct("<I")
+_RECORD = struct.Struct("<BII")  # kind, payload length, crc32
+PUT, DELETE, SNAPSHOT = 1, 2, 3  # SNAPSHOT: a batch of leaves, written by compaction
+COMPRESSED = 0x80
+# Left in place of a migrated .pckl: an empty dict, so a plain `langgraph dev` still starts
+MARKER = pickle.dumps({}, 2)
+COMPRESS_MIN = 256
+SNAPSHOT_CHUNK = 64 << 10
+COMPACT_RATIO = float(os.environ.get("DEVSTORE_COMPACT_RATIO", "2"))
+COMPACT_MIN_BYTES = int(os.environ.get("DEVSTORE_COMPACT_MIN_BYTES", str(1 << 20)))
+
+# Nesting kept as separate records, by dev-server file (default: top-level keys)
+DEPTHS = {
+    ".langgraph_checkpoint.1.pckl": 3,  # storage: thread -> namespace -> checkpoint id
+    ".langgraph_checkpoint.2.pckl": 2,  # writes: (thread, ns, checkpoint) -> (task, idx)
+    "store.pckl": 2,  # namespace -> key -> Item
+    "store.vectors.pckl": 2,  # namespace -> key -> {path: vector}
+}
+VECTOR_FILES = {"store.vectors.pckl"}
+# Leaves that cannot change without being replaced: same object => same content
+_IMMUTABLE = (tuple, bytes, str, int, float, bool, type(None), frozenset)
+
+
+class _Lock:
+    def __init__(self, path: str):
+        self.path = path + ".lock"
+        self._fd: Optional[int] = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self._fd = os.open(self.path, os.O_CREAT | os.O_RDWR, 0o644)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+
+class VectorFile:
+    """Append-only float32 arena, memory-mapped; vectors are numpy views into it."""
+
+    def __init__(self, path: str):
+        import numpy as np
+
+        self.np = np
+        self.path = path
+        self._maps: list = []  # every mapping of this file still referenced by views
+        open(path, "ab").close()
+
+    def _map(self):
+        np = self.np
+        size = os.path.getsize(self.path)
+        if size == 0:
+            return None
+        mapped = np.memmap(self.path, dtype=np.float32, mode="r", shape=(size // 4,))
+        self._maps.append((mapped.__array_interface__["data"][0], size, mapped))
+        return mapped
+
+    def offset_of(self, vector: Any) -> Optional[int]:
+        """Offset of a view already stored in this file, None otherwise."""
+        if not isinstance(vector, self.np.ndarray):
+            return None
+        addr = vector.__array_interface__["data"][0]
+        for start, size, _ in self._maps:
+            if start <= addr < start + size:
+                return (addr - start) // 4
+        return None
+
+    def append(self, vector: Any) -> int:
+        """Write one vector at the end of the file, return its offset (in floats)."""
+        arr = self.np.asarray(vector, dtype=self.np.float32)
+        with open(self.path, "ab") as f:
+            offset = f.tell() // 4
+            f.write(arr.tobytes())
+        return offset
+
+    def view(self, offset: int, dim: int) -> Any:
+        mapped = self._maps[-1][2] if self._maps else None
+        if mapped is None or offset + dim > mapped.shape[0]:
+            mapped = self._map()
+        return mapped[offset : offset + dim]
+
+
+def _is_vector(obj: Any) -> bool:
+    if type(obj) is list:
+        return bool(obj) and type(obj[0]) is float
+    return type(obj).__name__ in ("ndarray", "memmap") and getattr(obj, "ndim", 0) == 1
+
+
+class _Pickler(pickle.Pickler):
+    """Pickles vectors as (offset, dim) references into the side file, appending new ones."""
+
+    def __init__(self, file, vectors: Optional[VectorFile], fresh: dict):
+        super().__init__(file, protocol=5)
+        self.vectors = vectors
+        self.fresh = fresh
+
+    def persistent_id(self, obj: Any) -> Any:
+        if self.vectors is None or not _is_vector(obj):
+            return None
+        offset = self.vectors.offset_of(obj)
+        if offset is None:
+            offset = self.fresh.get(id(obj))
+            if offset is None:
+                offset = self.fresh[id(obj)] = self.vectors.append(obj)
+        return ("vec", offset, len(obj))
+
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, file, vectors: Optional[VectorFile]):
+        super().__init__(file)
+        self.vectors = vectors
+
+    def persistent_load(self, pid: Any) -> Any:
+        _, offset, dim = pid
+        return self.vectors.view(offset, dim)
+
+
+def _leaves(value: Any, path: tuple, depth: int, out: dict) -> None:
+    if len(path) < depth and isinstance(value, dict) and value:
+        for k, v in list(value.items()):
+            _leaves(v, path + (k,), depth, out)
+    else:
+        out[path] = value
+
+
+def _set_path(root: dict, path: tuple, value: Any) -> None:
+    node = root
+    for k in path[:-1]:
+        node = _child(node, k)
+    if isinstance(value, dict) and not value and isinstance(node, defaultdict) and node.default_factory:
+        dict.__setitem__(node, path[-1], node.default_factory())  # empty container of the right type
+    else:
+        dict.__setitem__(node, path[-1], value)
+
+
+def _child(node: dict, key: Any) -> dict:
+    if key in node:
+        return dict.__getitem__(node, key)
+    child = node.default_factory() if isinstance(node, defaultdict) and node.default_factory else {}
+    dict.__setitem__(node, key, child)
+    return child
+
+
+def _get_path(root: dict, path: tuple) -> tuple[bool, Any]:
+    node: Any = root
+    for k in path:
+        if not isinstance(node, dict) or k not in node:
+            return False, None
+        node = dict.__getitem__(node, k)
+    return True, node
+
+
+def _del_path(root: dict, path: tuple) -> None:
+    node = root
+    for k in path[:-1]:
+        if k not in node:
+            return
+        node = dict.__getitem__(node, k)
+    dict.pop(node, path[-1], None)
+
+
+class DeltaLog:
+    """Delta records of one dict: replay on load, append on sync, rewrite on compaction."""
+
+    def __init__(self, filename: str, depth: Optional[int] = None, vectors: Optional[bool] = None):
+        base = os.path.basename(filename)
+        self.pickle_path = filename
+        self.path = filename[: -len(".pckl")] + SUFFIX if filename.endswith(".pckl") else filename + SUFFIX
+        self.depth = depth if depth is not None else DEPTHS.get(base, 1)
+        self.has_vectors = base in VECTOR_FILES if vectors is None else vectors
+        self.vectors: Optional[VectorFile] = None
+        self.lock = _Lock(self.path)
+        # top-level key -> {leaf path: (object, crc32, record bytes)} as last written
+        self.written: dict[Any, dict[tuple, tuple]] = {}
+        self.live_bytes = 0
+        self.log_bytes = 0
+        self._inode: Optional[int] = None
+        self.stats = {"flushes": 0, "records": 0, "bytes": 0, "compactions": 0, "load_seconds": 0.0}
+
+    # -- file format -------------------------------------------------------
+
+    def _header(self, meta: dict) -> bytes:
+        body = json.dumps(meta).encode()
+        return MAGIC + _HEADER.pack(len(body)) + body
+
+    def _read_header(self, buf) -> tuple[dict, int]:
+        if bytes(buf[: len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{self.path}: not a delta log")
+        (n,) = _HEADER.unpack_from(buf, len(MAGIC))
+        start = len(MAGIC) + _HEADER.size
+        return json.loads(bytes(buf[start : start + n])), start + n
+
+    def _open_vectors(self, meta: dict) -> None:
+        if self.has_vectors:
+            self.vectors = VectorFile(os.path.join(os.path.dirname(self.path), meta["vectors"]))
+
+    def _records(self, buf, pos: int) -> Iterator[tuple[int, int, bytes]]:
+        """(kind, end offset, pickled payload) of each intact record; stops at a torn or corrupt one."""
+        size = len(buf)
+        while pos + _RECORD.size <= size:
+            kind, length, crc = _RECORD.unpack_from(buf, pos)
+            end = pos + _RECORD.size + length
+            if end > size:
+                return
+            payload = buf[pos + _RECORD.size : end]
+            if kind & COMPRESSED:
+                try:
+                    payload = zlib.decompress(payload)
+                except zlib.error:
+                    return
+            if zlib.crc32(payload) != crc:
+                return
+            yield kind & ~COMPRESSED, end, payload
+            pos = end
+
+    def _dumps(self, obj: Any, fresh: dict) -> bytes:
+        if self.vectors is None:
+            return pickle.dumps(obj, protocol=5)
+        f = io.BytesIO()
+        _Pickler(f, self.vectors, fresh).dump(obj)
+        return f.getvalue()
+
+    def _loads(self, payload: bytes) -> Any:
+        if self.vectors is None:
+            return pickle.loads(payload)
+        return _Unpickler(io.BytesIO(payload), self.vectors).load()
+
+    def _frame(self, kind: int, raw: bytes) -> bytes:
+        crc = zlib.crc32(raw)
+        if len(raw) >= COMPRESS_MIN:
+            packed = zlib.compress(raw, 1)
+            if len(packed) < len(raw):
+                kind, raw = kind | COMPRESSED, packed
+        return _RECORD.pack(kind, len(raw), crc) + raw
+
+    def _encode(self, kind: int, path: tuple, value: Any, fresh: dict) -> tuple[bytes, int]:
+        """Framed record and the CRC of its pickle, which identifies the leaf content."""
+        raw = self._dumps((path, value) if kind == PUT else path, fresh)
+        return self._frame(kind, raw), zlib.crc32(raw)
+
+    # -- load --------------------------------------------------------------
+
+    def load(self, data: dict) -> bool:
+        """Replay the log (or the legacy pickle) into `data`. False when neither exists."""
+        started = time.perf_counter()
+        with self.lock:
+            if self._pickle_is_newer():
+                with open(self.pickle_path, "rb") as f:
+                    loaded = pickle.load(f)
+                for key, value in loaded.items():
+                    dict.__setitem__(data, key, value)
+                os.replace(self.pickle_path, self.pickle_path + ".bak")
+                self._compact(data)
+                self.stats["load_seconds"] = round(time.perf_counter() - started, 4)
+                return True
+            if not os.path.exists(self.path):
+                return False
+            with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                meta, pos = self._read_header(buf)
+                self._open_vectors(meta)
+                valid = pos
+                for kind, end, payload in self._records(buf, pos):
+                    obj = self._loads(payload)
+                    if kind == SNAPSHOT:
+                        # Disjoint leaves at the start of the log: no superseded entries to look for
+                        for path, crc, size, value in obj:
+                            _set_path(data, path, value)
+                            self.written.setdefault(path[0], {})[path] = (value, crc, size)
+                            self.live_bytes += size
+                    elif kind == PUT:
+                        path, value = obj
+                        _set_path(data, path, value)
+                        self._remember(path, value, zlib.crc32(payload), end - valid)
+                    else:
+                        _del_path(data, obj)
+                        self._forget(obj)
+                    valid = end
+                size = len(buf)
+            if valid < size:
+                # Torn last record of a killed process
+                with open(self.path, "r+b") as f:
+                    f.truncate(valid)
+            self.log_bytes = valid
+            self._inode = os.stat(self.path).st_ino
+        self.stats["load_seconds"] = round(time.perf_counter() - started, 4)
+        return True
+
+    def _pickle_is_newer(self) -> bool:
+        """A real pickle (not our marker) written after the log, e.g. by a plain `langgraph dev`."""
+        try:
+            st = os.stat(self.pickle_path)
+        except FileNotFoundError:
+            return False
+        if st.st_size == len(MARKER):
+            return False
+        return not os.path.exists(self.path) or st.st_mtime > os.stat(self.path).st_mtime
+
+    def _remember(self, path: tuple, value: Any, crc: int, size: int) -> None:
+        leaves = self.written.setdefault(path[0], {})
+        old = leaves.get(path)
+        if old is not None:
+            self.live_bytes -= old[2]
+        # An emptied container (shorter path) and the leaves below it supersede each other
+        for i in range(1, len(path)):
+            if path[:i] in leaves:
+                self.live_bytes -= leaves.pop(path[:i])[2]
+        if len(path) < self.depth:
+            for other in [p for p in leaves if len(p) > len(path) and p[: len(path)] == path]:
+                self.live_bytes -= leaves.pop(other)[2]
+        leaves[path] = (value, crc, size)
+        self.live_bytes += size
+
+    def _forget(self, path: tuple) -> None:
+        leaves = self.written.get(path[0])
+        if not leaves:
+            return
+        for other in [p for p in leaves if p[: len(path)] == path]:
+            self.live_bytes -= leaves.pop(other)[2]
+        if not leaves:
+            del self.written[path[0]]
+
+    # -- sync --------------------------------------------------------------
+
+    def sync(self, data: dict, keys: Optional[set]) -> int:
+        """Append records for the changed leaves under `keys` (None = every key). Returns records written."""
+        with self.lock:
+            if not os.path.exists(self.path):
+                self._compact(data)
+                return len(self.written)
+            self._catch_up(data)
+            if keys is None:
+                keys = set(self.written) | set(dict.keys(data))
+            records, entries, fresh, leaves = [], [], {}, []
+            for key in keys:
+                previous = self.written.get(key, {})
+                if key not in data:
+                    if previous:
+                        records.append(self._encode(DELETE, (key,), None, fresh)[0])
+                        entries.append((DELETE, (key,), None, 0))
+                    continue
+                current: dict = {}
+                _leaves(dict.get(data, key), (key,), self.depth, current)
+                leaves.append(current)
+                for path in previous.keys() - current.keys():
+                    if not any(path[: len(p)] == p for p in current if len(p) < len(path)):
+                        records.append(self._encode(DELETE, path, None, fresh)[0])
+                        entries.append((DELETE, path, None, 0))
+                for path, value in current.items():
+                    old = previous.get(path)
+                    if old is not None and old[0] is value and isinstance(value, _IMMUTABLE):
+                        continue
+                    record, crc = self._encode(PUT, path, value, fresh)
+                    if old is not None and old[1] == crc:
+                        previous[path] = (value, crc, old[2])
+                        continue
+                    records.append(record)
+                    entries.append((PUT, path, value, crc))
+            if not records:
+                return 0
+            with open(self.path, "ab") as f:
+                f.write(b"".join(records))
+            for (kind, path, value, crc), record in zip(entries, records):
+                if kind == PUT:
+                    self._remember(path, value, crc, len(record))
+                else:
+                    self._forget(path)
+            written = sum(len(r) for r in records)
+            self.log_bytes += written
+            self.stats["flushes"] += 1
+            self.stats["records"] += len(records)
+            self.stats["bytes"] += written
+            if fresh:
+                self._swap_vectors(leaves, fresh)
+            if self.log_bytes > max(COMPACT_MIN_BYTES, COMPACT_RATIO * self.live_bytes):
+                self._compact(data)
+            return len(records)
+
+    def _catch_up(self, data: dict) -> None:
+        """Replay into `data` the records another process (blue/green server) appended
+        since this one last read or wrote the log, or its whole log if it compacted it.
+        Leaves changed here and not written yet keep their local value. Caller holds the lock."""
+        st = os.stat(self.path)
+        rewritten = st.st_ino != self._inode
+        self._inode = st.st_ino
+        if not rewritten and st.st_size <= self.log_bytes:
+            return
+        seen: set = set()
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            meta, pos = self._read_header(buf)
+            if rewritten:
+                self._open_vectors(meta)
+            else:
+                pos = self.log_bytes
+            valid = pos
+            for kind, end, payload in self._records(buf, pos):
+                obj = self._loads(payload)
+                if kind == SNAPSHOT:
+                    for path, crc, size, value in obj:
+                        seen.add(path)
+                        self._replay(data, path, value, crc, size)
+                elif kind == PUT:
+                    path, value = obj
+                    seen.add(path)
+                    self._replay(data, path, value, zlib.crc32(payload), end - valid)
+                else:
+                    self._replay(data, obj)
+                valid = end
+        if rewritten:
+            # Written here, absent from the other process's snapshot: it deleted them
+            for path in [p for leaves in self.written.values() for p in leaves if p not in seen]:
+                self._replay(data, path)
+        if valid < st.st_size:
+            # Torn last record of a killed process: appending after it would hide ours
+            with open(self.path, "r+b") as f:
+                f.truncate(valid)
+        self.log_bytes = valid
+
+    def _replay(self, data: dict, path: tuple, value: Any = None, crc: Optional[int] = None, size: int = 0) -> None:
+        """Apply a PUT (crc given) or DELETE read from the log, unless the leaves changed locally."""
+        leaves = self.written.get(path[0], {})
+        if crc is None:
+            below = [p for p in leaves if p[: len(path)] == path]
+            if below and all(self._unchanged(data, p, leaves[p]) for p in below):
+                _del_path(data, path)
+                self._forget(path)
+        elif self._unchanged(data, path, leaves.get(path)):
+            _set_path(data, path, value)
+            self._remember(path, value, crc, size)
+
+    @staticmethod
+    def _unchanged(data: dict, path: tuple, old: Optional[tuple]) -> bool:
+        """`data` still holds what this process last wrote (or read) at `path`."""
+        found, current = _get_path(data, path)
+        return current is old[0] if old is not None and found else not found and old is None
+
+    def _swap_vectors(self, leaves: list[dict], fresh: dict) -> None:
+        """Replace the vectors just written by views of the mapped side file (frees the lists)."""
+        for current in leaves:
+            for leaf in current.values():
+                if not isinstance(leaf, dict):
+                    continue
+                for name, vector in list(leaf.items()):
+                    offset = fresh.get(id(vector))
+                    if offset is not None:
+                        dict.__setitem__(leaf, name, self.vectors.view(offset, len(vector)))
+
+    # -- compaction --------------------------------------------------------
+
+    def compact(self, data: dict) -> None:
+        with self.lock:
+            if os.path.exists(self.path):
+                self._catch_up(data)
+            self._compact(data)
+
+    def _compact(self, data: dict) -> None:
+        """Rewrite the log as a snapshot of `data`. Caller holds the lock and has
+        caught up with the log (_catch_up), so no other process's record is lost."""
+        meta = {"depth": self.depth, "created": time.time()}
+        old_vectors = self.vectors
+        if self.has_vectors:
+            meta["vectors"] = f"{os.path.basename(self.path)}.{time.time_ns()}.f32"
+            self.vectors = VectorFile(os.path.join(os.path.dirname(self.path), meta["vectors"]))
+        leaves: dict = {}
+        for key in list(dict.keys(data)):
+            _leaves(dict.get(data, key), (key,), self.depth, leaves)
+        # Leaves grouped in SNAPSHOT_CHUNK records, each with the CRC and size of its own
+        # record, so that load does not re-encode anything to detect later changes
+        groups: list[list] = [[]]
+        fresh: dict = {}
+        size = 0
+        for path, value in leaves.items():
+            record, crc = self._encode(PUT, path, value, fresh)
+            if size >= SNAPSHOT_CHUNK:
+                groups.append([])
+                size = 0
+            groups[-1].append((path, crc, len(record), value))
+            size += len(record)
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(self._header(meta))
+            for group in groups:
+                f.write(self._frame(SNAPSHOT, self._dumps(group, fresh)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        if not os.path.exists(self.pickle_path):
+            # The dev server only calls load() when the .pckl exists
+            with open(self.pickle_path, "wb") as f:
+                f.write(MARKER)
+        self._inode = os.stat(self.path).st_ino
+        self.written.clear()
+        self.live_bytes = 0
+        for group in groups:
+            for path, crc, size, value in group:
+                self._remember(path, value, crc, size)
+        self.log_bytes = os.path.getsize(self.path)
+        self.stats["compactions"] += 1
+        if fresh:
+            self._swap_vectors([leaves], fresh)
+        if old_vectors is not None:
+            try:
+                os.remove(old_vectors.path)  # pages stay mapped until the last view goes
+            except OSError:
+                pass
+
+
+# -- PersistentDict integration ------------------------------------------------
+
+
+# filename -> first dict loaded from it in this process. The dev server builds
+# throwaway PersistentDicts over the same files (one InMemorySaver per thread
+# state read, swapped for the shared one right away): they alias the primary
+# instead of replaying the log, and flushing any of them flushes the primary.
+_primaries: "weakref.WeakValueDictionary[str, Any]" = weakref.WeakValueDictionary()
+
+
+def _log(d) -> DeltaLog:
+    log = d.__dict__.get("_delta_log")
+    if log is None:
+        log = d.__dict__["_delta_log"] = DeltaLog(d.filename)
+        d.__dict__["_delta_dirty"] = set()
+        d.__dict__["_delta_all"] = True
+    return log
+
+
+def _touch(d, key) -> None:
+    dirty = d.__dict__.get("_delta_dirty")
+    if dirty is not None:
+        dirty.add(key)
+
+
+def _keep_flushing(primary) -> None:
+    """The server's flush loop keeps one weakref per filename: the alias just registered
+    replaced the primary and dies right after, so point the entry back at the primary."""
+    try:
+        from langgraph_runtime_inmem import _persistence
+    except ImportError:
+        return
+    if primary.filename in _persistence._stores:
+        _persistence._stores[primary.filename] = weakref.ref(primary)
+
+
+def _load(self) -> None:
+    if getattr(self, "flag", "c") == "n":
+        return
+    primary = _primaries.get(self.filename)
+    if primary is not None and primary is not self:
+        dict.update(self, primary)
+        self.__dict__["_delta_log"] = primary.__dict__["_delta_log"]
+        self.__dict__["_delta_primary"] = weakref.ref(primary)
+        _keep_flushing(primary)
+        return
+    log = _log(self)
+    before = set(dict.keys(self))
+    if not log.load(self):
+        _primaries[self.filename] = self
+        raise FileNotFoundError(log.path)
+    _primaries[self.filename] = self
+    # Keys set before loading (e.g. GlobalStore defaults) and absent from the log still need writing
+    self.__dict__["_delta_dirty"] = {k for k in before if k not in log.written}
+    self.__dict__["_delta_all"] = False
+
+
+def _sync(self) -> None:
+    if getattr(self, "flag", "c") == "r":
+        return
+    ref = self.__dict__.get("_delta_primary")
+    target = ref() if ref is not None else None
+    if target is None:
+        target = self
+    log = _log(target)
+    keys = None if target.__dict__["_delta_all"] else target.__dict__["_delta_dirty"]
+    target.__dict__["_delta_dirty"] = set()
+    target.__dict__["_delta_all"] = False
+    log.sync(target, keys)
+
+
+def _close(self) -> None:
+    self.sync()
+    if _primaries.get(self.filename) is self:
+        del _primaries[self.filename]
+    dict.clear(self)
+
+
+def _getitem(self, key):
+    _touch(self, key)
+    return defaultdict.__getitem__(self, key)
+
+
+def _setitem(self, key, value):
+    _touch(self, key)
+    dict.__setitem__(self, key, value)
+
+
+def _delitem(self, key):
+    _touch(self, key)
+    dict.__delitem__(self, key)
+
+
+def _get(self, key, default=None):
+    if key in self:
+        _touch(self, key)
+    return dict.get(self, key, default)
+
+
+def _pop(self, key, *default):
+    _touch(self, key)
+    return dict.pop(self, key, *default)
+
+
+def _setdefault(self, key, default=None):
+    _touch(self, key)
+    return dict.setdefault(self, key, default)
+
+
+def _update(self, *args, **kwargs):
+    other = dict(*args, **kwargs)
+    for key in other:
+        _touch(self, key)
+    dict.update(self, other)
+
+
+def _all(name):
+    method = getattr(dict, name)
+
+    def wrapper(self, *args):
+        # Values handed out in bulk may be mutated in place: check every key on next sync
+        self.__dict__["_delta_all"] = True
+        return method(self, *args)
+
+    wrapper.__name__ = name
+    return wrapper
+
+
+def _clear(self):
+    self.__dict__["_delta_all"] = True
+    dict.clear(self)
+
+
+def install() -> None:
+    """Persist every langgraph PersistentDict (dev server state) as delta logs. Idempotent."""
+    from langgraph.checkpoint.memory import PersistentDict
+
+    if getattr(PersistentDict, "_delta_installed", False):
+        return
+    PersistentDict.load = _load
+    PersistentDict.sync = _sync
+    PersistentDict.close = _close
+    PersistentDict.__getitem__ = _getitem
+    PersistentDict.__setitem__ = _setitem
+    PersistentDict.__delitem__ = _delitem
+    PersistentDict.get = _get
+    PersistentDict.pop = _pop
+    PersistentDict.setdefault = _setdefault
+    PersistentDict.update = _update
+    PersistentDict.values = _all("values")
+    PersistentDict.items = _all("items")
+    PersistentDict.popitem = _all("popitem")
+    PersistentDict.clear = _clear
+    PersistentDict._delta_installed = True
+
+
+# -- CLI -------------------------------------------------------------------------
+
+
+def _logs(directory: Path) -> Iterator[DeltaLog]:
+    seen = set()
+    for path in sorted(directory.glob("*.pckl")) + sorted(directory.glob(".*.pckl")):
+        if path.name not in seen:
+            seen.add(path.name)
+            yield DeltaLog(str(path))
+    for path in sorted(directory.glob("*" + SUFFIX)) + sorted(directory.glob(".*" + SUFFIX)):
+        name = path.name[: -len(SUFFIX)] + ".pckl"
+        if name not in seen:
+            seen.add(name)
+            yield DeltaLog(str(path.with_name(name)))
+
+
+def migrate(directory: Path) -> None:
+    for log in _logs(directory):
+        if os.path.exists(log.path) or not os.path.exists(log.pickle_path):
+            continue
+        before = os.path.getsize(log.pickle_path)
+        log.load({})
+        print(f"{os.path.basename(log.pickle_path)}: {before} B pickle -> {os.path.getsize(log.path)} B delta log")
+
+
+def compact(directory: Path) -> None:
+    for log in _logs(directory):
+        if not os.path.exists(log.path):
+            continue
+        data: dict = {}
+        before = os.path.getsize(log.path)
+        log.load(data)
+        log.compact(data)
+        print(f"{os.path.basename(log.path)}: {before} -> {os.path.getsize(log.path)} B")
+
+
+def info(directory: Path) -> None:
+    for log in _logs(directory):
+        if not os.path.exists(log.path):
+            print(f"{os.path.basename(log.pickle_path)}: pickle, not migrated")
+            continue
+        log.load({})
+        leaves = sum(len(v) for v in log.written.values())
+        print(
+            f"{os.path.basename(log.path)}: {log.log_bytes} B log, {log.live_bytes} B live, "
+            f"{leaves} records, load {log.stats['load_seconds'] * 1000:.1f} ms"
+        )
+
+
+def main(argv=None):
+    # Stored runs/threads unpickle langgraph_api objects, whose import reads the same
+    # settings `langgraph dev` sets for the in-memory runtime
+    for key, value in (("REDIS_URI", "fake"), ("DATABASE_URI", ":memory:"), ("MIGRATIONS_PATH", "__inmem")):
+        os.environ.setdefault(key, value)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("command", choices=["migrate", "compact", "info"])
+    parser.add_argument("directory", nargs="?", type=Path, default=Path(".langgraph_api"))
+    args = parser.parse_args(argv)
+    {"migrate": migrate, "compact": compact, "info": info}[args.command](args.directory)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,412 @@
+"""
+Safe arithmetic expressions: parsed and validated once, compiled, cached.
+
+Only numbers, + - * / // % **, unary +/-, parentheses, a few math functions
+(FUNCTIONS), the constants pi / e / tau and, for sweeps, plain variable names
+are accepted. Anything else (attributes, subscripts, comprehensions, strings,
+...) is rejected before anything runs (ExpressionError). Limits keep pathological
+inputs cheap (LimitError):
+
+- expressions longer than MAX_LENGTH chars or with more than MAX_NODES AST nodes,
+- literals larger than MAX_OPERAND,
+- `**` nested deeper than MAX_POWER_DEPTH (2 ** 2 ** 2 ** 2 ...),
+- powers whose result would exceed MAX_RESULT_BITS, or exponents above MAX_EXPONENT,
+- products and floor divisions whose integer result exceeds MAX_RESULT_BITS,
+- `round()` to more than MAX_ROUND_DIGITS digits either side of the point
+  (`round(5, -10**9)` would otherwise compute 10 ** 10**9).
+
+Validated expressions compile to a regular code object in which every `**`, `*`
+and `//` is a call to a guarded operation; `evaluate` then costs a few microseconds.
+
+`evaluate_many` and `sweep` use NumPy (float64): expressions that only differ
+by their literals ("2 + 3 * 4", "5 + 6 * 7") share one compiled template and
+are evaluated as arrays, and a sweep evaluates one expression over arrays of
+variable values.
+"""
+import ast
+import math
+import re
+from functools import lru_cache
+from typing import Any, Iterable, Optional
+
+MAX_LENGTH = 500
+MAX_NODES = 200
+MAX_OPERAND = 10**15
+MAX_POWER_DEPTH = 2
+MAX_EXPONENT = 10_000
+MAX_RESULT_BITS = 4096
+# Digits, either side of the point, round() may round to (floats have ~1e308 range)
+MAX_ROUND_DIGITS = 400
+
+
+def _round(number, ndigits=None):
+    if ndigits is None:
+        return round(number)
+    if not isinstance(ndigits, int):
+        raise ExpressionError(f"round() digits must be an integer, not {ndigits!r}")
+    if abs(ndigits) > MAX_ROUND_DIGITS:
+        raise LimitError(f"round() digits {ndigits} exceed {MAX_ROUND_DIGITS}")
+    return round(number, ndigits)
+
+
+FUNCTIONS = {
+    "abs": abs,
+    "round": _round,
+    "min": min,
+    "max": max,
+    "sqrt": math.sqrt,
+    "exp": math.exp,
+    "log": math.log,
+    "log10": math.log10,
+    "sin": math.sin,
+    "cos": math.cos,
+    "tan": math.tan,
+    "floor": math.floor,
+    "ceil": math.ceil,
+}
+CONSTANTS = {"pi": math.pi, "e": math.e, "tau": math.tau}
+
+_PLACEHOLDER = re.compile(r"_c\d+")
+_BINOPS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow)
+_UNARYOPS = (ast.UAdd, ast.USub)
+
+
+class ExpressionError(ValueError):
+    """The expression is not allowed, exceeds a limit, or cannot be evaluated."""
+
+
+class LimitError(ExpressionError):
+    """Arithmetic that is well-formed but too large or too deep to evaluate."""
+
+
+def _pow(base, exponent):
+    if isinstance(exponent, (int, float)) and abs(exponent) > MAX_EXPONENT:
+        raise LimitError(f"exponent {exponent} exceeds {MAX_EXPONENT}")
+    if isinstance(base, int) and isinstance(exponent, int) and exponent > 0 and abs(base) > 1:
+        if math.log2(abs(base)) * exponent > MAX_RESULT_BITS:
+            raise LimitError(f"result of {base} ** {exponent} exceeds {MAX_RESULT_BITS} bits")
+    return base**exponent
+
+
+def _bounded(result, symbol):
+    if isinstance(result, int) and result.bit_length() > MAX_RESULT_BITS:
+        raise LimitError(f"result of {symbol} exceeds {MAX_RESULT_BITS} bits")
+    return result
+
+
+def _mul(left, right):
+    return _bounded(left * right, "*")
+
+
+def _floordiv(left, right):
+    return _bounded(left // right, "//")
+
+
+def _array_pow(base, exponent):
+    import numpy as np
+
+    if np.any(np.abs(exponent) > MAX_EXPONENT):
+        raise LimitError(f"exponent exceeds {MAX_EXPONENT}")
+    return np.power(base, exponent)
+
+
+class _Validator(ast.NodeVisitor):
+    def __init__(self, placeholders: bool = False):
+        # Templates (see _template) have their literals replaced by `_c<i>` names
+        self.placeholders = placeholders
+        self.nodes = 0
+        self.power_depth = 0
+        self.variables: set[str] = set()
+        self.operations = 0
+
+    def generic_visit(self, node):
+        raise ExpressionError(f"{type(node).__name__} is not allowed")
+
+    def _count(self):
+        self.nodes += 1
+        if self.nodes > MAX_NODES:
+            raise LimitError(f"expression has more than {MAX_NODES} nodes")
+
+    def visit_Expression(self, node):
+        self.visit(node.body)
+
+    def visit_Constant(self, node):
+        self._count()
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+            raise ExpressionError(f"literal {node.value!r} is not a number")
+        if abs(node.value) > MAX_OPERAND:
+            raise LimitError(f"operand {node.value} exceeds {MAX_OPERAND}")
+
+    def visit_Name(self, node):
+        self._count()
+        if node.id in FUNCTIONS:
+            raise ExpressionError(f"{node.id} must be called")
+        if self.placeholders and _PLACEHOLDER.fullmatch(node.id):
+            return
+        if node.id.startswith("_"):
+            raise ExpressionError(f"name {node.id} is not allowed")
+        if node.id not in CONSTANTS:
+            self.variables.add(node.id)
+
+    def visit_UnaryOp(self, node):
+        self._count()
+        if not isinstance(node.op, _UNARYOPS):
+            raise ExpressionError(f"{type(node.op).__name__} is not allowed")
+        self.visit(node.operand)
+
+    def visit_BinOp(self, node):
+        self._count()
+        if not isinstance(node.op, _BINOPS):
+            raise ExpressionError(f"{type(node.op).__name__} is not allowed")
+        self.operations += 1
+        is_pow = isinstance(node.op, ast.Pow)
+        if is_pow:
+            self.power_depth += 1
+            if self.power_depth > MAX_POWER_DEPTH:
+                raise LimitError(f"powers nested deeper than {MAX_POWER_DEPTH}")
+        self.visit(node.left)
+        self.visit(node.right)
+        if is_pow:
+            self.power_depth -= 1
+
+    def visit_Call(self, node):
+        self._count()
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+            raise ExpressionError("only calls to " + ", ".join(FUNCTIONS) + " are allowed")
+        if node.keywords:
+            raise ExpressionError("keyword arguments are not allowed")
+        self.operations += 1
+        for arg in node.args:
+            self.visit(arg)
+
+
+class _Rewriter(ast.NodeTransformer):
+    """`a ** b` -> `_pow(a, b)`, `a * b` -> `_mul(a, b)`, `a // b` -> `_floordiv(a, b)`."""
+
+    GUARDED = {ast.Pow: "_pow", ast.Mult: "_mul", ast.FloorDiv: "_floordiv"}
+
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        guard = self.GUARDED.get(type(node.op))
+        if guard is not None:
+            return ast.copy_location(
+                ast.Call(func=ast.Name(id=guard, ctx=ast.Load()), args=[node.left, node.right], keywords=[]), node
+            )
+        return node
+
+
+class Expression:
+    """A validated, compiled expression."""
+
+    __slots__ = ("source", "variables", "operations", "_code")
+
+    def __init__(self, source: str, variables: frozenset, operations: int, code):
+        self.source = source
+        self.variables = variables
+        self.operations = operations
+        self._code = code
+
+    def __call__(self, **variables: Any):
+        missing = self.variables - variables.keys()
+        if missing:
+            raise ExpressionError("missing value for " + ", ".join(sorted(missing)))
+        try:
+            return eval(self._code, _SCALAR_NAMESPACE, variables)
+        except ExpressionError:
+            raise
+        except (ArithmeticError, ValueError, TypeError) as e:
+            raise ExpressionError(str(e)) from e
+
+    def __repr__(self) -> str:
+        return f"Expression({self.source!r})"
+
+
+_SCALAR_NAMESPACE = {
+    "__builtins__": {},
+    "_pow": _pow,
+    "_mul": _mul,
+    "_floordiv": _floordiv,
+    **FUNCTIONS,
+    **CONSTANTS,
+}
+
+
+def _parse(source: str, placeholders: bool = False) -> tuple[ast.Expression, _Validator]:
+    if len(source) > MAX_LENGTH:
+        raise LimitError(f"expression longer than {MAX_LENGTH} characters")
+    try:
+        tree = ast.parse(source.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ExpressionError(f"invalid expression: {e.msg}") from e
+    validator = _Validator(placeholders)
+    validator.visit(tree)
+    return tree, validator
+
+
+@lru_cache(maxsize=4096)
+def compile_expression(source: str) -> Expression:
+    """Parse, validate and compile `source` (cached); raises ExpressionError."""
+    tree, validator = _parse(source)
+    tree = ast.fix_missing_locations(_Rewriter().visit(tree))
+    code = compile(tree, "<expression>", "eval")
+    return Expression(source, frozenset(validator.variables), validator.operations, code)
+
+
+def evaluate(source: str, **variables: Any):
+    return compile_expression(source)(**variables)
+
+
+def format_number(value: Any) -> str:
+    """Display form of a result; raises ExpressionError if it cannot be shown."""
+    if isinstance(value, float):
+        if value.is_integer() and abs(value) < 1e15:
+            return str(int(value))
+        return format(value, ".12g")
+    try:
+        return str(value)
+    except ValueError as e:
+        # int too long for str() (sys.set_int_max_str_digits)
+        raise LimitError(str(e)) from e
+
+
+# --- NumPy batch evaluation ---
+
+
+_NUMBER = re.compile(r"(?<![\w.])(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?(?![\w.])")
+
+
+def _template(source: str) -> tuple[str, list[float]]:
+    """"2 + 3*4" -> ("_c0 + _c1*_c2", [2.0, 3.0, 4.0]), without parsing."""
+    literals: list[float] = []
+
+    def lift(match: re.Match) -> str:
+        literals.append(float(match.group()))
+        return f"_c{len(literals) - 1}"
+
+    template = _NUMBER.sub(lift, " ".join(source.split()))
+    if any(abs(v) > MAX_OPERAND for v in literals):
+        raise LimitError(f"operand exceeds {MAX_OPERAND}")
+    return template, literals
+
+
+@lru_cache(maxsize=1024)
+def _compile_template(template: str) -> Any:
+    tree, validator = _parse(template, placeholders=True)
+    if validator.variables:
+        raise ExpressionError("missing value for " + ", ".join(sorted(validator.variables)))
+    return compile(ast.fix_missing_locations(_Rewriter().visit(tree)), "<template>", "eval")
+
+
+def _array_namespace() -> dict:
+    import numpy as np
+
+    return {
+        "__builtins__": {},
+        "_pow": _array_pow,
+        "_mul": np.multiply,
+        "_floordiv": np.floor_divide,
+        "abs": np.abs,
+        "round": np.round,
+        "min": np.minimum,
+        "max": np.maximum,
+        "sqrt": np.sqrt,
+        "exp": np.exp,
+        "log": np.log,
+        "log10": np.log10,
+        "sin": np.sin,
+        "cos": np.cos,
+        "tan": np.tan,
+        "floor": np.floor,
+        "ceil": np.ceil,
+        **CONSTANTS,
+    }
+
+
+def evaluate_many(sources: Iterable[str]) -> list[Optional[float]]:
+    """Evaluate variable-free expressions, vectorized per shared template.
+
+    Results are float64; an invalid expression yields None in its slot.
+    """
+    import numpy as np
+
+    sources = list(sources)
+    results: list[Optional[float]] = [None] * len(sources)
+    groups: dict[str, tuple[list[int], list[list[float]]]] = {}
+    for i, source in enumerate(sources):
+        try:
+            template, literals = _template(source)
+        except ExpressionError:
+            continue
+        indexes, rows = groups.setdefault(template, ([], []))
+        indexes.append(i)
+        rows.append(literals)
+    namespace = _array_namespace()
+    with np.errstate(all="ignore"):
+        for template, (indexes, literals) in groups.items():
+            try:
+                code = _compile_template(template)
+            except ExpressionError:
+                continue
+            columns = np.array(literals, dtype=np.float64).T if literals[0] else []
+            values = {f"_c{j}": column for j, column in enumerate(columns)}
+            try:
+                out = np.broadcast_to(eval(code, namespace, values), (len(indexes),))
+            except (ExpressionError, ArithmeticError, ValueError, TypeError):
+                # Fall back to exact scalar evaluation for this template
+                for i in indexes:
+                    try:
+                        results[i] = float(evaluate(sources[i]))
+                    except (ExpressionError, OverflowError):
+                        pass
+                continue
+            for i, value in zip(indexes, out.tolist()):
+                results[i] = value if math.isfinite(value) else None
+    return results
+
+
+def sweep(source: str, **variables: Any):
+    """Evaluate one expression over arrays of variable values (NumPy broadcasting)."""
+    import numpy as np
+
+    expression = compile_expression(source)
+    missing = expression.variables - variables.keys()
+    if missing:
+        raise ExpressionError("missing value for " + ", ".join(sorted(missing)))
+    arrays = {k: np.asarray(v, dtype=np.float64) for k, v in variables.items()}
+    shape = np.broadcast_shapes(*(a.shape for a in arrays.values()))
+    with np.errstate(all="ignore"):
+        try:
+            # An expression that ignores the variables ("2 for x in 0..3") is a scalar
+            return np.broadcast_to(eval(expression._code, _array_namespace(), arrays), shape)
+        except ExpressionError:
+            raise
+        except (ArithmeticError, ValueError, TypeError) as e:
+            raise ExpressionError(str(e)) from e
+
+
+_SWEEP = re.compile(
+    r"^(?P<expr>.+?)\s+for\s+(?P<var>[a-z_]\w*)\s+in\s+"
+    r"(?P<start>-?(?:\d+\.?\d*|\.\d+))\s*(?:\.\.|:)\s*(?P<stop>-?(?:\d+\.?\d*|\.\d+))"
+    r"(?:\s*(?:step|:)\s*(?P<step>\d+\.?\d*|\.\d+))?\s*$",
+    re.IGNORECASE,
+)
+MAX_SWEEP_POINTS = 100_000
+
+
+def parse_sweep(text: str) -> Optional[tuple[str, str, Any]]:
+    """`x**2 + 1 for x in 0..10 step 0.5` -> (expression, variable, values), else None."""
+    match = _SWEEP.match(text.strip())
+    if not match:
+        return None
+    import numpy as np
+
+    try:
+        start, stop = float(match["start"]), float(match["stop"])
+        step = float(match["step"] or 1)
+    except ValueError as e:
+        raise ExpressionError(f"invalid sweep range: {e}") from e
+    if step <= 0 or (stop - start) / step + 1 > MAX_SWEEP_POINTS:
+        raise LimitError(f"sweep must have a positive step and at most {MAX_SWEEP_POINTS} points")
+    # Inclusive range: 0..10 step 1 gives 11 points
+    values = start + step * np.arange(int(math.floor((stop - start) / step + 1e-9)) + 1)
+    return match["expr"], match["var"], values
@@ -0,0 +1,196 @@
+"""
+Fake chat model used as a local stand-in for the real providers.
+
+Latency and output size are configurable so the rest of the stack (rate
+limiting, caching, graphs, server) can be exercised without network access.
+Like a provider client, a call given `timeout=<seconds>` fails with
+TimeoutError once its reply would take longer than that.
+Selected for every model when LLM_PROVIDER=fake.
+"""
+import asyncio
+import hashlib
+import math
+import os
+import random
+import time
+from typing import Any, AsyncIterator, Callable, Iterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+_WORDS = (
+    "agent graph node state message token stream cache model latency answer "
+    "draft outline section story poem joke tagline plan worker result summary"
+).split()
+
+
+def parse_latency(spec: str | float | None) -> Callable[[random.Random], float]:
+    """Build a latency sampler (seconds) from a spec.
+
+    Accepted forms: ``0.2``, ``fixed:0.2``, ``uniform:0.1,0.5``,
+    ``lognormal:<median>,<sigma>`` and ``pareto:<scale>,<alpha>`` (heavy tail).
+    """
+    if spec is None or spec == "":
+        return lambda rng: 0.0
+    if isinstance(spec, (int, float)):
+        return lambda rng: float(spec)
+    kind, _, args = spec.partition(":")
+    if not args:
+        kind, args = "fixed", kind
+    values = [float(v) for v in args.split(",")]
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "lognormal":
+        mu = math.log(values[0])
+        return lambda rng: rng.lognormvariate(mu, values[1])
+    if kind == "pareto":
+        return lambda rng: values[0] * rng.paretovariate(values[1])
+    raise ValueError(f"unknown latency distribution: {spec!r}")
+
+
+def _timed_out(timeout: Optional[float]) -> TimeoutError:
+    return TimeoutError(f"fake model: request timed out after {timeout:.2f}s")
+
+
+def _prompt_text(messages: List[BaseMessage]) -> str:
+    return "\n".join(m.content if isinstance(m.content, str) else str(m.content) for m in messages)
+
+
+class FakeChatModel(BaseChatModel):
+    """Deterministic chat model: the same prompt always yields the same reply."""
+
+    model_name: str = "fake"
+    latency: str | float | None = None
+    """Total response latency spec, see `parse_latency`."""
+    output_tokens: int = 32
+    seed: int = 0
+    responder: Optional[Callable[[str], str]] = None
+    """Optional hook mapping the prompt text to a reply (replaces the generated words)."""
+
+    _rng: random.Random = PrivateAttr()
+    _sample: Callable[[random.Random], float] = PrivateAttr()
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._rng = random.Random(self.seed)
+        self._sample = parse_latency(self.latency)
+
+    @classmethod
+    def from_env(cls, model_name: str) -> "FakeChatModel":
+        return cls(
+            model_name=model_name,
+            latency=os.environ.get("FAKE_LLM_LATENCY") or None,
+            output_tokens=int(os.environ.get("FAKE_LLM_OUTPUT_TOKENS", "32")),
+            seed=int(os.environ.get("FAKE_LLM_SEED", "0")),
+        )
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {"model_name": self.model_name}
+
+    def _reply(self, messages: List[BaseMessage]) -> tuple[AIMessage, float]:
+        prompt = _prompt_text(messages)
+        if self.responder is not None:
+            text = self.responder(prompt)
+        else:
+            digest = hashlib.sha256(f"{self.model_name}\n{prompt}".encode()).digest()
+            rng = random.Random(digest)
+            text = " ".join(rng.choice(_WORDS) for _ in range(self.output_tokens))
+        prompt_tokens = max(1, len(prompt) // 4)
+        completion_tokens = len(text.split())
+        message = AIMessage(
+            content=text,
+            response_metadata={"model_name": self.model_name},
+            usage_metadata={
+                "input_tokens": prompt_tokens,
+                "output_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        )
+        return message, max(0.0, self._sample(self._rng))
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        message, delay = self._reply(messages)
+        timeout = kwargs.get("timeout")
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise _timed_out(timeout)
+        time.sleep(delay)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        message, delay = self._reply(messages)
+        timeout = kwargs.get("timeout")
+        if timeout is not None and delay > timeout:
+            await asyncio.sleep(timeout)
+            raise _timed_out(timeout)
+        await asyncio.sleep(delay)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _chunks(self, message: AIMessage) -> list[ChatGenerationChunk]:
+        words = message.content.split(" ")
+        chunks = [
+            ChatGenerationChunk(message=AIMessageChunk(content=w if i == 0 else " " + w))
+            for i, w in enumerate(words)
+        ]
+        chunks[-1].message.usage_metadata = message.usage_metadata
+        return chunks
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        message, delay = self._reply(messages)
+        chunks = self._chunks(message)
+        timeout = kwargs.get("timeout")
+        for i, chunk in enumerate(chunks):
+            if timeout is not None and delay * (i + 1) / len(chunks) > timeout:
+                time.sleep(max(0.0, timeout - delay * i / len(chunks)))
+                raise _timed_out(timeout)
+            time.sleep(delay / len(chunks))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.message.content, chunk=chunk)
+            yield chunk
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        message, delay = self._reply(messages)
+        chunks = self._chunks(message)
+        timeout = kwargs.get("timeout")
+        for i, chunk in enumerate(chunks):
+            if timeout is not None and delay * (i + 1) / len(chunks) > timeout:
+                await asyncio.sleep(max(0.0, timeout - delay * i / len(chunks)))
+                raise _timed_out(timeout)
+            await asyncio.sleep(delay / len(chunks))
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.message.content, chunk=chunk)
+            yield chunk
@@ -0,0 +1,37 @@
+"""
+Load the graphs declared in langgraph.json the same way the dev server does.
+"""
+import importlib.util
+import json
+import sys
+from pathlib import Path
+from types import ModuleType
+from typing import Any
+
+ROOT = Path(__file__).resolve().parent.parent
+CONFIG = ROOT / "langgraph.json"
+
+
+def graph_specs(config: Path = CONFIG) -> dict[str, tuple[Path, str]]:
+    """graph_id -> (module path, attribute) from a langgraph.json."""
+    graphs = json.loads(Path(config).read_text()).get("graphs", {})
+    specs = {}
+    for graph_id, spec in graphs.items():
+        path, _, attr = spec.rpartition(":")
+        specs[graph_id] = ((Path(config).parent / path).resolve(), attr or "app")
+    return specs
+
+
+def load_module(graph_id: str, config: Path = CONFIG) -> ModuleType:
+    path, _ = graph_specs(config)[graph_id]
+    name = f"agents_{graph_id}"
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_graph(graph_id: str, config: Path = CONFIG) -> Any:
+    _, attr = graph_specs(config)[graph_id]
+    return getattr(load_module(graph_id, config), attr)
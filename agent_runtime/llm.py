@@ -0,0 +1,588 @@
+"""
+Shared LLM client registry.
+
+Every agent gets its model through `get_llm(model, graph=...)` instead of
+building its own `ChatOpenAI`. For each model the registry keeps:
+
+- one provider client with a pooled keep-alive HTTP connection pool, built
+  on the first call (importing an agent does not import the provider SDK),
+- one `ModelGate`: a cap on concurrent calls plus token buckets for
+  requests/min and tokens/min, granting waiting calls round-robin across
+  graphs so a fan-out graph cannot starve the others.
+
+Calls can also go through the exact-match response cache (see cache.py):
+per graph with `get_llm(..., cache=True)`, per call with `llm.invoke(..., cache=True)`.
+Identical calls running at the same time share one provider call (see
+singleflight.py); per call, `llm.invoke(..., singleflight=False)` opts out.
+Inside a node, every call is bounded by its run's deadline (see deadline.py).
+
+Limits come from the environment:
+
+    LLM_PROVIDER=openai|fake      fake = local FakeChatModel for every model
+    LLM_MAX_CONCURRENCY=16        default per-model concurrent calls (0 = unlimited)
+    LLM_RPM=500  LLM_TPM=200000   default per-model requests/tokens per minute (0 = unlimited)
+    LLM_LIMITS='{"gpt-4o-mini": {"rpm": 5000, "tpm": 2000000, "concurrency": 64}}'
+    LLM_SINGLEFLIGHT=1            0 = every call goes to the provider, even if an identical one is in flight
+    LLM_TIMEOUT=60                cap on one call, within the run's deadline (deadline.py)
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Iterator, Optional, Union
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage, BaseMessageChunk
+
+from . import deadline
+from .cache import ResponseCache, cache_key
+from .deadline import DeadlineExceeded
+from .fake import FakeChatModel
+from .metrics import metrics
+from .singleflight import SingleFlight
+
+# Share of a per-minute budget that may be spent in a single burst
+BURST_FRACTION = 0.1
+EXPECTED_COMPLETION_TOKENS = int(os.environ.get("LLM_EXPECTED_COMPLETION_TOKENS", "256"))
+
+
+def estimate_tokens(input: Any) -> int:
+    """Rough prompt size (4 chars per token), good enough for rate limiting."""
+    if isinstance(input, str):
+        return max(1, len(input) // 4)
+    if hasattr(input, "to_messages"):
+        input = input.to_messages()
+    chars = 0
+    for m in input:
+        content = m.get("content", "") if isinstance(m, dict) else getattr(m, "content", m)
+        chars += len(content) if isinstance(content, str) else len(str(content))
+    return max(1, chars // 4)
+
+
+class TokenBucket:
+    """Refills at `per_minute / 60` units per second; `per_minute <= 0` disables the bucket."""
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, per_minute * BURST_FRACTION)
+        self.level = self.capacity
+        self.stamp = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def delay(self, cost: float) -> float:
+        """Seconds until `cost` units can be taken (0 if available now)."""
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        # A request larger than the whole bucket goes through once the bucket is full
+        needed = min(cost, self.capacity)
+        return 0.0 if self.level >= needed else (needed - self.level) / self.rate
+
+    def take(self, cost: float) -> None:
+        if self.rate > 0:
+            self.level -= cost
+
+
+class _Ticket:
+    __slots__ = ("graph", "cost", "granted", "event", "loop", "future")
+
+    def __init__(self, graph: str, cost: int, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.graph = graph
+        self.cost = cost
+        self.granted = False
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+
+    @property
+    def abandoned(self) -> bool:
+        """The async waiter was cancelled and has not withdrawn its ticket yet."""
+        return self.future is not None and self.future.cancelled()
+
+    def grant(self) -> None:
+        self.granted = True
+        if self.event is not None:
+            self.event.set()
+        elif asyncio._get_running_loop() is self.loop:
+            # The future may have been cancelled since the ticket was queued
+            _resolve(self.future)
+        else:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class ModelGate:
+    """Admission for one model: concurrency cap, rpm/tpm buckets, round-robin across graphs.
+
+    Works for both sync callers (blocking on an Event) and async callers
+    (awaiting a Future), since sync and async nodes share the same limits.
+    """
+
+    def __init__(self, model: str, concurrency: int = 0, rpm: float = 0, tpm: float = 0):
+        self.model = model
+        self.concurrency = concurrency
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.in_flight = 0
+        self.granted = 0
+        self.wait_seconds = 0.0
+        self._queues: dict[str, deque[_Ticket]] = {}
+        self._turn: deque[str] = deque()
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+
+    def _dispatch(self) -> None:
+        """Grant queued tickets while capacity allows. Caller holds the lock."""
+        while self._turn:
+            if self.concurrency and self.in_flight >= self.concurrency:
+                return
+            graph = self._turn[0]
+            ticket = self._queues[graph][0]
+            if ticket.abandoned:
+                self._next(graph)
+                continue
+            wait = max(self.requests.delay(1), self.tokens.delay(ticket.cost))
+            if wait > 0:
+                if self._timer is None:
+                    self._timer = threading.Timer(wait, self._on_timer)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+            self.requests.take(1)
+            self.tokens.take(ticket.cost)
+            self.in_flight += 1
+            self.granted += 1
+            self._next(graph)
+            ticket.grant()
+
+    def _next(self, graph: str) -> None:
+        """Pop the head ticket of `graph`, whose turn it is, and pass the turn on."""
+        self._queues[graph].popleft()
+        self._turn.popleft()
+        if self._queues[graph]:
+            self._turn.append(graph)
+        else:
+            del self._queues[graph]
+
+    def _on_timer(self) -> None:
+        with self._lock:
+            self._timer = None
+            self._dispatch()
+
+    def _enqueue(self, ticket: _Ticket) -> None:
+        if ticket.graph not in self._queues:
+            self._queues[ticket.graph] = deque()
+            self._turn.append(ticket.graph)
+        self._queues[ticket.graph].append(ticket)
+        self._dispatch()
+
+    def _withdraw(self, ticket: _Ticket) -> None:
+        queue = self._queues.get(ticket.graph)
+        if queue and ticket in queue:
+            queue.remove(ticket)
+            if not queue:
+                del self._queues[ticket.graph]
+                self._turn.remove(ticket.graph)
+
+    def acquire(self, graph: str, cost: int, timeout: Optional[float] = None) -> None:
+        """Wait for a slot; TimeoutError (and the place in the queue given up) after `timeout` seconds."""
+        started = time.monotonic()
+        ticket = _Ticket(graph, cost)
+        with self._lock:
+            self._enqueue(ticket)
+        if not ticket.event.wait(timeout):
+            with self._lock:
+                if not ticket.granted:
+                    self._withdraw(ticket)
+                    raise TimeoutError(f"{self.model}: no slot within {timeout:.1f}s")
+        with self._lock:
+            self.wait_seconds += time.monotonic() - started
+
+    async def aacquire(self, graph: str, cost: int) -> None:
+        started = time.monotonic()
+        ticket = _Ticket(graph, cost, loop=asyncio.get_running_loop())
+        with self._lock:
+            self._enqueue(ticket)
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            with self._lock:
+                if ticket.granted:
+                    # Granted before the cancellation reached us: hand the slot on
+                    self.in_flight -= 1
+                    self._dispatch()
+                else:
+                    self._withdraw(ticket)
+            raise
+        with self._lock:
+            self.wait_seconds += time.monotonic() - started
+
+    def release(self, estimated: int = 0, actual: Optional[int] = None) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            if actual is not None:
+                # Settle the tpm bucket with the real usage reported by the provider
+                self.tokens.take(actual - estimated)
+            self._dispatch()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": self.in_flight,
+                "queued": {g: len(q) for g, q in self._queues.items()},
+                "granted": self.granted,
+                "wait_seconds": round(self.wait_seconds, 3),
+            }
+
+
+def _bounded(kwargs: dict) -> dict:
+    """`kwargs` plus the time left to a sync call as the provider client's `timeout`,
+    so the HTTP request itself is aborted at the run's deadline (see deadline.py)."""
+    limit = deadline.timeout()
+    return kwargs if limit is None else {**kwargs, "timeout": limit}
+
+
+def _usage_tokens(message: Any) -> Optional[int]:
+    usage = getattr(message, "usage_metadata", None)
+    return usage.get("total_tokens") if usage else None
+
+
+class ManagedChatModel:
+    """What agents call: a provider client behind its model's gate, tagged with the calling graph."""
+
+    def __init__(
+        self,
+        model: str,
+        graph: str,
+        client: Union[BaseChatModel, Callable[[], BaseChatModel]],
+        gate: ModelGate,
+        params: Optional[dict] = None,
+        cache: bool = False,
+        response_cache: Optional[ResponseCache] = None,
+        flights: Optional[SingleFlight] = None,
+    ):
+        self.model = model
+        self.graph = graph
+        # A callable builds the provider client on first call, not when the agent module is imported
+        self._client = client if isinstance(client, BaseChatModel) else None
+        self._connect = None if isinstance(client, BaseChatModel) else client
+        self.gate = gate
+        self.params = params or {}
+        self.max_tokens = self.params.get("max_tokens")
+        self.cache = cache
+        self.response_cache = response_cache
+        self.flights = flights
+
+    @property
+    def client(self) -> BaseChatModel:
+        if self._client is None:
+            self._client = self._connect()
+        return self._client
+
+    @client.setter
+    def client(self, client: BaseChatModel) -> None:
+        self._client = client
+
+    def _cost(self, input: Any) -> int:
+        return estimate_tokens(input) + (self.max_tokens or EXPECTED_COMPLETION_TOKENS)
+
+    def _cache_lookup(self, input: Any, cache: Optional[bool], kwargs: dict) -> tuple[Optional[str], Optional[BaseMessage]]:
+        store = self.response_cache
+        if not (self.cache if cache is None else cache) or store is None or not store.enabled:
+            return None, None
+        key = cache_key(self.model, {**self.params, **kwargs}, input)
+        return key, store.get(key)
+
+    def _flight_key(self, kind: str, input: Any, singleflight: Optional[bool], kwargs: dict, key: Optional[str]) -> Optional[tuple]:
+        """Key shared by identical calls (same model, params and prompt), None to call the provider directly."""
+        if singleflight is False or self.flights is None or not self.flights.enabled:
+            return None
+        return kind, key or cache_key(self.model, {**self.params, **kwargs}, input)
+
+    def _raise_missed(self, error: Exception) -> None:
+        """Count `error` as a deadline miss of the calling node and raise it as
+        DeadlineExceeded if the run's deadline has passed; return otherwise."""
+        left = deadline.remaining()
+        if not isinstance(error, DeadlineExceeded) and (left is None or left > 0):
+            return
+        metrics.deadline_missed()
+        if not isinstance(error, DeadlineExceeded):
+            raise DeadlineExceeded(f"{self.model}: run deadline passed during the call") from error
+
+    def invoke(
+        self, input: Any, config: Optional[dict] = None, *, cache: Optional[bool] = None,
+        singleflight: Optional[bool] = None, **kwargs: Any,
+    ) -> BaseMessage:
+        try:
+            key, hit = self._cache_lookup(input, cache, kwargs)
+            if hit is not None:
+                metrics.cache_hit(self.graph, self.model)
+                return hit
+            flight = self._flight_key("invoke", input, singleflight, kwargs, key)
+            if flight is None:
+                return self._invoke(input, config, kwargs, key)
+            return self.flights.call(flight, partial(self._invoke, input, config, kwargs, key), self.graph, self.model,
+                                     deadline.timeout())
+        except Exception as e:
+            self._raise_missed(e)
+            raise
+
+    def _invoke(self, input: Any, config: Optional[dict], kwargs: dict, key: Optional[str]) -> BaseMessage:
+        cost = self._cost(input)
+        started = metrics.llm_started()
+        result = None
+        try:
+            self.gate.acquire(self.graph, cost, deadline.timeout())
+            try:
+                result = self.client.invoke(input, config, **_bounded(kwargs))
+            finally:
+                self.gate.release(cost, _usage_tokens(result))
+        finally:
+            metrics.llm_finished(self.graph, self.model, started, result, failed=result is None)
+        if key is not None:
+            self.response_cache.put(key, result)
+        return result
+
+    async def ainvoke(
+        self, input: Any, config: Optional[dict] = None, *, cache: Optional[bool] = None,
+        singleflight: Optional[bool] = None, **kwargs: Any,
+    ) -> BaseMessage:
+        try:
+            async with asyncio.timeout(deadline.timeout()):
+                key, hit = self._cache_lookup(input, cache, kwargs)
+                if hit is not None:
+                    metrics.cache_hit(self.graph, self.model)
+                    return hit
+                flight = self._flight_key("invoke", input, singleflight, kwargs, key)
+                if flight is None:
+                    return await self._ainvoke(input, config, kwargs, key)
+                return await self.flights.acall(flight, partial(self._ainvoke, input, config, kwargs, key),
+                                                self.graph, self.model, deadline.timeout())
+        except Exception as e:
+            self._raise_missed(e)
+            raise
+
+    async def _ainvoke(self, input: Any, config: Optional[dict], kwargs: dict, key: Optional[str]) -> BaseMessage:
+        cost = self._cost(input)
+        started = metrics.llm_started()
+        result = None
+        try:
+            await self.gate.aacquire(self.graph, cost)
+            try:
+                result = await self.client.ainvoke(input, config, **kwargs)
+            finally:
+                self.gate.release(cost, _usage_tokens(result))
+        finally:
+            metrics.llm_finished(self.graph, self.model, started, result, failed=result is None)
+        if key is not None:
+            self.response_cache.put(key, result)
+        return result
+
+    def stream(
+        self, input: Any, config: Optional[dict] = None, *, singleflight: Optional[bool] = None, **kwargs: Any,
+    ) -> Iterator[BaseMessageChunk]:
+        chunks = None
+        try:
+            flight = self._flight_key("stream", input, singleflight, kwargs, None)
+            if flight is None:
+                chunks = self._stream(input, config, kwargs)
+            else:
+                chunks = self.flights.stream(flight, partial(self._stream, input, config, kwargs), self.graph,
+                                             self.model, deadline.timeout())
+            for chunk in chunks:
+                yield chunk
+                deadline.timeout()  # raises once the deadline has passed, before the next chunk
+        except Exception as e:
+            self._raise_missed(e)
+            raise
+        finally:
+            if chunks is not None:
+                chunks.close()
+
+    def _stream(self, input: Any, config: Optional[dict], kwargs: dict) -> Iterator[BaseMessageChunk]:
+        cost = self._cost(input)
+        started = metrics.llm_started()
+        last, failed = None, False
+        try:
+            self.gate.acquire(self.graph, cost, deadline.timeout())
+            try:
+                for chunk in self.client.stream(input, config, **_bounded(kwargs)):
+                    if getattr(chunk, "usage_metadata", None):
+                        last = chunk
+                    yield chunk
+            finally:
+                self.gate.release(cost, _usage_tokens(last))
+        except Exception:
+            failed = True
+            raise
+        finally:
+            metrics.llm_finished(self.graph, self.model, started, last, failed)
+
+    async def astream(
+        self, input: Any, config: Optional[dict] = None, *, singleflight: Optional[bool] = None, **kwargs: Any,
+    ) -> AsyncIterator[BaseMessageChunk]:
+        chunks = None
+        try:
+            flight = self._flight_key("stream", input, singleflight, kwargs, None)
+            if flight is None:
+                chunks = self._astream(input, config, kwargs)
+            else:
+                chunks = self.flights.astream(flight, partial(self._astream, input, config, kwargs), self.graph,
+                                              self.model, deadline.timeout())
+            while True:
+                # Each chunk must come before the deadline (and within LLM_TIMEOUT)
+                async with asyncio.timeout(deadline.timeout()):
+                    try:
+                        chunk = await anext(chunks)
+                    except StopAsyncIteration:
+                        return
+                yield chunk
+        except Exception as e:
+            self._raise_missed(e)
+            raise
+        finally:
+            if chunks is not None:
+                await chunks.aclose()
+
+    async def _astream(self, input: Any, config: Optional[dict], kwargs: dict) -> AsyncIterator[BaseMessageChunk]:
+        cost = self._cost(input)
+        started = metrics.llm_started()
+        last, failed = None, False
+        try:
+            await self.gate.aacquire(self.graph, cost)
+            try:
+                async for chunk in self.client.astream(input, config, **kwargs):
+                    if getattr(chunk, "usage_metadata", None):
+                        last = chunk
+                    yield chunk
+            finally:
+                self.gate.release(cost, _usage_tokens(last))
+        except Exception:
+            failed = True
+            raise
+        finally:
+            metrics.llm_finished(self.graph, self.model, started, last, failed)
+
+
+class LLMRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients: dict[tuple, BaseChatModel] = {}
+        self._http: dict[str, tuple] = {}
+        self._gates: dict[str, ModelGate] = {}
+        self._handles: dict[tuple, ManagedChatModel] = {}
+        self._cache: Optional[ResponseCache] = None
+        self._flights: Optional[SingleFlight] = None
+
+    @property
+    def provider(self) -> str:
+        return os.environ.get("LLM_PROVIDER", "openai")
+
+    def limits(self, model: str) -> dict:
+        limits = {
+            "concurrency": int(os.environ.get("LLM_MAX_CONCURRENCY", "16")),
+            "rpm": float(os.environ.get("LLM_RPM", "500")),
+            "tpm": float(os.environ.get("LLM_TPM", "200000")),
+        }
+        limits.update(json.loads(os.environ.get("LLM_LIMITS", "{}")).get(model, {}))
+        return limits
+
+    @property
+    def cache(self) -> ResponseCache:
+        with self._lock:
+            if self._cache is None:
+                self._cache = ResponseCache.from_env()
+            return self._cache
+
+    @property
+    def flights(self) -> SingleFlight:
+        with self._lock:
+            if self._flights is None:
+                self._flights = SingleFlight.from_env()
+            return self._flights
+
+    def gate(self, model: str) -> ModelGate:
+        with self._lock:
+            if model not in self._gates:
+                self._gates[model] = ModelGate(model, **self.limits(model))
+            return self._gates[model]
+
+    def _http_clients(self, model: str) -> tuple:
+        import httpx
+
+        if model not in self._http:
+            size = self.limits(model)["concurrency"] or 100
+            limits = httpx.Limits(max_connections=size, max_keepalive_connections=size, keepalive_expiry=30)
+            self._http[model] = (httpx.Client(limits=limits), httpx.AsyncClient(limits=limits))
+        return self._http[model]
+
+    def _build(self, model: str, params: dict) -> BaseChatModel:
+        if self.provider == "fake":
+            return FakeChatModel.from_env(model)
+        if model.startswith("claude"):
+            from langchain_anthropic import ChatAnthropic
+
+            return ChatAnthropic(model=model, **params)
+        from langchain_openai import ChatOpenAI
+
+        http_client, http_async_client = self._http_clients(model)
+        # Token usage on streamed replies too (last chunk), for the tpm bucket and run budgets
+        params = {"stream_usage": True, **params}
+        return ChatOpenAI(model=model, http_client=http_client, http_async_client=http_async_client, **params)
+
+    def client(self, model: str, **params: Any) -> BaseChatModel:
+        key = (model, tuple(sorted(params.items())))
+        with self._lock:
+            if key not in self._clients:
+                self._clients[key] = self._build(model, params)
+            return self._clients[key]
+
+    def get(self, model: str, graph: str = "default", cache: bool = False, **params: Any) -> ManagedChatModel:
+        key = (model, graph, cache, tuple(sorted(params.items())))
+        with self._lock:
+            handle = self._handles.get(key)
+        if handle is not None:
+            return handle
+        # gate(), cache and flights take the lock themselves
+        gate, responses, flights = self.gate(model), self.cache, self.flights
+        with self._lock:
+            handle = self._handles.get(key)
+            if handle is None:
+                handle = self._handles[key] = ManagedChatModel(
+                    model, graph, partial(self.client, model, **params), gate, params, cache, responses, flights
+                )
+            return handle
+
+    def stats(self) -> dict:
+        return {
+            "models": {model: gate.stats() for model, gate in list(self._gates.items())},
+            "cache": self.cache.stats(),
+            "singleflight": self.flights.stats(),
+        }
+
+    def reset(self) -> None:
+        """Drop every client and gate (limits and provider are re-read on next use)."""
+        with self._lock:
+            self._clients.clear()
+            self._gates.clear()
+            self._handles.clear()
+            self._cache = None
+            self._flights = None
+
+
+registry = LLMRegistry()
+
+
+def get_llm(model: str, graph: str = "default", cache: bool = False, **params: Any) -> ManagedChatModel:
+    return registry.get(model, graph, cache, **params)
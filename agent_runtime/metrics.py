@@ -0,0 +1,514 @@
+"""
+In-process node and LLM metrics.
+
+Every node wrapped by `instrument(builder, graph)` (see nodes.py) records, per
+(graph, node):
+
+- wall time of the node,
+- LLM time: time during which at least one LLM call of the node was in flight
+  (gate wait included; concurrent calls count once),
+- own time: wall time minus LLM time, i.e. our code,
+- prompt / completion tokens reported by the provider,
+- LLM calls and response-cache hits,
+- LLM calls cut by the run's deadline and degraded paths taken (deadline.py),
+- for nodes calling a model cascade (cascade.py), the answers per rung of
+  the ladder, escalations and latency saved.
+
+The dev server launcher (devserver.py) also records how long each graph took
+to import and compile, and whether that happened at startup, in the warm-up
+pool or on the first request.
+
+Run admission (admission.py) adds, per graph, queue waits and admitted / shed
+requests.
+
+Each is aggregated into a fixed-bucket histogram; nothing leaves the process.
+`metrics.prometheus()` renders the Prometheus text format, `metrics.snapshot()`
+a JSON-friendly summary with estimated p50/p95/p99 (served by webapp.py).
+
+    AGENT_METRICS=1     0 disables recording (nodes are still wrapped, at no cost)
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Optional
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000)
+
+
+class Histogram:
+    """Cumulative-on-render histogram: per-bucket counts, sum and count."""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate by linear interpolation inside the bucket, like Prometheus' histogram_quantile."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                if i == len(self.bounds):
+                    return self.bounds[-1]
+                lower = self.bounds[i - 1] if i else 0.0
+                return lower + (self.bounds[i] - lower) * (rank - seen) / n
+            seen += n
+        return self.bounds[-1]
+
+    def summary(self, digits: int = 4) -> dict:
+        def rounded(v):
+            return None if v is None else round(v, digits)
+
+        return {
+            "count": self.count,
+            "sum": round(self.sum, digits),
+            "mean": rounded(self.sum / self.count if self.count else None),
+            "p50": rounded(self.quantile(0.5)),
+            "p95": rounded(self.quantile(0.95)),
+            "p99": rounded(self.quantile(0.99)),
+        }
+
+
+class NodeFrame:
+    """LLM activity of one node execution, filled by ManagedChatModel through the context."""
+
+    __slots__ = (
+        "graph", "node", "llm_seconds", "prompt_tokens", "completion_tokens", "calls", "cache_hits",
+        "deadline_misses", "degraded", "_active", "_since", "_lock",
+    )
+
+    def __init__(self, graph: str, node: str):
+        self.graph = graph
+        self.node = node
+        self.llm_seconds = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.calls = 0
+        self.cache_hits = 0
+        self.deadline_misses = 0
+        self.degraded = 0
+        self._active = 0
+        self._since = 0.0
+        # Fan-out nodes run LLM calls from several threads / tasks at once
+        self._lock = threading.Lock()
+
+    def llm_started(self) -> None:
+        with self._lock:
+            if not self._active:
+                self._since = time.perf_counter()
+            self._active += 1
+
+    def llm_finished(self, prompt_tokens: int, completion_tokens: int, call: bool = True) -> None:
+        with self._lock:
+            self._active -= 1
+            if not self._active:
+                self.llm_seconds += time.perf_counter() - self._since
+            self.calls += call
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+
+_current: ContextVar[Optional[NodeFrame]] = ContextVar("agent_node_frame", default=None)
+
+
+def current_frame() -> Optional[NodeFrame]:
+    return _current.get()
+
+
+def usage(message: Any) -> tuple[int, int]:
+    """(prompt, completion) tokens of a provider reply, zeros when not reported."""
+    meta = getattr(message, "usage_metadata", None)
+    if not meta:
+        return 0, 0
+    return meta.get("input_tokens", 0) or 0, meta.get("output_tokens", 0) or 0
+
+
+class _NodeStats:
+    __slots__ = ("wall", "llm", "own", "prompt_tokens", "completion_tokens", "errors", "deadline_misses", "degraded")
+
+    def __init__(self):
+        self.wall = Histogram(SECONDS_BUCKETS)
+        self.llm = Histogram(SECONDS_BUCKETS)
+        self.own = Histogram(SECONDS_BUCKETS)
+        self.prompt_tokens = Histogram(TOKEN_BUCKETS)
+        self.completion_tokens = Histogram(TOKEN_BUCKETS)
+        self.errors = 0
+        self.deadline_misses = 0
+        self.degraded = 0
+
+
+class _LLMStats:
+    __slots__ = ("calls", "cache_hits", "coalesced", "errors", "prompt_tokens", "completion_tokens", "seconds")
+
+    def __init__(self):
+        self.calls = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.seconds = Histogram(SECONDS_BUCKETS)
+
+
+class _CascadeStats:
+    __slots__ = ("ladder", "answered", "seconds")
+
+    def __init__(self, ladder: tuple):
+        self.ladder = ladder
+        self.answered = [0] * len(ladder)  # calls answered by each rung
+        self.seconds = Histogram(SECONDS_BUCKETS)
+
+    @property
+    def calls(self) -> int:
+        return sum(self.answered)
+
+    @property
+    def escalations(self) -> int:
+        """Calls that did not stop at the first rung."""
+        return self.calls - self.answered[0]
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels: Any) -> str:
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _histogram_lines(name: str, histograms: list[tuple[dict, Histogram]]) -> list[str]:
+    lines = []
+    for labels, h in histograms:
+        cumulative = 0
+        for bound, n in zip(h.bounds + ("+Inf",), h.counts):
+            cumulative += n
+            lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {cumulative}")
+        lines.append(f"{name}_sum{_labels(**labels)} {h.sum:.6f}")
+        lines.append(f"{name}_count{_labels(**labels)} {h.count}")
+    return lines
+
+
+class Metrics:
+    def __init__(self, enabled: Optional[bool] = None):
+        self.enabled = os.environ.get("AGENT_METRICS", "1") != "0" if enabled is None else enabled
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._nodes: dict[tuple[str, str], _NodeStats] = {}
+        self._llm: dict[tuple[str, str, str], _LLMStats] = {}
+        self._graphs: dict[str, dict] = {}
+        self._cascades: dict[tuple[str, str], _CascadeStats] = {}
+
+    # -- recording ---------------------------------------------------------
+
+    def enter_node(self, graph: str, node: str) -> tuple[Optional[NodeFrame], Any, float]:
+        if not self.enabled:
+            return None, None, 0.0
+        frame = NodeFrame(graph, node)
+        return frame, _current.set(frame), time.perf_counter()
+
+    def exit_node(self, frame: Optional[NodeFrame], token: Any, started: float, failed: bool = False) -> None:
+        if frame is None:
+            return
+        wall = time.perf_counter() - started
+        _current.reset(token)
+        with self._lock:
+            stats = self._nodes.get((frame.graph, frame.node))
+            if stats is None:
+                stats = self._nodes[(frame.graph, frame.node)] = _NodeStats()
+            stats.wall.observe(wall)
+            stats.llm.observe(frame.llm_seconds)
+            stats.own.observe(max(0.0, wall - frame.llm_seconds))
+            if frame.calls:
+                stats.prompt_tokens.observe(frame.prompt_tokens)
+                stats.completion_tokens.observe(frame.completion_tokens)
+            if failed:
+                stats.errors += 1
+            stats.deadline_misses += frame.deadline_misses
+            stats.degraded += frame.degraded
+
+    def _llm_stats(self, graph: str, node: str, model: str) -> _LLMStats:
+        key = (graph, node, model)
+        stats = self._llm.get(key)
+        if stats is None:
+            stats = self._llm[key] = _LLMStats()
+        return stats
+
+    def call_seconds(self, graph: str, node: str, q: float = 0.5) -> Optional[float]:
+        """Estimated `q` quantile of the duration of one LLM call of the node (its
+        slowest model), None before its first call. Runs that skipped their
+        calls (degraded paths) do not lower it."""
+        with self._lock:
+            values = [s.seconds.quantile(q) for (g, n, _), s in self._llm.items() if (g, n) == (graph, node) and s.seconds.count]
+        return max(values) if values else None
+
+    def llm_started(self) -> float:
+        frame = _current.get()
+        if frame is not None:
+            frame.llm_started()
+        return time.perf_counter()
+
+    def llm_finished(self, graph: str, model: str, started: float, reply: Any = None, failed: bool = False) -> None:
+        """One provider call ended; `reply` is the message (or last stream chunk) carrying usage."""
+        if not self.enabled:
+            return
+        seconds = time.perf_counter() - started
+        prompt, completion = usage(reply)
+        frame = _current.get()
+        if frame is not None:
+            frame.llm_finished(prompt, completion)
+            graph, node = frame.graph, frame.node
+        else:
+            node = ""
+        with self._lock:
+            stats = self._llm_stats(graph, node, model)
+            stats.calls += 1
+            stats.errors += failed
+            stats.prompt_tokens += prompt
+            stats.completion_tokens += completion
+            stats.seconds.observe(seconds)
+
+    def cache_hit(self, graph: str, model: str) -> None:
+        if not self.enabled:
+            return
+        frame = _current.get()
+        if frame is not None:
+            frame.cache_hits += 1
+            graph, node = frame.graph, frame.node
+        else:
+            node = ""
+        with self._lock:
+            self._llm_stats(graph, node, model).cache_hits += 1
+
+    def deadline_missed(self) -> None:
+        """An LLM call of the current node was cut (or refused) by the run's deadline (deadline.py)."""
+        frame = _current.get()
+        if frame is not None:
+            with frame._lock:
+                frame.deadline_misses += 1
+
+    def degraded(self) -> None:
+        """The current node took its degraded path for lack of time (deadline.py)."""
+        frame = _current.get()
+        if frame is not None:
+            with frame._lock:
+                frame.degraded += 1
+
+    def coalesced(self, graph: str, model: str, started: float) -> None:
+        """A call joined an identical one in flight (singleflight.py): LLM time for the node, no provider call."""
+        if not self.enabled:
+            return
+        frame = _current.get()
+        if frame is not None:
+            frame.llm_finished(0, 0, call=False)
+            graph, node = frame.graph, frame.node
+        else:
+            node = ""
+        with self._lock:
+            self._llm_stats(graph, node, model).coalesced += 1
+
+    def cascade_answered(self, graph: str, node: str, ladder: tuple, rung: int, seconds: float) -> None:
+        """A cascade (cascade.py) of `node` returned the answer of `ladder[rung]` after `seconds`."""
+        if not self.enabled:
+            return
+        with self._lock:
+            stats = self._cascades.get((graph, node))
+            if stats is None or stats.ladder != ladder:
+                stats = self._cascades[(graph, node)] = _CascadeStats(ladder)
+            stats.answered[rung] += 1
+            stats.seconds.observe(seconds)
+
+    def _saved_seconds(self, graph: str, stats: _CascadeStats) -> Optional[float]:
+        """Mean latency of the ladder's top model in this graph, times the calls, minus the cascade's time.
+        None until the top model has answered once. Caller holds the lock."""
+        top = [s.seconds for (g, _, m), s in self._llm.items() if g == graph and m == stats.ladder[-1]]
+        count = sum(h.count for h in top)
+        if not count:
+            return None
+        return round(stats.calls * sum(h.sum for h in top) / count - stats.seconds.sum, 4)
+
+    def graph_loaded(self, graph: str, seconds: float, trigger: str, uptime: float) -> None:
+        """A graph module was imported and compiled (`trigger`: startup, warmup or request),
+        `uptime` seconds after the server process started."""
+        with self._lock:
+            self._graphs[graph] = {"seconds": round(seconds, 4), "trigger": trigger, "uptime": round(uptime, 3)}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._nodes.clear()
+            self._llm.clear()
+            self._cascades.clear()
+            self.started = time.time()
+
+    # -- export ------------------------------------------------------------
+
+    def snapshot(self) -> dict:
+        """JSON summary: per-node latency quantiles and tokens, per-call LLM counters, gate, cache and admission state."""
+        from .admission import admission
+        from .llm import registry
+        from .semantic import semantic_cache
+
+        with self._lock:
+            nodes = {}
+            for (graph, node), s in sorted(self._nodes.items()):
+                nodes.setdefault(graph, {})[node] = {
+                    "runs": s.wall.count,
+                    "errors": s.errors,
+                    "deadline_misses": s.deadline_misses,
+                    "degraded": s.degraded,
+                    "wall_seconds": s.wall.summary(),
+                    "llm_seconds": s.llm.summary(),
+                    "own_seconds": s.own.summary(),
+                    "prompt_tokens": s.prompt_tokens.summary(1),
+                    "completion_tokens": s.completion_tokens.summary(1),
+                }
+            llm = []
+            for (graph, node, model), s in sorted(self._llm.items()):
+                lookups = s.calls + s.cache_hits
+                llm.append({
+                    "graph": graph,
+                    "node": node,
+                    "model": model,
+                    "calls": s.calls,
+                    "errors": s.errors,
+                    "cache_hits": s.cache_hits,
+                    "cache_hit_rate": round(s.cache_hits / lookups, 4) if lookups else 0.0,
+                    "coalesced": s.coalesced,
+                    "prompt_tokens": s.prompt_tokens,
+                    "completion_tokens": s.completion_tokens,
+                    "seconds": s.seconds.summary(),
+                })
+            graphs = {g: dict(v) for g, v in sorted(self._graphs.items())}
+            cascades = [
+                {
+                    "graph": graph,
+                    "node": node,
+                    "ladder": list(s.ladder),
+                    "calls": s.calls,
+                    "answered": dict(zip(s.ladder, s.answered)),
+                    "escalation_rate": round(s.escalations / s.calls, 4) if s.calls else 0.0,
+                    "seconds": s.seconds.summary(),
+                    "saved_seconds": self._saved_seconds(graph, s),
+                }
+                for (graph, node), s in sorted(self._cascades.items())
+            ]
+        return {
+            "since": self.started,
+            "enabled": self.enabled,
+            "graphs": graphs,
+            "nodes": nodes,
+            "llm": llm,
+            "cascades": cascades,
+            "registry": registry.stats(),
+            "semantic_cache": semantic_cache.stats(),
+            "admission": admission.stats(),
+        }
+
+    def prometheus(self) -> str:
+        from .admission import OUTCOMES, admission
+        from .llm import registry
+        from .semantic import semantic_cache
+
+        out: list[str] = []
+
+        def family(name: str, kind: str, help: str, lines: list[str]) -> None:
+            out.extend((f"# HELP {name} {help}", f"# TYPE {name} {kind}", *lines))
+
+        with self._lock:
+            nodes = [({"graph": g, "node": n}, s) for (g, n), s in sorted(self._nodes.items())]
+            llm = [({"graph": g, "node": n, "model": m}, s) for (g, n, m), s in sorted(self._llm.items())]
+            family("agent_node_duration_seconds", "histogram", "Wall time of one node execution.",
+                   _histogram_lines("agent_node_duration_seconds", [(l, s.wall) for l, s in nodes]))
+            family("agent_node_llm_seconds", "histogram", "Time a node execution spent waiting on LLM calls.",
+                   _histogram_lines("agent_node_llm_seconds", [(l, s.llm) for l, s in nodes]))
+            family("agent_node_own_seconds", "histogram", "Time a node execution spent outside LLM calls.",
+                   _histogram_lines("agent_node_own_seconds", [(l, s.own) for l, s in nodes]))
+            family("agent_node_prompt_tokens", "histogram", "Prompt tokens of one node execution that called an LLM.",
+                   _histogram_lines("agent_node_prompt_tokens", [(l, s.prompt_tokens) for l, s in nodes]))
+            family("agent_node_completion_tokens", "histogram", "Completion tokens of one node execution that called an LLM.",
+                   _histogram_lines("agent_node_completion_tokens", [(l, s.completion_tokens) for l, s in nodes]))
+            family("agent_node_errors_total", "counter", "Node executions that raised.",
+                   [f"agent_node_errors_total{_labels(**l)} {s.errors}" for l, s in nodes])
+            family("agent_node_deadline_misses_total", "counter", "LLM calls of a node cut by the run's deadline.",
+                   [f"agent_node_deadline_misses_total{_labels(**l)} {s.deadline_misses}" for l, s in nodes])
+            family("agent_node_degraded_total", "counter", "Node executions that took their degraded path for lack of time.",
+                   [f"agent_node_degraded_total{_labels(**l)} {s.degraded}" for l, s in nodes])
+            family("agent_llm_call_seconds", "histogram", "Duration of one LLM call, gate wait included.",
+                   _histogram_lines("agent_llm_call_seconds", [(l, s.seconds) for l, s in llm]))
+            family("agent_graph_load_seconds", "gauge", "Time to import and compile a graph module.",
+                   [f"agent_graph_load_seconds{_labels(graph=g, trigger=v['trigger'])} {v['seconds']}"
+                    for g, v in sorted(self._graphs.items())])
+            for name, attr, help in (
+                ("agent_llm_calls_total", "calls", "LLM calls sent to the provider."),
+                ("agent_llm_errors_total", "errors", "LLM calls that failed."),
+                ("agent_llm_cache_hits_total", "cache_hits", "LLM calls answered by the response cache."),
+                ("agent_llm_coalesced_total", "coalesced", "LLM calls that joined an identical call in flight."),
+                ("agent_llm_prompt_tokens_total", "prompt_tokens", "Prompt tokens reported by the provider."),
+                ("agent_llm_completion_tokens_total", "completion_tokens", "Completion tokens reported by the provider."),
+            ):
+                family(name, "counter", help, [f"{name}{_labels(**l)} {getattr(s, attr)}" for l, s in llm])
+            cascades = sorted(self._cascades.items())
+            family("agent_cascade_answers_total", "counter", "Cascade calls answered by each rung of a node's model ladder.",
+                   [f"agent_cascade_answers_total{_labels(graph=g, node=n, rung=i, model=m)} {c}"
+                    for (g, n), s in cascades for i, (m, c) in enumerate(zip(s.ladder, s.answered))])
+            family("agent_cascade_escalations_total", "counter", "Cascade calls that went past the first rung.",
+                   [f"agent_cascade_escalations_total{_labels(graph=g, node=n)} {s.escalations}" for (g, n), s in cascades])
+            family("agent_cascade_seconds", "histogram", "Duration of one cascade call, every rung tried included.",
+                   _histogram_lines("agent_cascade_seconds", [({"graph": g, "node": n}, s.seconds) for (g, n), s in cascades]))
+            saved = [((g, n), self._saved_seconds(g, s)) for (g, n), s in cascades]
+            family("agent_cascade_saved_seconds", "gauge", "Estimated latency saved against always calling the top model.",
+                   [f"agent_cascade_saved_seconds{_labels(graph=g, node=n)} {v}" for (g, n), v in saved if v is not None])
+
+        stats = registry.stats()
+        models = sorted(stats["models"].items())
+        family("agent_llm_in_flight", "gauge", "LLM calls currently holding a gate slot.",
+               [f"agent_llm_in_flight{_labels(model=m)} {g['in_flight']}" for m, g in models])
+        family("agent_llm_queued", "gauge", "LLM calls waiting at the gate.",
+               [f"agent_llm_queued{_labels(model=m, graph=graph)} {n}" for m, g in models for graph, n in sorted(g["queued"].items())])
+        family("agent_llm_gate_wait_seconds_total", "counter", "Time calls spent waiting at the gate.",
+               [f"agent_llm_gate_wait_seconds_total{_labels(model=m)} {g['wait_seconds']}" for m, g in models])
+        cache = stats["cache"]
+        for key, kind in (("entries", "gauge"), ("bytes", "gauge"), ("hits", "counter"), ("misses", "counter"), ("evictions", "counter")):
+            name = f"agent_llm_cache_{key}" + ("_total" if kind == "counter" else "")
+            family(name, kind, f"Response cache {key}.", [f"{name} {cache[key]}"])
+        flights = stats["singleflight"]
+        family("agent_llm_singleflight_in_flight", "gauge", "Distinct LLM calls in flight that identical calls can join.",
+               [f"agent_llm_singleflight_in_flight {flights['in_flight']}"])
+        family("agent_llm_singleflight_saved_total", "counter", "Provider calls avoided by joining an identical call in flight.",
+               [f"agent_llm_singleflight_saved_total {flights['saved_calls']}"])
+        semantic = sorted(semantic_cache.stats()["graphs"].items())
+        for key, kind, help in (
+            ("entries", "gauge", "Answers held by the semantic cache."),
+            ("hits", "counter", "Requests answered by the semantic cache."),
+            ("misses", "counter", "Semantic cache lookups without a close enough answer."),
+            ("saved_seconds", "counter", "Latency of the original requests whose answers were reused."),
+            ("evictions", "counter", "Semantic cache entries replaced by newer ones."),
+        ):
+            name = f"agent_semantic_cache_{key}" + ("_total" if kind == "counter" else "")
+            family(name, kind, help, [f"{name}{_labels(graph=g)} {v[key]}" for g, v in semantic])
+        runs = sorted(admission.stats()["graphs"].items())
+        family("agent_admission_queue_wait_seconds", "histogram", "Time a run request waited for an admission slot.",
+               _histogram_lines("agent_admission_queue_wait_seconds", admission.histograms()))
+        family("agent_admission_requests_total", "counter", "Run requests by admission outcome (admitted or why they were shed).",
+               [f"agent_admission_requests_total{_labels(graph=g, outcome=o)} {v['outcomes'][o]}" for g, v in runs for o in OUTCOMES])
+        family("agent_admission_in_flight", "gauge", "Runs holding an admission slot.",
+               [f"agent_admission_in_flight{_labels(graph=g)} {v['in_flight']}" for g, v in runs])
+        family("agent_admission_queued", "gauge", "Run requests waiting for an admission slot.",
+               [f"agent_admission_queued{_labels(graph=g)} {v['queued']}" for g, v in runs])
+        return "\n".join(out) + "\n"
+
+
+metrics = Metrics()
@@ -0,0 +1,87 @@
+"""
+Helpers for building graph nodes.
+"""
+import functools
+from typing import Any, Awaitable, Callable, Optional
+
+from langgraph.graph import StateGraph
+from langgraph.utils.runnable import RunnableCallable
+
+from . import deadline
+from .metrics import metrics
+
+
+def dual(func: Callable[..., Any], afunc: Optional[Callable[..., Awaitable[Any]]] = None) -> Any:
+    """Node with a sync and a native async implementation.
+
+    `app.invoke` runs `func`; `app.ainvoke` and the LangGraph server (which
+    always executes graphs asynchronously) run `afunc`, so LLM-bound nodes
+    await `llm.ainvoke` on the event loop instead of holding an executor
+    thread. Without `afunc` the plain function is returned: LangGraph then
+    calls it inline, which suits cheap CPU-only nodes such as aggregators.
+
+    Built like LangGraph's own nodes (RunnableCallable, no extra trace span),
+    unlike RunnableLambda which inspects signatures and opens a chain run on
+    every call.
+    """
+    if afunc is None:
+        return func
+    return RunnableCallable(func, afunc, name=func.__name__, trace=False)
+
+
+def _timed(func: Callable[..., Any], graph: str, node: str) -> Callable[..., Any]:
+    @functools.wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        frame, token, started = metrics.enter_node(graph, node)
+        run = deadline.enter(deadline.current_config_deadline())
+        failed = True
+        try:
+            result = func(*args, **kwargs)
+            failed = False
+            return result
+        finally:
+            deadline.leave(run)
+            metrics.exit_node(frame, token, started, failed)
+
+    return wrapper
+
+
+def _atimed(afunc: Callable[..., Awaitable[Any]], graph: str, node: str) -> Callable[..., Awaitable[Any]]:
+    @functools.wraps(afunc)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        frame, token, started = metrics.enter_node(graph, node)
+        run = deadline.enter(deadline.current_config_deadline())
+        failed = True
+        try:
+            result = await afunc(*args, **kwargs)
+            failed = False
+            return result
+        finally:
+            deadline.leave(run)
+            metrics.exit_node(frame, token, started, failed)
+
+    return wrapper
+
+
+def instrument(builder: StateGraph, graph: str = "default") -> StateGraph:
+    """Record latency, LLM time and tokens of every node of `builder` (see metrics.py)
+    and run each node under its run's deadline (see deadline.py).
+
+    Call it once all nodes are added, before `compile()`:
+
+        app = instrument(_builder, "routing").compile()
+
+    The node's sync and async functions are wrapped in place, so the config /
+    runtime injection LangGraph derived from their signatures is kept. Nodes
+    that are not plain functions (subgraphs, RunnableLambda) are left as is.
+    """
+    for name, spec in builder.nodes.items():
+        runnable = spec.runnable
+        if not isinstance(runnable, RunnableCallable) or getattr(runnable, "_instrumented", False):
+            continue
+        if runnable.func is not None:
+            runnable.func = _timed(runnable.func, graph, name)
+        if runnable.afunc is not None:
+            runnable.afunc = _atimed(runnable.afunc, graph, name)
+        runnable._instrumented = True
+    return builder
@@ -0,0 +1,372 @@
+"""
+Semantic response cache: answers a request with the answer given earlier to a
+near-duplicate request of the same graph.
+
+Graphs whose answer depends only on the latest user message look it up in
+front of their answering nodes and store their final answer:
+
+    cache = semantic_cache.namespace("routing", __file__)
+    hit = cache.lookup(text)          # Hit(answer, similarity, text, saved) or None
+    cache.store(text, answer)
+
+The user text is normalized (lowercase content words, negations kept) and
+embedded by a local embedder: `HashingEmbedder` hashes words, 4-letter stems
+and bigrams into SEMANTIC_CACHE_DIM signed float32 dimensions, L2-normalized.
+SEMANTIC_CACHE_EMBEDDER=module:factory plugs another one (an object with
+`name`, `dim` and `embed(texts) -> float32 array`). A namespace keeps its
+vectors in one NumPy matrix, memory-mapped under SEMANTIC_CACHE_PATH when set,
+and a lookup is one matrix-vector product: at the bounded size of a namespace
+an exact scan takes about a millisecond, so it needs no approximate index.
+
+    SEMANTIC_CACHE=1                    global switch
+    SEMANTIC_CACHE_THRESHOLD=0.9        minimum cosine similarity for a hit
+    SEMANTIC_CACHE_MAX_ENTRIES=5000     per graph; the least recently used entry is replaced
+    SEMANTIC_CACHE_TTL=86400            seconds, 0 = never expire
+    SEMANTIC_CACHE_DIM=512
+    SEMANTIC_CACHE_PATH=                directory of persistent namespaces (empty: in memory)
+
+Namespaces are per graph and keyed by a hash of the graph's agent.py and of the
+embedder: editing agent.py starts an empty namespace and removes the files of
+the previous one, at the next lookup in a running server (agent.py is checked
+at most once per second) or when the server reloads.
+"""
+import hashlib
+import importlib
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Any, NamedTuple, Optional
+
+import numpy as np
+from langchain_core.messages import AIMessage
+
+from .classifier import STOPWORDS
+
+_WORD = re.compile(r"[a-z0-9]+")
+# "should I buy" and "should I not buy" must not share an answer; "what's" is "what"
+_IGNORED = (STOPWORDS | {"s", "please", "thanks", "hi", "hello", "hey"}) - {"no", "not"}
+# Misses waiting for their answer, per namespace: their duration is the latency a later hit saves
+PENDING_MAX = 1024
+
+
+def normalize(text: str) -> str:
+    return " ".join(w for w in _WORD.findall(text.lower()) if w not in _IGNORED)
+
+
+class HashingEmbedder:
+    """Bag of words, stems and bigrams, hashed into `dim` signed dimensions (no model, no training)."""
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text: str) -> Counter:
+        words = normalize(text).split()
+        return Counter(
+            words + [f"{w[:4]}~" for w in words if len(w) > 4] + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        )
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, count in self._features(text).items():
+                h = zlib.crc32(feature.encode())
+                out[row, h % self.dim] += (1.0 if h & 0x80000000 else -1.0) * (1 + np.log(count))
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.where(norms == 0, 1, norms)
+
+
+def load_embedder(spec: str, dim: int) -> Any:
+    """`module:factory` -> factory(), or the default HashingEmbedder when empty."""
+    if not spec:
+        return HashingEmbedder(dim)
+    module, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(module), attr or "embedder")()
+
+
+def _fingerprint(path: Optional[Path]) -> str:
+    try:
+        return hashlib.sha256(path.read_bytes()).hexdigest()[:12] if path else "none"
+    except OSError:
+        return "none"
+
+
+class Hit(NamedTuple):
+    answer: str
+    similarity: float
+    text: str
+    saved: float
+
+    def message(self) -> AIMessage:
+        """The cached answer as the graph's reply."""
+        return AIMessage(
+            content=self.answer,
+            response_metadata={"semantic_cache": {"similarity": round(self.similarity, 4), "matched": self.text}},
+        )
+
+
+class Namespace:
+    """Cached answers of one graph: a vector matrix plus per-slot metadata."""
+
+    def __init__(self, cache: "SemanticCache", graph: str, source: Optional[Path]):
+        self.cache = cache
+        self.graph = graph
+        self.source = source
+        self.capacity = cache.max_entries
+        self._lock = threading.Lock()
+        self._pending: OrderedDict[str, float] = OrderedDict()
+        self._checked = time.monotonic()
+        self._mtime = self._source_mtime()
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+        self.saved_seconds = 0.0
+        self.lookup_seconds = 0.0
+        self._open(_fingerprint(source))
+
+    # -- storage -----------------------------------------------------------
+
+    def _open(self, fingerprint: str) -> None:
+        self.key = f"{self.graph}.{fingerprint}.{self.cache.embedder.name}.{self.capacity}"
+        self._entries: list[Optional[dict]] = [None] * self.capacity
+        self._slots: dict[str, int] = {}  # normalized text -> slot
+        self._used = np.zeros(self.capacity)  # last hit or store, for LRU
+        self._size = 0
+        self._log = None
+        directory = self.cache.path
+        if directory is None:
+            self._vectors = np.zeros((self.capacity, self.cache.embedder.dim), dtype=np.float32)
+            return
+        directory.mkdir(parents=True, exist_ok=True)
+        for stale in directory.glob(f"{self.graph}.*"):
+            if not stale.name.startswith(self.key + "."):
+                stale.unlink(missing_ok=True)  # an earlier agent.py, embedder or size
+        vectors = directory / f"{self.key}.f32"
+        mode = "r+" if vectors.exists() else "w+"
+        self._vectors = np.memmap(vectors, dtype=np.float32, mode=mode, shape=(self.capacity, self.cache.embedder.dim))
+        self._replay(directory / f"{self.key}.jsonl")
+
+    def _replay(self, path: Path) -> None:
+        lines = 0
+        if path.exists():
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # torn last line
+                    lines += 1
+                    slot = record["slot"]
+                    if slot >= self.capacity:
+                        continue
+                    self._drop(slot)
+                    if "answer" in record:
+                        self._entries[slot] = record
+                        self._slots[record["key"]] = slot
+                        self._used[slot] = record["created"]
+                        self._size = max(self._size, slot + 1)
+        live = [e for e in self._entries if e is not None]
+        if lines > 2 * len(live) + 64:
+            tmp = path.with_suffix(".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.writelines(json.dumps(e) + "\n" for e in live)
+            tmp.replace(path)
+        self._log = open(path, "a", encoding="utf-8")
+
+    def _append(self, record: dict) -> None:
+        if self._log is not None:
+            self._log.write(json.dumps(record) + "\n")
+            self._log.flush()
+
+    def _drop(self, slot: int) -> None:
+        entry = self._entries[slot]
+        if entry is not None:
+            self._entries[slot] = None
+            if self._slots.get(entry["key"]) == slot:
+                del self._slots[entry["key"]]
+
+    def _check_source(self) -> None:
+        """Start over if agent.py changed since the namespace was opened. Caller holds the lock."""
+        now = time.monotonic()
+        if self.source is None or now - self._checked < 1.0:
+            return
+        self._checked = now
+        mtime = self._source_mtime()
+        if mtime == self._mtime:
+            return
+        self._mtime = mtime
+        fingerprint = _fingerprint(self.source)
+        if not self.key.startswith(f"{self.graph}.{fingerprint}."):
+            if self._log is not None:
+                self._log.close()
+            self.invalidations += 1
+            self._pending.clear()
+            self._open(fingerprint)
+
+    def _source_mtime(self) -> Optional[float]:
+        try:
+            return self.source.stat().st_mtime if self.source else None
+        except OSError:
+            return None
+
+    # -- lookups -----------------------------------------------------------
+
+    def lookup(self, text: str) -> Optional[Hit]:
+        if not self.cache.enabled:
+            return None
+        started = time.perf_counter()
+        key = normalize(text)
+        if not key:
+            return None
+        query = self.cache.embedder.embed([text])[0]
+        now = time.time()
+        with self._lock:
+            self._check_source()
+            hit = None
+            if self._size:
+                scores = self._vectors[: self._size] @ query
+                for slot in np.argsort(scores)[::-1][:4]:
+                    if scores[slot] < self.cache.threshold:
+                        break
+                    entry = self._entries[slot]
+                    if entry is None:
+                        continue
+                    if self.cache.ttl and entry["created"] + self.cache.ttl <= now:
+                        self._drop(slot)
+                        self._append({"slot": int(slot)})
+                        self.expirations += 1
+                        continue
+                    self._used[slot] = now
+                    hit = Hit(entry["answer"], float(scores[slot]), entry["text"], entry["cost"])
+                    break
+            self.lookup_seconds += time.perf_counter() - started
+            if hit is None:
+                self.misses += 1
+                self._pending[key] = started
+                self._pending.move_to_end(key)
+                if len(self._pending) > PENDING_MAX:
+                    self._pending.popitem(last=False)
+                return None
+            self.hits += 1
+            self.saved_seconds += hit.saved
+            return hit
+
+    def store(self, text: str, answer: str) -> None:
+        """Cache `answer` for `text`; its cost is the time since `text` missed (0 if it did not)."""
+        if not self.cache.enabled or not answer:
+            return
+        key = normalize(text)
+        if not key:
+            return
+        vector = self.cache.embedder.embed([text])[0]
+        now = time.time()
+        with self._lock:
+            self._check_source()
+            started = self._pending.pop(key, None)
+            cost = round(time.perf_counter() - started, 4) if started is not None else 0.0
+            slot = self._slots.get(key)
+            if slot is None:
+                slot = self._free_slot()
+            self._drop(slot)
+            entry = {"slot": slot, "key": key, "text": text[:500], "answer": answer, "cost": cost, "created": now}
+            self._vectors[slot] = vector
+            self._entries[slot] = entry
+            self._slots[key] = slot
+            self._used[slot] = now
+            self._append(entry)
+
+    def _free_slot(self) -> int:
+        if self._size < self.capacity:
+            self._size += 1
+            return self._size - 1
+        empty = next((i for i, e in enumerate(self._entries) if e is None), None)
+        if empty is not None:
+            return empty
+        self.evictions += 1
+        return int(np.argmin(self._used))
+
+    def clear(self) -> None:
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                Path(self._log.name).unlink(missing_ok=True)
+            self._open(self.key.split(".")[1])
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "namespace": self.key,
+                "entries": len(self._slots),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "saved_seconds": round(self.saved_seconds, 3),
+                "lookup_ms": round(self.lookup_seconds / lookups * 1000, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+class SemanticCache:
+    """Per-graph namespaces sharing one embedder and one set of limits."""
+
+    def __init__(
+        self,
+        threshold: float = 0.9,
+        max_entries: int = 5000,
+        ttl: float = 86400,
+        path: Optional[str] = None,
+        embedder: Any = None,
+        enabled: bool = True,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = Path(path) if path else None
+        self.embedder = embedder or HashingEmbedder()
+        self.enabled = enabled
+        self._namespaces: dict[str, Namespace] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "SemanticCache":
+        path = os.environ.get("SEMANTIC_CACHE_PATH") or None
+        if path and int(os.environ.get("WORKER_COUNT", "1")) > 1:
+            # Supervisor workers (api_watcher.py) each keep their own files
+            path = os.path.join(path, f"worker-{os.environ.get('WORKER_INDEX', '0')}")
+        return cls(
+            threshold=float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.9")),
+            max_entries=int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", "5000")),
+            ttl=float(os.environ.get("SEMANTIC_CACHE_TTL", "86400")),
+            path=path,
+            embedder=load_embedder(
+                os.environ.get("SEMANTIC_CACHE_EMBEDDER", ""), int(os.environ.get("SEMANTIC_CACHE_DIM", "512"))
+            ),
+            enabled=os.environ.get("SEMANTIC_CACHE", "1") not in ("0", "false", "off"),
+        )
+
+    def namespace(self, graph: str, source: Optional[str] = None) -> Namespace:
+        """The namespace of `graph`; `source` is its agent.py, whose edits invalidate it."""
+        with self._lock:
+            ns = self._namespaces.get(graph)
+            if ns is None:
+                ns = self._namespaces[graph] = Namespace(self, graph, Path(source).resolve() if source else None)
+            return ns
+
+    def stats(self) -> dict:
+        with self._lock:
+            namespaces = dict(self._namespaces)
+        return {
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "embedder": self.embedder.name,
+            "graphs": {graph: ns.stats() for graph, ns in sorted(namespaces.items())},
+        }
+
+
+semantic_cache = SemanticCache.from_env()
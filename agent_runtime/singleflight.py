@@ -0,0 +1,308 @@
+"""
+In-flight deduplication of identical LLM calls ("single flight").
+
+While a call for (model, params, exact prompt) is running, an identical call
+does not send its own request: it joins the running one and gets the same
+reply, or for `stream` / `astream` every chunk from the first one on. A burst
+of users asking about the same topic then costs one upstream call and one
+gate slot. Nothing is kept once the call ends, so this is independent of the
+response cache (cache.py) and works with LLM_CACHE=0.
+
+    LLM_SINGLEFLIGHT=1      global switch (0: every call goes upstream)
+
+Per call, `llm.invoke(..., singleflight=False)` opts out (a hedged duplicate
+must really be a second request). The upstream call runs in its own task (async)
+or thread (sync), free of any caller's run deadline (see deadline.py) and so
+only capped by LLM_TIMEOUT: every caller, the first one included, bounds its
+own wait with its own deadline. A caller that is cancelled or runs out of
+time only stops waiting; once nobody waits any more an async call is
+cancelled, and a sync stream stops at its next chunk (a sync invoke cannot
+be interrupted and runs to its end). Joined callers get the reply and the chunks, but not the LLM
+callbacks of the upstream call (token events of LangGraph's "messages"
+stream mode).
+"""
+import asyncio
+import contextvars
+import os
+import threading
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator, Optional
+
+from . import deadline
+from .metrics import metrics
+
+
+class Flight:
+    """One upstream call and the callers sharing it: its reply, or the chunks streamed so far."""
+
+    def __init__(self, key: tuple):
+        self.key = key
+        self.chunks: list = []
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.done = False
+        self.abandoned = False  # every caller stopped waiting before the end
+        self.waiting = 0  # callers reading this flight, the first one included
+        self.task: Optional[asyncio.Future] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._cond = threading.Condition()
+        self._events: set = set()  # (loop, asyncio.Event) of async readers
+
+    def publish(self, chunk: Any) -> None:
+        with self._cond:
+            self.chunks.append(chunk)
+            self._wake()
+
+    def finish(self, result: Any = None, error: Optional[BaseException] = None) -> None:
+        with self._cond:
+            self.result, self.error, self.done = result, error, True
+            self._wake()
+
+    def _wake(self) -> None:
+        """Caller holds the condition."""
+        self._cond.notify_all()
+        for loop, event in list(self._events):
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:  # that reader's loop is closed
+                self._events.discard((loop, event))
+
+    def _outcome(self) -> Any:
+        if self.error is not None:
+            raise self.error
+        return _copy(self.result)
+
+    def wait(self, timeout: Optional[float] = None) -> Any:
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.done, timeout):
+                raise TimeoutError(f"no reply from the shared call within {timeout:.1f}s")
+        return self._outcome()
+
+    def iter_chunks(self, timeout: Optional[float] = None) -> Iterator[Any]:
+        """Chunks as they come; `timeout` bounds the wait for each one."""
+        sent = 0
+        while True:
+            with self._cond:
+                if not self._cond.wait_for(lambda: self.done or len(self.chunks) > sent, timeout):
+                    raise TimeoutError(f"no chunk from the shared stream within {timeout:.1f}s")
+                chunks, done = self.chunks[sent:], self.done
+            sent += len(chunks)
+            yield from chunks
+            if done:
+                self._outcome()
+                return
+
+    async def await_(self, timeout: Optional[float] = None) -> Any:
+        """The reply; `timeout` bounds this reader's wait, not the upstream call."""
+        async with asyncio.timeout(timeout):
+            async for _ in self.aiter_chunks():
+                pass
+        return self._outcome()
+
+    async def aiter_chunks(self, timeout: Optional[float] = None) -> AsyncIterator[Any]:
+        """Chunks as they come; `timeout` bounds this reader's wait for each one."""
+        reader = (asyncio.get_running_loop(), asyncio.Event())
+        with self._cond:
+            self._events.add(reader)
+        try:
+            sent = 0
+            while True:
+                reader[1].clear()
+                with self._cond:
+                    chunks, done = self.chunks[sent:], self.done
+                sent += len(chunks)
+                for chunk in chunks:
+                    yield chunk
+                if done:
+                    self._outcome()
+                    return
+                if not chunks:
+                    async with asyncio.timeout(timeout):
+                        await reader[1].wait()
+        finally:
+            with self._cond:
+                self._events.discard(reader)
+
+
+def _copy(message: Any) -> Any:
+    """Each caller gets its own reply object (graphs may set its id or metadata)."""
+    copy = getattr(message, "model_copy", None)
+    return copy() if copy is not None else message
+
+
+class SingleFlight:
+    """Flights by key, plus how many upstream calls joining them saved."""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._flights: dict[tuple, Flight] = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.saved = 0
+
+    @classmethod
+    def from_env(cls) -> "SingleFlight":
+        return cls(enabled=os.environ.get("LLM_SINGLEFLIGHT", "1") not in ("0", "false", "off"))
+
+    def _join(self, key: tuple) -> tuple[Flight, bool]:
+        with self._lock:
+            flight = self._flights.get(key)
+            first = flight is None
+            if first:
+                flight = self._flights[key] = Flight(key)
+                self.calls += 1
+            else:
+                self.saved += 1
+            flight.waiting += 1
+            return flight, first
+
+    def _leave(self, flight: Flight) -> None:
+        with self._lock:
+            flight.waiting -= 1
+            abandoned = not flight.waiting and not flight.done
+            if abandoned or flight.done:
+                self._forget(flight)
+            if abandoned:
+                flight.abandoned = True
+        if abandoned and flight.task is not None:
+            flight.loop.call_soon_threadsafe(flight.task.cancel)
+
+    def _forget(self, flight: Flight) -> None:
+        """Later identical calls start a new flight. Caller holds the lock."""
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+
+    def _finish(self, flight: Flight, result: Any = None, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            self._forget(flight)
+        flight.finish(result, error)
+
+    @staticmethod
+    def _joined(graph: str, model: str) -> Callable[[], None]:
+        """Count a joined caller's wait as LLM time of its node; call the result when it ends."""
+        started = metrics.llm_started()
+        return lambda: metrics.coalesced(graph, model, started)
+
+    # -- sync --------------------------------------------------------------
+
+    def _run_sync(self, flight: Flight, fn: Callable[[], Any]) -> None:
+        try:
+            self._finish(flight, fn())
+        except BaseException as e:
+            self._finish(flight, error=e)
+
+    def _pump_sync(self, flight: Flight, fn: Callable[[], Iterator[Any]]) -> None:
+        chunks = None
+        try:
+            chunks = iter(fn())
+            for chunk in chunks:
+                flight.publish(chunk)
+                if flight.abandoned:
+                    raise RuntimeError("stream closed by its callers")
+            self._finish(flight)
+        except BaseException as e:
+            self._finish(flight, error=e)
+        finally:
+            getattr(chunks, "close", lambda: None)()
+
+    def _start_thread(self, flight: Flight, target: Callable[..., None], fn: Callable[[], Any]) -> None:
+        # Same context as in _start: the first caller's node, without its run deadline
+        context = contextvars.copy_context()
+        context.run(deadline.enter, None)
+        threading.Thread(target=context.run, args=(target, flight, fn), name="singleflight", daemon=True).start()
+
+    def call(self, key: tuple, fn: Callable[[], Any], graph: str, model: str, timeout: Optional[float] = None) -> Any:
+        """`timeout` bounds this caller's wait; the upstream call goes on while others wait for it."""
+        flight, first = self._join(key)
+        try:
+            if first:
+                self._start_thread(flight, self._run_sync, fn)
+                return flight.wait(timeout)
+            done = self._joined(graph, model)
+            try:
+                return flight.wait(timeout)
+            finally:
+                done()
+        finally:
+            self._leave(flight)
+
+    def stream(self, key: tuple, fn: Callable[[], Iterator[Any]], graph: str, model: str,
+               timeout: Optional[float] = None) -> Iterator[Any]:
+        flight, first = self._join(key)
+        done = None
+        try:
+            if first:
+                self._start_thread(flight, self._pump_sync, fn)
+            else:
+                done = self._joined(graph, model)
+            yield from flight.iter_chunks(timeout)
+        finally:
+            if done is not None:
+                done()
+            self._leave(flight)
+
+    # -- async -------------------------------------------------------------
+
+    async def _run(self, flight: Flight, fn: Callable[[], Awaitable[Any]]) -> None:
+        try:
+            self._finish(flight, await fn())
+        except BaseException as e:
+            self._finish(flight, error=e)
+
+    async def _pump(self, flight: Flight, fn: Callable[[], AsyncIterator[Any]]) -> None:
+        try:
+            async for chunk in fn():
+                flight.publish(chunk)
+            self._finish(flight)
+        except BaseException as e:
+            self._finish(flight, error=e)
+
+    def _start(self, flight: Flight, coro: Awaitable[None]) -> None:
+        # A copy of the first caller's context, so the upstream call is recorded on its node,
+        # without its run deadline: the call serves callers with other deadlines
+        context = contextvars.copy_context()
+        context.run(deadline.enter, None)
+        flight.loop = asyncio.get_running_loop()
+        flight.task = flight.loop.create_task(coro, context=context)
+
+    async def acall(self, key: tuple, fn: Callable[[], Awaitable[Any]], graph: str, model: str,
+                    timeout: Optional[float] = None) -> Any:
+        """`timeout` bounds this caller's wait; the upstream call goes on while others wait for it."""
+        flight, first = self._join(key)
+        try:
+            if first:
+                self._start(flight, self._run(flight, fn))
+                return await flight.await_(timeout)
+            done = self._joined(graph, model)
+            try:
+                return await flight.await_(timeout)
+            finally:
+                done()
+        finally:
+            self._leave(flight)
+
+    async def astream(self, key: tuple, fn: Callable[[], AsyncIterator[Any]], graph: str, model: str,
+                      timeout: Optional[float] = None) -> AsyncIterator[Any]:
+        flight, first = self._join(key)
+        done = None
+        try:
+            if first:
+                self._start(flight, self._pump(flight, fn))
+            else:
+                done = self._joined(graph, model)
+            async for chunk in flight.aiter_chunks(timeout):
+                yield chunk
+        finally:
+            if done is not None:
+                done()
+            self._leave(flight)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.calls + self.saved
+            return {
+                "enabled": self.enabled,
+                "in_flight": len(self._flights),
+                "upstream_calls": self.calls,
+                "saved_calls": self.saved,
+                "saved_rate": round(self.saved / total, 4) if total else 0.0,
+            }
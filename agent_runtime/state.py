@@ -0,0 +1,153 @@
+"""
+Bounded conversation state for long threads.
+
+`add_messages` keeps every message of a thread: the checkpoint, the
+per-update merge and the prompts of agents that send the history all grow
+with the number of turns. `bounded_messages` is a drop-in replacement:
+
+    class State(TypedDict):
+        messages: Annotated[Sequence[AnyMessage], bounded_messages]
+
+It merges like `add_messages` (ids, updates, RemoveMessage), then keeps the
+newest whole turns (a turn starts at a human message) within a message count
+and a token budget. Dropped turns are folded into a rolling summary, a
+SystemMessage kept first in the list, itself capped in tokens (oldest lines go
+first). The latest turn is always kept whole.
+
+The value is a `Conversation` (a list) that also carries the latest human
+message, so nodes read it in O(1) with `last_user_text(state)`. Checkpoints
+store a plain list; the index is rebuilt on the next update.
+
+    MESSAGES_MAX=40              messages kept besides the summary (0 = no cap)
+    MESSAGES_MAX_TOKENS=6000     estimated tokens kept besides the summary (0 = no cap)
+    MESSAGES_SUMMARY_TOKENS=800  cap of the rolling summary (0 = drop old turns without summary)
+"""
+import os
+from typing import Any, Callable, Optional, Sequence
+
+from langchain_core.messages import BaseMessage, SystemMessage
+from langgraph.graph.message import add_messages
+
+from .llm import estimate_tokens
+
+SUMMARY_ID = "conversation-summary"
+SUMMARY_HEADER = "Summary of the earlier conversation (oldest first):"
+# Characters of each dropped message kept in the summary
+SUMMARY_LINE_CHARS = 200
+_ROLES = {"human": "user", "ai": "assistant", "tool": "tool", "system": "system"}
+
+
+class Conversation(list):
+    """Message list returned by the bounded reducer, indexed by its latest human message."""
+
+    __slots__ = ("last_human",)
+
+    def __init__(self, messages: Sequence[BaseMessage] = (), last_human: Optional[BaseMessage] = None):
+        super().__init__(messages)
+        self.last_human = last_human
+
+
+def _is_human(message: Any) -> bool:
+    return getattr(message, "type", None) == "human"
+
+
+def _text(message: BaseMessage) -> str:
+    return message.content if isinstance(message.content, str) else str(message.content)
+
+
+def _find_last_human(messages: Sequence[Any]) -> Optional[BaseMessage]:
+    for m in reversed(messages):
+        if _is_human(m):
+            return m
+    return None
+
+
+def last_user_text(state: dict, fallback: str = "") -> str:
+    """Text of the latest human message, else `state[fallback]` (e.g. a "topic" input field)."""
+    messages = state.get("messages") or ()
+    if isinstance(messages, Conversation):
+        message = messages.last_human
+    else:
+        # Plain list: state built by hand or a graph without the bounded reducer
+        message = _find_last_human(messages)
+    if message is not None:
+        return _text(message)
+    return state.get(fallback, "") if fallback else ""
+
+
+def _summary_lines(summary: Optional[BaseMessage]) -> list[str]:
+    if summary is None:
+        return []
+    return [line for line in _text(summary).splitlines()[1:] if line]
+
+
+def _summary_line(message: BaseMessage) -> str:
+    text = " ".join(_text(message).split())
+    if len(text) > SUMMARY_LINE_CHARS:
+        text = text[: SUMMARY_LINE_CHARS - 3] + "..."
+    return f"- {_ROLES.get(message.type, message.type)}: {text}"
+
+
+def _fold(summary: Optional[BaseMessage], dropped: list[BaseMessage], max_tokens: int) -> Optional[BaseMessage]:
+    lines = _summary_lines(summary) + [_summary_line(m) for m in dropped if _text(m).strip()]
+    budget = max_tokens * 4  # same 4 chars/token estimate as the rate limiter
+    size, keep = 0, 0
+    for line in reversed(lines):
+        size += len(line) + 1
+        if size > budget:
+            break
+        keep += 1
+    if not keep:
+        return None
+    return SystemMessage(content="\n".join([SUMMARY_HEADER, *lines[-keep:]]), id=SUMMARY_ID)
+
+
+def _cut(messages: list[BaseMessage], max_messages: int, max_tokens: int) -> int:
+    """Index of the first kept message: newest whole turns within both caps, at least the last turn."""
+    last_turn = next((i for i in range(len(messages) - 1, -1, -1) if _is_human(messages[i])), 0)
+    cut, count, tokens = len(messages), 0, 0
+    for i in range(len(messages) - 1, -1, -1):
+        count += 1
+        tokens += estimate_tokens([messages[i]])
+        if i < last_turn and ((max_messages and count > max_messages) or (max_tokens and tokens > max_tokens)):
+            break
+        if _is_human(messages[i]) or i == 0:
+            cut = i
+    return min(cut, last_turn)
+
+
+def message_window(
+    max_messages: Optional[int] = None,
+    max_tokens: Optional[int] = None,
+    summary_tokens: Optional[int] = None,
+) -> Callable[[Any, Any], Conversation]:
+    """Reducer keeping at most `max_messages` / `max_tokens` of recent turns (None = env default)."""
+    if max_messages is None:
+        max_messages = int(os.environ.get("MESSAGES_MAX", "40"))
+    if max_tokens is None:
+        max_tokens = int(os.environ.get("MESSAGES_MAX_TOKENS", "6000"))
+    if summary_tokens is None:
+        summary_tokens = int(os.environ.get("MESSAGES_SUMMARY_TOKENS", "800"))
+
+    def reducer(left: Any, right: Any) -> Conversation:
+        merged = add_messages(left, right)
+        summary = None
+        if merged and merged[0].id == SUMMARY_ID:
+            summary, merged = merged[0], merged[1:]
+        cut = _cut(merged, max_messages, max_tokens) if merged else 0
+        if cut:
+            summary = _fold(summary, merged[:cut], summary_tokens) if summary_tokens else None
+            merged = merged[cut:]
+
+        # Latest human message: among the messages of this update (appended at the
+        # end), else carried over from the previous value, else one scan after a restore
+        appended = len(right) if isinstance(right, list) else 1
+        last_human = _find_last_human(merged[max(0, len(merged) - appended):])
+        if last_human is None:
+            last_human = left.last_human if isinstance(left, Conversation) else _find_last_human(merged)
+        return Conversation([summary, *merged] if summary is not None else merged, last_human)
+
+    return reducer
+
+
+bounded_messages = message_window()
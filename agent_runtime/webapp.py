@@ -0,0 +1,39 @@
+"""
+Extra HTTP routes mounted into the LangGraph server (langgraph.json, "http.app"):
+
+    GET /runtime/metrics        Prometheus text format (node latency, LLM time, tokens, cache, gates)
+    GET /runtime/metrics.json   same data as a JSON snapshot with p50/p95/p99 per node
+
+The server keeps its own /metrics; these paths do not shadow it.
+
+The app's middleware applies to every route of the server: DeadlineMiddleware
+(deadline.py) gives each run request its deadline on arrival, so time spent
+queued counts, then AdmissionMiddleware (admission.py) limits the runs in
+flight per graph and sheds the excess with 429s.
+"""
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+from agent_runtime.admission import AdmissionMiddleware
+from agent_runtime.deadline import DeadlineMiddleware
+from agent_runtime.metrics import metrics
+
+
+async def prometheus(request: Request) -> PlainTextResponse:
+    return PlainTextResponse(metrics.prometheus(), media_type="text/plain; version=0.0.4")
+
+
+async def snapshot(request: Request) -> JSONResponse:
+    return JSONResponse(metrics.snapshot())
+
+
+app = Starlette(
+    routes=[
+        Route("/runtime/metrics", prometheus, methods=["GET"]),
+        Route("/runtime/metrics.json", snapshot, methods=["GET"]),
+    ],
+    middleware=[Middleware(DeadlineMiddleware), Middleware(AdmissionMiddleware)],
+)
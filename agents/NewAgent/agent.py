@@ -1,23 +1,18 @@
 # agent.py
 from typing import TypedDict, Annotated, List
 from langgraph.graph import StateGraph, END
-from langgraph.graph.message import add_messages
-from langchain_core.messages import AIMessage, HumanMessage, BaseMessage
+from langchain_core.messages import AIMessage, BaseMessage
+from agent_runtime import instrument
+from agent_runtime.state import bounded_messages, last_user_text
 
 class State(TypedDict):
-    # Strongly typed messages so schema includes LC message structure
-    messages: Annotated[List[BaseMessage], add_messages]
+    # Strongly typed messages so schema includes LC message structure;
+    # bounded: old turns are folded into a rolling summary
+    messages: Annotated[List[BaseMessage], bounded_messages]
 
 def agent_node(state: State):
-    last_user = None
-    # Handle both LC messages and dicts defensively
-    for m in reversed(state["messages"]):
-        if isinstance(m, HumanMessage):
-            last_user = m.content
-            break
-        if isinstance(m, dict) and m.get("role") == "user":
-            last_user = m.get("content", "")
-            break
+    # Latest user message, indexed by the reducer (no history scan)
+    last_user = last_user_text(state)
     reply = f"Echo: {last_user}" if last_user else "Hello from echo agent"
     return {"messages": [AIMessage(content=reply)]}
 
@@ -25,4 +20,4 @@ graph = StateGraph(State)
 graph.add_node("agent", agent_node)
 graph.set_entry_point("agent")
 graph.add_edge("agent", END)
-app = graph.compile()
\ No newline at end of file
+app = instrument(graph, "NewAgent").compile()
\ No newline at end of file
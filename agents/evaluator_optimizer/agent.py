@@ -1,61 +1,310 @@
 """
-Evaluator-Optimizer example: generate -> evaluate -> refine (single pass).
-Chat-compatible: messages state with add_messages; final assistant message appended.
+Evaluator-Optimizer example: generate -> evaluate -> refine -> evaluate -> ...
+Chat-compatible: bounded messages state (agent_runtime.state); final assistant message appended.
+Nodes have native async versions, used by the server.
+
+The evaluator answers with a verdict (PASS / REVISE) and the loop keeps refining
+until it passes or a per-run budget runs out. Budgets are read from
+config["configurable"], with env defaults:
+- max_iterations (EVALOPT_MAX_ITERATIONS, 3): refine passes at most (the last one is not re-evaluated)
+- token_budget (EVALOPT_TOKEN_BUDGET, 8000): total tokens of the run, 0 = unlimited
+- time_budget (EVALOPT_TIME_BUDGET, 60): wall-clock seconds of the run, 0 = unlimited
+Another pass only starts if the last one would still fit in what is left.
+
+Speculative first critique (async path): while the draft streams, a critique of
+the partial draft is started once it reaches `speculation_accept` of the median
+length of recent drafts (at least `speculate_after` characters), and restarted
+if the draft outgrows what it can cover. If the last one covered at least
+`speculation_accept` of the final draft it is used as the first critique and
+the evaluate step is skipped; otherwise (or if it failed) the normal evaluation runs.
+Superseded speculative calls are cancelled and counted in the token budget.
+
+Critiques (evaluate and the speculative one) go through a model cascade
+(agent_runtime.cascade): gpt-4o-mini first, gpt-4o when the critique has no
+VERDICT line.
+
+Per step, `iterations` records latency_ms and tokens; `stop_reason` says why the loop ended.
+Exports: app (CompiledGraph)
 """
-from typing import TypedDict, Annotated, Sequence, NotRequired
+import asyncio
+import logging
+import os
+import re
+import time
+from collections import deque
+from typing import TypedDict, Annotated, Sequence, List, NotRequired
 from langgraph.graph import StateGraph, START, END
-from langgraph.graph.message import add_messages
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import AnyMessage, AIMessage, HumanMessage
+from langchain_core.runnables import RunnableConfig
+from agent_runtime import dual, get_cascade, get_llm, instrument
+from agent_runtime.cascade import matches
+from agent_runtime.state import bounded_messages, last_user_text
+from agent_runtime.llm import estimate_tokens
+from langchain_core.messages import AnyMessage, AIMessage
+
+logger = logging.getLogger(__name__)
+
+llm = get_llm("gpt-4o-mini", graph="evaluator_optimizer")
 
-llm = ChatOpenAI(model="gpt-4o-mini")
+DEFAULTS = {
+    "max_iterations": int(os.environ.get("EVALOPT_MAX_ITERATIONS", "3")),
+    "token_budget": int(os.environ.get("EVALOPT_TOKEN_BUDGET", "8000")),
+    "time_budget": float(os.environ.get("EVALOPT_TIME_BUDGET", "60")),
+    "speculate": os.environ.get("EVALOPT_SPECULATE", "1") == "1",
+    "speculate_after": int(os.environ.get("EVALOPT_SPECULATE_AFTER", "400")),
+    "speculation_accept": float(os.environ.get("EVALOPT_SPECULATION_ACCEPT", "0.85")),
+}
+_VERDICT = re.compile(r"VERDICT:\s*(PASS|REVISE)", re.IGNORECASE)
+critic = get_cascade(("gpt-4o-mini", "gpt-4o"), graph="evaluator_optimizer", node="evaluate",
+                     verifier=matches(_VERDICT.pattern))
+# Lengths (chars) of recent drafts, to time the speculative critique
+_draft_chars: deque = deque(maxlen=100)
+
+
+class Step(TypedDict):
+    iteration: int
+    step: str  # generate | evaluate | refine
+    latency_ms: float
+    tokens: int
+    speculative: NotRequired[bool]
 
 
 class State(TypedDict):
-    messages: Annotated[Sequence[AnyMessage], add_messages]
+    messages: Annotated[Sequence[AnyMessage], bounded_messages]
     prompt: NotRequired[str]
     draft: NotRequired[str]
     critique: NotRequired[str]
     improved: NotRequired[str]
+    verdict: NotRequired[str]
+    # Number of refine passes done so far
+    iteration: NotRequired[int]
+    tokens_used: NotRequired[int]
+    started_at: NotRequired[float]
+    # One record per LLM step of the current turn (nodes run one at a time, no reducer needed)
+    iterations: NotRequired[List[Step]]
+    stop_reason: NotRequired[str]
 
 
-def _last_user_text(state: State) -> str:
-    for m in reversed(state.get("messages", [])):
-        if isinstance(m, HumanMessage) or getattr(m, "type", None) == "human":
-            return m.content if isinstance(m.content, str) else str(m.content)
-    return state.get("prompt", "")
+def _options(config: RunnableConfig) -> dict:
+    configurable = (config or {}).get("configurable", {})
+    return {k: configurable.get(k, v) for k, v in DEFAULTS.items()}
 
 
-def generate(state: State):
-    prompt = state.get("prompt") or _last_user_text(state)
-    msg = llm.invoke(f"Write an initial response for: {prompt}")
-    return {"draft": msg.content}
+def _tokens(prompt: str, msg) -> int:
+    usage = getattr(msg, "usage_metadata", None)
+    if usage and usage.get("total_tokens"):
+        return usage["total_tokens"]
+    return estimate_tokens(prompt) + estimate_tokens(msg.content or " ")
 
 
-def evaluate(state: State):
-    msg = llm.invoke(
-        "Provide a brief, constructive critique (3 bullets max) of this text:\n"
-        + state["draft"]
+def _step(iteration: int, step: str, started: float, tokens: int, **extra) -> Step:
+    return {
+        "iteration": iteration,
+        "step": step,
+        "latency_ms": round((time.monotonic() - started) * 1000, 1),
+        "tokens": tokens,
+        **extra,
+    }
+
+
+def _current(state: State) -> str:
+    return state.get("improved") or state["draft"]
+
+
+def _generate_prompt(state: State) -> str:
+    return f"Write an initial response for: {state.get('prompt') or last_user_text(state)}"
+
+
+def _critique_prompt(text: str) -> str:
+    return (
+        "Provide a brief, constructive critique (3 bullets max) of this text. Start your answer "
+        "with 'VERDICT: PASS' if it needs no further changes, otherwise 'VERDICT: REVISE'.\n" + text
     )
-    return {"critique": msg.content}
 
 
-def refine(state: State):
-    msg = llm.invoke(
+def _refine_prompt(state: State) -> str:
+    return (
         "Improve the original text using the critique. Return the improved version only.\n"
-        f"CRITIQUE:\n{state['critique']}\n\nORIGINAL:\n{state['draft']}"
+        f"CRITIQUE:\n{state['critique']}\n\nORIGINAL:\n{_current(state)}"
     )
-    return {"improved": msg.content, "messages": [AIMessage(content=msg.content)]}
+
+
+def _verdict(critique: str) -> str:
+    match = _VERDICT.search(critique)
+    return match.group(1).lower() if match else "revise"
+
+
+def _speculation_mark(opts: dict) -> int:
+    if not _draft_chars:
+        return opts["speculate_after"]
+    expected = sorted(_draft_chars)[len(_draft_chars) // 2]
+    return max(opts["speculate_after"], int(opts["speculation_accept"] * expected))
+
+
+def _generated(text: str, tokens: int, started: float) -> dict:
+    # Resets the loop fields, so a new turn on the same thread starts from scratch
+    return {
+        "draft": text,
+        "improved": None,
+        "critique": None,
+        "verdict": None,
+        "iteration": 0,
+        "tokens_used": tokens,
+        # Wall-clock start of the run, for the time budget
+        "started_at": time.time() - (time.monotonic() - started),
+        "iterations": [_step(0, "generate", started, tokens)],
+        "stop_reason": None,
+    }
+
+
+def generate(state: State, config: RunnableConfig):
+    # Sync path (app.invoke): no streaming, so no speculative critique
+    started = time.monotonic()
+    prompt = _generate_prompt(state)
+    msg = llm.invoke(prompt)
+    return _generated(msg.content, _tokens(prompt, msg), started)
+
+
+async def agenerate(state: State, config: RunnableConfig):
+    opts = _options(config)
+    started = time.monotonic()
+    prompt = _generate_prompt(state)
+    text, usage, wasted = "", None, 0
+    spec, spec_prompt, spec_chars, next_mark = None, "", 0, _speculation_mark(opts)
+    try:
+        async for chunk in llm.astream(prompt):
+            text += chunk.content
+            usage = chunk if getattr(chunk, "usage_metadata", None) else usage
+            if opts["speculate"] and len(text) >= next_mark:
+                if spec is not None:
+                    spec.cancel()
+                    wasted += estimate_tokens(spec_prompt)
+                spec_prompt, spec_chars = _critique_prompt(text), len(text)
+                # Restart only once this critique could no longer be accepted
+                next_mark = int(len(text) / opts["speculation_accept"]) + 1
+                spec = asyncio.ensure_future(critic.ainvoke(spec_prompt))
+        _draft_chars.append(len(text))
+        update = _generated(text, _tokens(prompt, usage or AIMessage(content=text)), started)
+        update["tokens_used"] += wasted
+        if spec is not None and spec_chars >= opts["speculation_accept"] * len(text):
+            # latency_ms of a speculative critique is the wait left once the draft is done
+            critique_started = time.monotonic()
+            try:
+                msg = await spec
+            except Exception:
+                # A failed speculation is only a missed shortcut: the evaluate step runs instead
+                logger.warning("speculative critique failed; falling back to evaluate", exc_info=True)
+                update["tokens_used"] += estimate_tokens(spec_prompt)
+                spec = None
+                return update
+            spec = None
+            spent = _tokens(spec_prompt, msg)
+            update.update(critique=msg.content, verdict=_verdict(msg.content))
+            update["tokens_used"] += spent
+            update["iterations"].append(_step(0, "evaluate", critique_started, spent, speculative=True))
+        elif spec is not None:
+            update["tokens_used"] += estimate_tokens(spec_prompt)
+        return update
+    finally:
+        if spec is not None:
+            spec.cancel()
+
+
+def _evaluated(state: State, prompt: str, msg, started: float) -> dict:
+    tokens = _tokens(prompt, msg)
+    return {
+        "critique": msg.content,
+        "verdict": _verdict(msg.content),
+        "tokens_used": state.get("tokens_used", 0) + tokens,
+        "iterations": [*state.get("iterations", []), _step(state.get("iteration", 0), "evaluate", started, tokens)],
+    }
+
+
+def evaluate(state: State):
+    started = time.monotonic()
+    prompt = _critique_prompt(_current(state))
+    return _evaluated(state, prompt, critic.invoke(prompt), started)
+
+
+async def aevaluate(state: State):
+    started = time.monotonic()
+    prompt = _critique_prompt(_current(state))
+    return _evaluated(state, prompt, await critic.ainvoke(prompt), started)
+
+
+def _refined(state: State, prompt: str, msg, started: float) -> dict:
+    tokens = _tokens(prompt, msg)
+    iteration = state.get("iteration", 0) + 1
+    return {
+        "improved": msg.content,
+        "iteration": iteration,
+        "tokens_used": state.get("tokens_used", 0) + tokens,
+        "iterations": [*state.get("iterations", []), _step(iteration, "refine", started, tokens)],
+    }
+
+
+def refine(state: State):
+    started = time.monotonic()
+    prompt = _refine_prompt(state)
+    return _refined(state, prompt, llm.invoke(prompt), started)
+
+
+async def arefine(state: State):
+    started = time.monotonic()
+    prompt = _refine_prompt(state)
+    return _refined(state, prompt, await llm.ainvoke(prompt), started)
+
+
+def after_generate(state: State):
+    # A speculative critique was accepted: decide right away
+    return "decide" if state.get("critique") else "evaluate"
+
+
+def decide(state: State, config: RunnableConfig):
+    """Stop on PASS or when another refine + evaluate pass would not fit in the budget."""
+    opts = _options(config)
+    steps = state.get("iterations") or []
+    iteration = state.get("iteration", 0)
+    # Cost of the next refine + evaluate pass: the last one, or before any refine,
+    # draft + critique (a refine reads both and rewrites the draft) + one more critique
+    last = [s for s in steps if s["iteration"] == iteration]
+    if iteration == 0:
+        last = steps + [s for s in steps if s["step"] == "evaluate"]
+    pass_tokens = sum(s["tokens"] for s in last)
+    pass_seconds = sum(s["latency_ms"] for s in last) / 1000
+    elapsed = time.time() - state.get("started_at", time.time())
+    if state.get("verdict") == "pass":
+        reason = "converged"
+    elif iteration >= opts["max_iterations"]:
+        reason = "max_iterations"
+    elif opts["token_budget"] and state.get("tokens_used", 0) + pass_tokens > opts["token_budget"]:
+        reason = "token_budget"
+    elif opts["time_budget"] and elapsed + pass_seconds > opts["time_budget"]:
+        reason = "time_budget"
+    else:
+        return {}
+    text = _current(state)
+    return {"stop_reason": reason, "messages": [AIMessage(content=text)]}
+
+
+def after_decide(state: State):
+    return END if state.get("stop_reason") else "refine"
+
+
+def after_refine(state: State, config: RunnableConfig):
+    # No point critiquing a version that cannot be refined any further
+    return "decide" if state["iteration"] >= _options(config)["max_iterations"] else "evaluate"
 
 
 _builder = StateGraph(State)
-_builder.add_node("generate", generate)
-_builder.add_node("evaluate", evaluate)
-_builder.add_node("refine", refine)
+_builder.add_node("generate", dual(generate, agenerate))
+_builder.add_node("evaluate", dual(evaluate, aevaluate))
+_builder.add_node("decide", dual(decide))
+_builder.add_node("refine", dual(refine, arefine))
 
 _builder.add_edge(START, "generate")
-_builder.add_edge("generate", "evaluate")
-_builder.add_edge("evaluate", "refine")
-_builder.add_edge("refine", END)
+_builder.add_conditional_edges("generate", after_generate, ["evaluate", "decide"])
+_builder.add_edge("evaluate", "decide")
+_builder.add_conditional_edges("decide", after_decide, ["refine", END])
+_builder.add_conditional_edges("refine", after_refine, ["evaluate", "decide"])
 
-app = _builder.compile()
+app = instrument(_builder, "evaluator_optimizer").compile()
@@ -3,18 +3,21 @@ Agent exemple minimal fonctionnel
 """
 from typing import TypedDict, Annotated, Sequence
 from langgraph.graph import StateGraph, END
-from langgraph.graph.message import add_messages
 from langchain_core.messages import AnyMessage
-from langchain_openai import ChatOpenAI
+from agent_runtime import get_llm, instrument
+from agent_runtime.state import bounded_messages
+
+# Client partagé (pool de connexions + limites de débit communes à tous les agents)
+llm = get_llm("gpt-3.5-turbo", graph="example")
 
 
 class State(TypedDict):
-    messages: Annotated[Sequence[AnyMessage], add_messages]
+    messages: Annotated[Sequence[AnyMessage], bounded_messages]
 
 
 def agent_node(state: State):
     """Nœud principal de l'agent"""
-    llm = ChatOpenAI(model="gpt-3.5-turbo")
+    # Historique borné: résumé des anciens tours + derniers tours (agent_runtime.state)
     response = llm.invoke(state["messages"])
     return {"messages": [response]}
 
@@ -26,4 +29,4 @@ graph.set_entry_point("agent")
 graph.add_edge("agent", END)
 
 # Compilation - LangGraph Server attend un objet `app`
-app = graph.compile()
\ No newline at end of file
+app = instrument(graph, "example").compile()
\ No newline at end of file
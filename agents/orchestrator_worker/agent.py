@@ -1,83 +1,128 @@
 """
 Orchestrator-Worker example: orchestrator splits, workers execute, aggregator combines.
-Chat-compatible: messages state with add_messages; final assistant message appended.
+Chat-compatible: bounded messages state (agent_runtime.state); final assistant message appended.
+Nodes have native async versions (ainvoke), used by the server.
+
+One worker invocation is dispatched per subtask (Send), for any number of
+subtasks, with at most ORCHESTRATOR_MAX_WORKERS running at once (override per
+run with the standard `max_concurrency` config key).
+
+Each worker forwards its result on the "custom" stream mode as soon as it
+finishes, as {"subtask": 2, "of": 5, "output": "..."}, so clients can show
+partial results. Only those events are incremental: the workers' `results`
+writes are applied together at the end of their superstep, where
+merge_results puts them in plan order. The aggregator is a join: it runs once
+every worker is done and emits the combined message.
 """
-from typing import TypedDict, Annotated, Sequence, List, NotRequired
-from operator import add as list_add
+import os
+from bisect import insort
+from typing import TypedDict, Annotated, Sequence, List, NotRequired, Optional
+from langgraph.config import get_stream_writer
 from langgraph.graph import StateGraph, START, END
-from langgraph.graph.message import add_messages
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import AnyMessage, AIMessage, HumanMessage
+from langgraph.types import Send
+from agent_runtime import dual, get_llm, instrument
+from agent_runtime.state import bounded_messages, last_user_text
+from langchain_core.messages import AnyMessage, AIMessage
+
+llm = get_llm("gpt-4o-mini", graph="orchestrator_worker")
+
+MAX_WORKERS = int(os.environ.get("ORCHESTRATOR_MAX_WORKERS", "8"))
+MAX_SUBTASKS = int(os.environ.get("ORCHESTRATOR_MAX_SUBTASKS", "50"))
+
+
+class WorkerResult(TypedDict):
+    index: int
+    subtask: str
+    output: str
 
-llm = ChatOpenAI(model="gpt-4o-mini")
+
+def merge_results(left: Optional[List[WorkerResult]], right: Optional[List[WorkerResult]]) -> List[WorkerResult]:
+    # None resets the list, so a new turn on the same thread starts from scratch
+    if right is None:
+        return []
+    merged = list(left or [])
+    for result in right:
+        insort(merged, result, key=lambda r: r["index"])
+    return merged
 
 
 class State(TypedDict):
-    messages: Annotated[Sequence[AnyMessage], add_messages]
+    messages: Annotated[Sequence[AnyMessage], bounded_messages]
     task: NotRequired[str]
     subtasks: NotRequired[List[str]]
-    # Allow concurrent fan-in writes from workers
-    results: Annotated[NotRequired[List[str]], list_add]  # type: ignore[valid-type]
+    # Fan-in writes of the workers' superstep, applied together and kept in plan order
+    results: Annotated[NotRequired[List[WorkerResult]], merge_results]  # type: ignore[valid-type]
     final: NotRequired[str]
 
 
-def _last_user_text(state: State) -> str:
-    for m in reversed(state.get("messages", [])):
-        if isinstance(m, HumanMessage) or getattr(m, "type", None) == "human":
-            return m.content if isinstance(m.content, str) else str(m.content)
-    return state.get("task", "")
+class WorkerState(TypedDict):
+    index: int
+    count: int
+    subtask: str
 
 
-def orchestrator(state: State):
-    task = state.get("task") or _last_user_text(state)
-    msg = llm.invoke(
-        "Break the task into 3 short, independent subtasks as bullet points.\nTask: "
-        + task
+def _plan_prompt(task: str) -> str:
+    return (
+        "Break the task into short, independent subtasks as bullet points, "
+        f"as many as the task needs (at most {MAX_SUBTASKS}).\nTask: " + task
     )
-    lines = [l.strip("- ") for l in msg.content.splitlines() if l.strip()]
-    subs = [l for l in lines if l]
-    # Ensure exactly 3 slots to avoid IndexError in workers
+
+
+def _split_plan(task: str, msg) -> dict:
+    lines = [l.strip("-*• ") for l in msg.content.splitlines() if l.strip()]
+    subs = [l for l in lines if l][:MAX_SUBTASKS]
     if not subs:
         subs = [task]
-    if len(subs) < 3:
-        subs = subs + [f"(Skip)" for _ in range(3 - len(subs))]
-    else:
-        subs = subs[:3]
-    return {"subtasks": subs}
+    return {"subtasks": subs, "results": None}
+
+
+def orchestrator(state: State):
+    task = state.get("task") or last_user_text(state)
+    return _split_plan(task, llm.invoke(_plan_prompt(task)))
+
+
+async def aorchestrator(state: State):
+    task = state.get("task") or last_user_text(state)
+    return _split_plan(task, await llm.ainvoke(_plan_prompt(task)))
+
+
+def assign_workers(state: State):
+    # One worker per real subtask; no empty branches for short plans
+    subtasks = state.get("subtasks", [])
+    return [Send("worker", {"index": i, "count": len(subtasks), "subtask": s}) for i, s in enumerate(subtasks)]
+
+
+def _worker_result(state: WorkerState, output: str) -> dict:
+    get_stream_writer()({"subtask": state["index"], "of": state["count"], "output": output})
+    # Return a single-item list; LangGraph merges them with merge_results once every worker is done
+    return {"results": [{"index": state["index"], "subtask": state["subtask"], "output": output}]}
+
+
+def worker(state: WorkerState):
+    msg = llm.invoke(f"Do this subtask succinctly: {state['subtask']}")
+    return _worker_result(state, msg.content)
 
 
-def worker_factory(idx: int):
-    def _worker(state: State):
-        subs = state.get("subtasks", [])
-        if idx >= len(subs) or not subs[idx] or subs[idx].strip().lower() == "(skip)":
-            return {}
-        sub = subs[idx]
-        msg = llm.invoke(f"Do this subtask succinctly: {sub}")
-        # Return a single-item list; LangGraph merges with list_add
-        return {"results": [msg.content]}
-    return _worker
+async def aworker(state: WorkerState):
+    msg = await llm.ainvoke(f"Do this subtask succinctly: {state['subtask']}")
+    return _worker_result(state, msg.content)
 
 
 def aggregate(state: State):
-    parts = [p for p in state.get("results", []) if p]
+    # merge_results already keeps the results in plan order
+    parts = [r["output"] for r in state.get("results") or [] if r["output"]]
     combined = "\n\n".join(f"- {p}" for p in parts) if parts else "No results produced."
     return {"final": combined, "messages": [AIMessage(content=combined)]}
 
 
 _builder = StateGraph(State)
-_builder.add_node("orchestrator", orchestrator)
-_builder.add_node("worker0", worker_factory(0))
-_builder.add_node("worker1", worker_factory(1))
-_builder.add_node("worker2", worker_factory(2))
-_builder.add_node("aggregate", aggregate)
+_builder.add_node("orchestrator", dual(orchestrator, aorchestrator))
+_builder.add_node("worker", dual(worker, aworker), input_schema=WorkerState)
+_builder.add_node("aggregate", dual(aggregate))
 
 _builder.add_edge(START, "orchestrator")
-_builder.add_edge("orchestrator", "worker0")
-_builder.add_edge("orchestrator", "worker1")
-_builder.add_edge("orchestrator", "worker2")
-_builder.add_edge("worker0", "aggregate")
-_builder.add_edge("worker1", "aggregate")
-_builder.add_edge("worker2", "aggregate")
+_builder.add_conditional_edges("orchestrator", assign_workers, ["worker"])
+_builder.add_edge("worker", "aggregate")
 _builder.add_edge("aggregate", END)
 
-app = _builder.compile()
+app = instrument(_builder, "orchestrator_worker").compile().with_config(max_concurrency=MAX_WORKERS)
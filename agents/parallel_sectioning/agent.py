@@ -1,21 +1,50 @@
 """
 Parallelization - Sectioning example
 Generates a joke, story, and poem in parallel, then aggregates them.
+Nodes have native async versions (ainvoke), used by the server.
+
+With stream_sections (SECTIONING_STREAM, 1), each branch streams its LLM reply
+and forwards it as it comes on the "custom" stream mode, as
+{"section": "joke", "delta": "..."} events then {"section": "joke", "done": true}:
+the first text reaches the client as soon as the fastest branch starts producing
+it instead of after the slowest one. The aggregator still runs once all three
+branches are done and emits the combined message.
+
+Under a run deadline (agent_runtime.deadline) a branch whose LLM call is cut
+keeps the text it streamed so far, marked as cut (its "done" event then has
+"timed_out": true), so the run still ends with a combined message.
 Exports: app (CompiledGraph)
 """
+import os
 from typing import TypedDict, Annotated, Sequence, NotRequired
+from langgraph.config import get_stream_writer
 from langgraph.graph import StateGraph, START, END
-from langgraph.graph.message import add_messages
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import AnyMessage, AIMessage, HumanMessage
+from langchain_core.runnables import RunnableConfig
+from agent_runtime import DeadlineExceeded, dual, get_llm, instrument
+from agent_runtime.state import bounded_messages, last_user_text
+from langchain_core.messages import AnyMessage, AIMessage
 
 
 # Configure LLM (relies on OPENAI_API_KEY in environment)
-llm = ChatOpenAI(model="gpt-4o-mini")
+llm = get_llm("gpt-4o-mini", graph="parallel_sectioning")
+
+DEFAULTS = {
+    # Stream each section as its branch produces it (config["configurable"]["stream_sections"])
+    "stream_sections": os.environ.get("SECTIONING_STREAM", "1") == "1",
+}
+# Order of the sections in the combined output
+SECTIONS = ("story", "joke", "poem")
+PROMPTS = {
+    "joke": "Write a short funny joke about {topic}.",
+    "story": "Write a short bedtime story about {topic}.",
+    "poem": "Write a short poem about {topic}.",
+}
+# Appended to a section cut by the run's deadline
+CUT = "[out of time]"
 
 
 class State(TypedDict):
-    messages: Annotated[Sequence[AnyMessage], add_messages]
+    messages: Annotated[Sequence[AnyMessage], bounded_messages]
     topic: NotRequired[str]
     joke: NotRequired[str]
     story: NotRequired[str]
@@ -23,50 +52,89 @@ class State(TypedDict):
     combined_output: NotRequired[str]
 
 
-def _last_user_text(state: State) -> str:
-    for m in reversed(state.get("messages", [])):
-        if isinstance(m, HumanMessage) or getattr(m, "type", None) == "human":
-            return m.content if isinstance(m.content, str) else str(m.content)
-    return state.get("topic", "")
+def _streaming(config: RunnableConfig) -> bool:
+    return (config or {}).get("configurable", {}).get("stream_sections", DEFAULTS["stream_sections"])
 
 
-def call_llm_1(state: State):
-    topic = state.get("topic") or _last_user_text(state)
-    msg = llm.invoke(f"Write a short funny joke about {topic}.")
-    return {"joke": msg.content}
+def _cut(text: str) -> str:
+    return f"{text} {CUT}" if text else CUT
 
 
-def call_llm_2(state: State):
-    topic = state.get("topic") or _last_user_text(state)
-    msg = llm.invoke(f"Write a short bedtime story about {topic}.")
-    return {"story": msg.content}
+def _section(section: str, state: State, config: RunnableConfig) -> dict:
+    prompt = PROMPTS[section].format(topic=state.get("topic") or last_user_text(state))
+    if not _streaming(config):
+        try:
+            return {section: llm.invoke(prompt).content}
+        except DeadlineExceeded:
+            return {section: CUT}
+    write, text = get_stream_writer(), ""
+    try:
+        for chunk in llm.stream(prompt):
+            text += chunk.content
+            write({"section": section, "delta": chunk.content})
+    except DeadlineExceeded:
+        write({"section": section, "done": True, "timed_out": True})
+        return {section: _cut(text)}
+    write({"section": section, "done": True})
+    return {section: text}
 
 
-def call_llm_3(state: State):
-    topic = state.get("topic") or _last_user_text(state)
-    msg = llm.invoke(f"Write a short poem about {topic}.")
-    return {"poem": msg.content}
+async def _asection(section: str, state: State, config: RunnableConfig) -> dict:
+    prompt = PROMPTS[section].format(topic=state.get("topic") or last_user_text(state))
+    if not _streaming(config):
+        try:
+            return {section: (await llm.ainvoke(prompt)).content}
+        except DeadlineExceeded:
+            return {section: CUT}
+    write, text = get_stream_writer(), ""
+    try:
+        async for chunk in llm.astream(prompt):
+            text += chunk.content
+            write({"section": section, "delta": chunk.content})
+    except DeadlineExceeded:
+        write({"section": section, "done": True, "timed_out": True})
+        return {section: _cut(text)}
+    write({"section": section, "done": True})
+    return {section: text}
 
 
-def aggregator(state: State):
-    topic = state.get("topic") or _last_user_text(state)
-    story = state.get("story")
-    joke = state.get("joke")
-    poem = state.get("poem")
-
-    parts = []
-    if story:
-        parts.append(f"STORY:\n{story}")
-    if joke:
-        parts.append(f"JOKE:\n{joke}")
-    if poem:
-        parts.append(f"POEM:\n{poem}")
+def call_llm_1(state: State, config: RunnableConfig):
+    return _section("joke", state, config)
+
+
+async def acall_llm_1(state: State, config: RunnableConfig):
+    return await _asection("joke", state, config)
+
+
+def call_llm_2(state: State, config: RunnableConfig):
+    return _section("story", state, config)
+
+
+async def acall_llm_2(state: State, config: RunnableConfig):
+    return await _asection("story", state, config)
+
 
+def call_llm_3(state: State, config: RunnableConfig):
+    return _section("poem", state, config)
+
+
+async def acall_llm_3(state: State, config: RunnableConfig):
+    return await _asection("poem", state, config)
+
+
+def combine(topic: str, sections: dict) -> str:
+    """Combined output of the sections produced so far, in SECTIONS order."""
+    parts = [f"{name.upper()}:\n{sections[name]}" for name in SECTIONS if sections.get(name)]
     header = f"Here is a story, joke, and poem about {topic}!" if topic else "Collected pieces:"
-    combined = header + ("\n\n" + "\n\n".join(parts) if parts else "\n(Waiting for sections...)" )
+    return header + ("\n\n" + "\n\n".join(parts) if parts else "\n(Waiting for sections...)")
+
+
+def aggregator(state: State):
+    topic = state.get("topic") or last_user_text(state)
+    combined = combine(topic, state)
 
     # Only emit final assistant message when all sections are present
-    done = all([story, joke, poem])
+    done = all(state.get(name) for name in SECTIONS)
     if done:
         return {"combined_output": combined, "messages": [AIMessage(content=combined)]}
     else:
@@ -75,10 +143,10 @@ def aggregator(state: State):
 
 # Build graph
 _builder = StateGraph(State)
-_builder.add_node("call_llm_1", call_llm_1)
-_builder.add_node("call_llm_2", call_llm_2)
-_builder.add_node("call_llm_3", call_llm_3)
-_builder.add_node("aggregator", aggregator)
+_builder.add_node("call_llm_1", dual(call_llm_1, acall_llm_1))
+_builder.add_node("call_llm_2", dual(call_llm_2, acall_llm_2))
+_builder.add_node("call_llm_3", dual(call_llm_3, acall_llm_3))
+_builder.add_node("aggregator", dual(aggregator))
 
 # parallel fan-out from START
 _builder.add_edge(START, "call_llm_1")
@@ -91,4 +159,4 @@ _builder.add_edge("call_llm_2", "aggregator")
 _builder.add_edge("call_llm_3", "aggregator")
 _builder.add_edge("aggregator", END)
 
-app = _builder.compile()
+app = instrument(_builder, "parallel_sectioning").compile()
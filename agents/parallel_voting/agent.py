@@ -1,31 +1,72 @@
 """
 Parallelization - Voting example
 Runs the same task multiple times in parallel and chooses the best result.
+Nodes have native async versions (ainvoke), used by the server.
+
+Voting modes, picked per run with config["configurable"]["voting_mode"]
+(default: VOTING_MODE env, "all"):
+- "all": variant1..3 run as parallel branches and choose_best waits for all of them.
+- "quorum": one node races the variants and proceeds with the first `quorum`
+  that finish within `variant_deadline` seconds; stragglers are cancelled.
+  With `hedge`, a duplicate request is sent for a variant still running past
+  the p95 latency observed so far; variants cancelled before finishing count
+  as censored samples (they took at least that long), so the estimate is not
+  limited to the quorum winners.
+The run reports `used_variants`, `cancelled_variants` and `variant_latency_ms`.
 Exports: app (CompiledGraph)
 """
-from typing import TypedDict, Annotated, Sequence, NotRequired
+import asyncio
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextvars import copy_context
+from typing import TypedDict, Annotated, Dict, List, Sequence, NotRequired
 from langgraph.graph import StateGraph, START, END
-from langgraph.graph.message import add_messages
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import AnyMessage, AIMessage, HumanMessage
+from langchain_core.runnables import RunnableConfig
+from agent_runtime import dual, get_llm, instrument
+from agent_runtime.state import bounded_messages, last_user_text
+from langchain_core.messages import AnyMessage, AIMessage
+
+llm = get_llm("gpt-4o-mini", graph="parallel_voting", cache=True)
 
-llm = ChatOpenAI(model="gpt-4o-mini")
+PROMPTS = {
+    "draft1": "Write a short product tagline about {topic} with humor.",
+    "draft2": "Write a concise, professional product tagline about {topic}.",
+    "draft3": "Write an edgy, bold product tagline about {topic}.",
+}
+DEFAULTS = {
+    "voting_mode": os.environ.get("VOTING_MODE", "all"),
+    "quorum": int(os.environ.get("VOTING_QUORUM", "2")),
+    "variant_deadline": float(os.environ.get("VOTING_VARIANT_DEADLINE", "30")),
+    "hedge": os.environ.get("VOTING_HEDGE", "0") == "1",
+    # Hedge delay used until enough latencies have been observed for a p95
+    "hedge_after": float(os.environ.get("VOTING_HEDGE_AFTER", "2.0")),
+}
+# Recent variant latencies for the hedging threshold, as (seconds, finished):
+# a variant cancelled before finishing only gives a lower bound (finished=False)
+_latencies: deque = deque(maxlen=200)
 
 
 class State(TypedDict):
-    messages: Annotated[Sequence[AnyMessage], add_messages]
+    messages: Annotated[Sequence[AnyMessage], bounded_messages]
     topic: NotRequired[str]
     draft1: NotRequired[str]
     draft2: NotRequired[str]
     draft3: NotRequired[str]
     best: NotRequired[str]
+    used_variants: NotRequired[List[str]]
+    cancelled_variants: NotRequired[List[str]]
+    variant_latency_ms: NotRequired[Dict[str, float]]
+
 
+def _options(config: RunnableConfig) -> dict:
+    configurable = (config or {}).get("configurable", {})
+    return {k: configurable.get(k, v) for k, v in DEFAULTS.items()}
 
-def _last_user_text(state: State) -> str:
-    for m in reversed(state.get("messages", [])):
-        if isinstance(m, HumanMessage) or getattr(m, "type", None) == "human":
-            return m.content if isinstance(m.content, str) else str(m.content)
-    return state.get("topic", "")
+
+def _prompt(state: State, key: str) -> str:
+    return PROMPTS[key].format(topic=state.get("topic") or last_user_text(state))
 
 
 def write_variant(prompt: str):
@@ -36,48 +77,196 @@ def write_variant(prompt: str):
 
 
 def variant1(state: State):
-    topic = state.get("topic") or _last_user_text(state)
-    msg = llm.invoke(f"Write a short product tagline about {topic} with humor.")
-    return {"draft1": msg.content}
+    return {"draft1": llm.invoke(_prompt(state, "draft1")).content}
+
+
+async def avariant1(state: State):
+    return {"draft1": (await llm.ainvoke(_prompt(state, "draft1"))).content}
 
 
 def variant2(state: State):
-    topic = state.get("topic") or _last_user_text(state)
-    msg = llm.invoke(f"Write a concise, professional product tagline about {topic}.")
-    return {"draft2": msg.content}
+    return {"draft2": llm.invoke(_prompt(state, "draft2")).content}
+
+
+async def avariant2(state: State):
+    return {"draft2": (await llm.ainvoke(_prompt(state, "draft2"))).content}
 
 
 def variant3(state: State):
-    topic = state.get("topic") or _last_user_text(state)
-    msg = llm.invoke(f"Write an edgy, bold product tagline about {topic}.")
-    return {"draft3": msg.content}
+    return {"draft3": llm.invoke(_prompt(state, "draft3")).content}
 
 
-def choose_best(state: State):
-    # Use the LLM to pick best among options
-    instruction = (
+async def avariant3(state: State):
+    return {"draft3": (await llm.ainvoke(_prompt(state, "draft3"))).content}
+
+
+def _hedge_delay(opts: dict) -> float:
+    if sum(finished for _, finished in _latencies) < 20:
+        return opts["hedge_after"]
+    return _p95(list(_latencies))
+
+
+def _p95(samples: list) -> float:
+    """Kaplan-Meier estimate of the 95th percentile latency; unfinished samples are censored."""
+    at_risk, survival = len(samples), 1.0
+    # At equal times, finishes come before censorings (still at risk then)
+    for seconds, finished in sorted(samples, key=lambda s: (s[0], not s[1])):
+        if finished:
+            survival *= 1 - 1 / at_risk
+            if survival <= 0.05 + 1e-9:
+                return seconds
+        at_risk -= 1
+    # The slowest 5% were all cut short: the longest wait is the best lower bound
+    return max(seconds for seconds, _ in samples)
+
+
+async def _race_variant(prompt: str, opts: dict) -> str:
+    """One variant call, plus a hedged duplicate if it runs past the p95 latency.
+
+    The first call to succeed wins; it raises only once every call has failed.
+    """
+    if not opts["hedge"]:
+        return (await llm.ainvoke(prompt)).content
+    calls = {asyncio.ensure_future(llm.ainvoke(prompt))}
+    try:
+        done, _ = await asyncio.wait(calls, timeout=_hedge_delay(opts))
+        if not done:
+            calls.add(asyncio.ensure_future(llm.ainvoke(prompt, cache=False, singleflight=False)))
+        while True:
+            done, calls = await asyncio.wait(calls, return_when=asyncio.FIRST_COMPLETED)
+            for call in done:
+                if call.exception() is None:
+                    return call.result().content
+            if not calls:
+                raise done.pop().exception()
+    finally:
+        for call in calls:
+            call.cancel()
+
+
+def _quorum_update(results: dict, latencies: dict) -> dict:
+    cancelled = [k for k in PROMPTS if k not in results]
+    return {
+        **results,
+        "used_variants": sorted(results),
+        "cancelled_variants": cancelled,
+        "variant_latency_ms": {k: round(v * 1000, 1) for k, v in latencies.items()},
+    }
+
+
+async def avote_quorum(state: State, config: RunnableConfig):
+    opts = _options(config)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline = started + opts["variant_deadline"]
+    tasks = {asyncio.ensure_future(_race_variant(_prompt(state, k), opts)): k for k in PROMPTS}
+    results, latencies, pending = {}, {}, set(tasks)
+    try:
+        while pending and len(results) < opts["quorum"]:
+            done, pending = await asyncio.wait(
+                pending, timeout=deadline - loop.time(), return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                break  # variant deadline reached
+            for task in done:
+                if task.exception() is None:
+                    key = tasks[task]
+                    results[key] = task.result()
+                    latencies[key] = loop.time() - started
+                    _latencies.append((latencies[key], True))
+    finally:
+        # Stragglers, and every variant if the run itself is cancelled
+        for task in pending:
+            task.cancel()
+            _latencies.append((loop.time() - started, False))
+    return _quorum_update(results, latencies)
+
+
+def vote_quorum(state: State, config: RunnableConfig):
+    # Sync variant (app.invoke): no hedging, and stragglers cannot be interrupted,
+    # but their results are discarded
+    opts = _options(config)
+    started = time.monotonic()
+    pool = ThreadPoolExecutor(max_workers=len(PROMPTS))
+    futures = {pool.submit(copy_context().run, llm.invoke, _prompt(state, k)): k for k in PROMPTS}
+    results, latencies, pending = {}, {}, set(futures)
+    while pending and len(results) < opts["quorum"]:
+        remaining = started + opts["variant_deadline"] - time.monotonic()
+        done, pending = wait(pending, timeout=max(0.0, remaining), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for future in done:
+            if future.exception() is None:
+                key = futures[future]
+                results[key] = future.result().content
+                latencies[key] = time.monotonic() - started
+                _latencies.append((latencies[key], True))
+    for future in pending:
+        # Stragglers keep running: record how long they actually take
+        future.add_done_callback(lambda f: _record_straggler(f, started))
+    pool.shutdown(wait=False, cancel_futures=True)
+    return _quorum_update(results, latencies)
+
+
+def _record_straggler(future, started: float) -> None:
+    if future.cancelled():
+        _latencies.append((time.monotonic() - started, False))
+    elif future.exception() is None:
+        _latencies.append((time.monotonic() - started, True))
+
+
+def route_variants(state: State, config: RunnableConfig):
+    if _options(config)["voting_mode"] == "quorum":
+        return "vote_quorum"
+    return ["variant1", "variant2", "variant3"]
+
+
+def _drafts(state: State, config: RunnableConfig) -> list[str]:
+    if _options(config)["voting_mode"] == "quorum":
+        return [state[k] for k in state.get("used_variants", [])]
+    return [state[k] for k in PROMPTS]
+
+
+def _choice_prompt(drafts: list[str]) -> str:
+    options = "".join(f"Option {chr(65 + i)}: {d}\n" for i, d in enumerate(drafts))
+    return (
         "You are selecting the best tagline. Consider clarity, memorability, and appeal.\n"
-        f"Option A: {state['draft1']}\n"
-        f"Option B: {state['draft2']}\n"
-        f"Option C: {state['draft3']}\n"
-        "Respond with the chosen option letter and the final improved tagline."
+        + options
+        + "Respond with the chosen option letter and the final improved tagline."
     )
-    msg = llm.invoke(instruction)
-    return {"best": msg.content, "messages": [AIMessage(content=msg.content)]}
+
+
+def _best(text: str) -> dict:
+    return {"best": text, "messages": [AIMessage(content=text)]}
+
+
+def choose_best(state: State, config: RunnableConfig):
+    drafts = _drafts(state, config)
+    if len(drafts) <= 1:
+        return _best(drafts[0] if drafts else "No tagline was produced in time.")
+    # Use the LLM to pick best among options
+    return _best(llm.invoke(_choice_prompt(drafts)).content)
+
+
+async def achoose_best(state: State, config: RunnableConfig):
+    drafts = _drafts(state, config)
+    if len(drafts) <= 1:
+        return _best(drafts[0] if drafts else "No tagline was produced in time.")
+    return _best((await llm.ainvoke(_choice_prompt(drafts))).content)
 
 
 _builder = StateGraph(State)
-_builder.add_node("variant1", variant1)
-_builder.add_node("variant2", variant2)
-_builder.add_node("variant3", variant3)
-_builder.add_node("choose_best", choose_best)
-
-_builder.add_edge(START, "variant1")
-_builder.add_edge(START, "variant2")
-_builder.add_edge(START, "variant3")
+_builder.add_node("variant1", dual(variant1, avariant1))
+_builder.add_node("variant2", dual(variant2, avariant2))
+_builder.add_node("variant3", dual(variant3, avariant3))
+_builder.add_node("vote_quorum", dual(vote_quorum, avote_quorum))
+_builder.add_node("choose_best", dual(choose_best, achoose_best))
+
+_builder.add_conditional_edges(START, route_variants, ["variant1", "variant2", "variant3", "vote_quorum"])
 _builder.add_edge("variant1", "choose_best")
 _builder.add_edge("variant2", "choose_best")
 _builder.add_edge("variant3", "choose_best")
+_builder.add_edge("vote_quorum", "choose_best")
 _builder.add_edge("choose_best", END)
 
-app = _builder.compile()
+app = instrument(_builder, "parallel_voting").compile()
@@ -1,59 +1,98 @@
 """
 Prompt chaining example: outline -> draft -> edit.
-Chat-compatible: messages state with add_messages; final assistant response appended.
+Chat-compatible: bounded messages state (agent_runtime.state); final assistant response appended.
+A topic close enough to an earlier one is answered from the semantic cache
+(agent_runtime.semantic) without running the chain.
+Under a run deadline (agent_runtime.deadline) the chain ends with what it has:
+the draft is returned unedited when the edit would not fit in the time left,
+and a step cut by the deadline ends the run with the previous step's text.
 """
 from typing import TypedDict, Annotated, Sequence, NotRequired
 from langgraph.graph import StateGraph, START, END
-from langgraph.graph.message import add_messages
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import AnyMessage, AIMessage, HumanMessage
+from agent_runtime import deadline, get_llm, instrument, metrics, semantic_cache
+from agent_runtime.deadline import DeadlineExceeded
+from agent_runtime.state import bounded_messages, last_user_text
+from langchain_core.messages import AnyMessage, AIMessage
 
-llm = ChatOpenAI(model="gpt-4o-mini")
+llm = get_llm("gpt-4o-mini", graph="prompt_chaining")
+cache = semantic_cache.namespace("prompt_chaining", __file__)
+# Time an edit is assumed to take when no LLM call of the chain has been timed yet
+EDIT_SECONDS = 10.0
 
 
 class State(TypedDict):
-    messages: Annotated[Sequence[AnyMessage], add_messages]
+    messages: Annotated[Sequence[AnyMessage], bounded_messages]
     topic: NotRequired[str]
     outline: NotRequired[str]
     draft: NotRequired[str]
     final: NotRequired[str]
+    cache_hit: NotRequired[bool]
+    timed_out: NotRequired[bool]
 
 
-def _last_user_text(state: State) -> str:
-    for m in reversed(state.get("messages", [])):
-        if isinstance(m, HumanMessage) or getattr(m, "type", None) == "human":
-            return m.content if isinstance(m.content, str) else str(m.content)
-    return state.get("topic", "")
+def check_cache(state: State):
+    hit = cache.lookup(state.get("topic") or last_user_text(state))
+    if hit is None:
+        return {"cache_hit": False, "timed_out": False}
+    return {"cache_hit": True, "timed_out": False, "final": hit.answer, "messages": [hit.message()]}
+
+
+def _partial(text: str, timed_out: bool = True):
+    """End the run with `text` (not stored in the semantic cache)."""
+    return {"final": text, "timed_out": timed_out, "messages": [AIMessage(content=text)]}
 
 
 def make_outline(state: State):
-    topic = state.get("topic") or _last_user_text(state)
-    msg = llm.invoke(f"Create a concise outline for an article about {topic}.")
+    topic = state.get("topic") or last_user_text(state)
+    try:
+        msg = llm.invoke(f"Create a concise outline for an article about {topic}.", cache=True)
+    except DeadlineExceeded:
+        return _partial(f"Out of time before an article about {topic} could be written.")
     return {"outline": msg.content}
 
 
 def write_draft(state: State):
-    msg = llm.invoke(
-        "Write a brief article following this outline:\n" + state["outline"]
-    )
+    try:
+        msg = llm.invoke(
+            "Write a brief article following this outline:\n" + state["outline"]
+        )
+    except DeadlineExceeded:
+        return _partial(state["outline"])
     return {"draft": msg.content}
 
 
-def edit_draft(state: State):
-    msg = llm.invoke(
-        "Improve the clarity and structure of the following draft; return the improved version only:\n" + state["draft"]
+def _edit_seconds() -> float:
+    """Expected edit time: past edits, else past drafts (a prompt of the same size)."""
+    return (
+        metrics.call_seconds("prompt_chaining", "edit_draft")
+        or metrics.call_seconds("prompt_chaining", "write_draft")
+        or EDIT_SECONDS
     )
+
+
+def edit_draft(state: State):
+    if deadline.short_of(_edit_seconds()):
+        return _partial(state["draft"], timed_out=False)
+    try:
+        msg = llm.invoke(
+            "Improve the clarity and structure of the following draft; return the improved version only:\n" + state["draft"]
+        )
+    except DeadlineExceeded:
+        return _partial(state["draft"])
+    cache.store(state.get("topic") or last_user_text(state), msg.content)
     return {"final": msg.content, "messages": [AIMessage(content=msg.content)]}
 
 
 _builder = StateGraph(State)
+_builder.add_node("check_cache", check_cache)
 _builder.add_node("make_outline", make_outline)
 _builder.add_node("write_draft", write_draft)
 _builder.add_node("edit_draft", edit_draft)
 
-_builder.add_edge(START, "make_outline")
-_builder.add_edge("make_outline", "write_draft")
-_builder.add_edge("write_draft", "edit_draft")
+_builder.add_edge(START, "check_cache")
+_builder.add_conditional_edges("check_cache", lambda s: END if s["cache_hit"] else "make_outline", ["make_outline", END])
+_builder.add_conditional_edges("make_outline", lambda s: END if s.get("timed_out") else "write_draft", ["write_draft", END])
+_builder.add_conditional_edges("write_draft", lambda s: END if s.get("timed_out") else "edit_draft", ["edit_draft", END])
 _builder.add_edge("edit_draft", END)
 
-app = _builder.compile()
+app = instrument(_builder, "prompt_chaining").compile()
@@ -1,73 +1,109 @@
 """
 Routing example: route to specialist based on topic, then respond.
-Chat-compatible: messages state with add_messages; final assistant response appended.
+Chat-compatible: bounded messages state (agent_runtime.state); final assistant response appended.
+
+The router first asks a local classifier trained at import from routes.jsonl
+(ROUTER_TRAINING_DATA) and only calls the LLM when its confidence is below
+ROUTER_THRESHOLD (0.7; per run: config["configurable"]["route_threshold"],
+0 = always local, above 1 = always LLM). `route_source` ("local" / "llm") reports
+which path was taken and `route_confidence` the local classifier's confidence.
+The LLM fallback is a model cascade (agent_runtime.cascade): gpt-4o-mini first,
+gpt-4o only when the answer is not one of the labels.
+
+Answers are kept in the semantic cache (agent_runtime.semantic): a request close
+enough to an earlier one is answered by `check_cache` without routing
+(`cache_hit` in the state).
 """
+import os
+from pathlib import Path
 from typing import TypedDict, Annotated, Sequence, Literal, NotRequired
 from langgraph.graph import StateGraph, START, END
-from langgraph.graph.message import add_messages
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import AnyMessage, AIMessage, HumanMessage
+from langchain_core.runnables import RunnableConfig
+from agent_runtime import TextClassifier, get_cascade, get_llm, instrument, semantic_cache
+from agent_runtime.cascade import one_of
+from agent_runtime.state import bounded_messages, last_user_text
+from langchain_core.messages import AnyMessage, AIMessage
 
-llm = ChatOpenAI(model="gpt-4o-mini")
+llm = get_llm("gpt-4o-mini", graph="routing")
+cache = semantic_cache.namespace("routing", __file__)
+
+ROUTES = ("tech", "health", "finance")
+classifier_llm = get_cascade(("gpt-4o-mini", "gpt-4o"), graph="routing", node="router", verifier=one_of(ROUTES))
+THRESHOLD = float(os.environ.get("ROUTER_THRESHOLD", "0.7"))
+TRAINING_DATA = Path(os.environ.get("ROUTER_TRAINING_DATA") or Path(__file__).with_name("routes.jsonl"))
+classifier = TextClassifier.from_jsonl(TRAINING_DATA) if TRAINING_DATA.exists() else None
 
 
 class State(TypedDict):
-    messages: Annotated[Sequence[AnyMessage], add_messages]
+    messages: Annotated[Sequence[AnyMessage], bounded_messages]
     topic: NotRequired[str]
     route: NotRequired[Literal["tech", "health", "finance"]]
+    route_source: NotRequired[Literal["local", "llm"]]
+    route_confidence: NotRequired[float]
     answer: NotRequired[str]
+    cache_hit: NotRequired[bool]
 
 
-def _last_user_text(state: State) -> str:
-    for m in reversed(state.get("messages", [])):
-        if isinstance(m, HumanMessage) or getattr(m, "type", None) == "human":
-            return m.content if isinstance(m.content, str) else str(m.content)
-    return state.get("topic", "")
+def check_cache(state: State):
+    hit = cache.lookup(state.get("topic") or last_user_text(state))
+    if hit is None:
+        return {"cache_hit": False}
+    return {"cache_hit": True, "answer": hit.answer, "messages": [hit.message()]}
 
 
-def router(state: State):
-    topic = state.get("topic") or _last_user_text(state)
+def classify_llm(topic: str) -> str:
     prompt = (
         "Classify the user's request into one of: tech, health, finance.\n"
         f"Request: {topic}\nOnly output the single label."
     )
-    msg = llm.invoke(prompt)
+    # Deterministic template over the user text: served from the response cache on repeats
+    msg = classifier_llm.invoke(prompt, cache=True)
     label = msg.content.strip().lower()
-    if label not in {"tech", "health", "finance"}:
-        label = "tech"
-    return {"route": label}
+    return label if label in ROUTES else "tech"
+
+
+def router(state: State, config: RunnableConfig):
+    topic = state.get("topic") or last_user_text(state)
+    threshold = (config or {}).get("configurable", {}).get("route_threshold", THRESHOLD)
+    label, confidence = classifier.predict(topic) if classifier is not None else (None, 0.0)
+    if label in ROUTES and confidence >= threshold:
+        return {"route": label, "route_source": "local", "route_confidence": round(confidence, 3)}
+    return {"route": classify_llm(topic), "route_source": "llm", "route_confidence": round(confidence, 3)}
 
 
 def tech_specialist(state: State):
-    topic = state.get("topic") or _last_user_text(state)
+    topic = state.get("topic") or last_user_text(state)
     msg = llm.invoke(f"As a software expert, answer: {topic}")
     return {"answer": msg.content}
 
 
 def health_specialist(state: State):
-    topic = state.get("topic") or _last_user_text(state)
+    topic = state.get("topic") or last_user_text(state)
     msg = llm.invoke(f"As a medical writer (not medical advice), answer: {topic}")
     return {"answer": msg.content}
 
 
 def finance_specialist(state: State):
-    topic = state.get("topic") or _last_user_text(state)
+    topic = state.get("topic") or last_user_text(state)
     msg = llm.invoke(f"As a finance analyst (not financial advice), answer: {topic}")
     return {"answer": msg.content}
 
 
 def respond(state: State):
+    cache.store(state.get("topic") or last_user_text(state), state["answer"])
     return {"messages": [AIMessage(content=state["answer"])]}
 
 
 _builder = StateGraph(State)
+_builder.add_node("check_cache", check_cache)
 _builder.add_node("router", router)
 _builder.add_node("tech_specialist", tech_specialist)
 _builder.add_node("health_specialist", health_specialist)
 _builder.add_node("finance_specialist", finance_specialist)
 _builder.add_node("respond", respond)
 
-_builder.add_edge(START, "router")
+_builder.add_edge(START, "check_cache")
+_builder.add_conditional_edges("check_cache", lambda s: END if s["cache_hit"] else "router", ["router", END])
 # Conditional edges based on state["route"]
 _builder.add_conditional_edges(
     "router",
@@ -84,4 +120,4 @@ _builder.add_edge("health_specialist", "respond")
 _builder.add_edge("finance_specialist", "respond")
 _builder.add_edge("respond", END)
 
-app = _builder.compile()
+app = instrument(_builder, "routing").compile()
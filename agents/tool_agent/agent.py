@@ -1,54 +1,142 @@
 """
 Tool-using agent example with a minimal calculator tool.
-Chat-compatible: messages state with add_messages; final assistant message appended.
+Chat-compatible: bounded messages state (agent_runtime.state); final assistant message appended.
+
+Arithmetic-only queries ("2 + 2 * 3", "what is 2^10?", one expression per line,
+"x**2 + 1 for x in 0..10 step 0.5") are answered by the safe expression engine
+in agent_runtime.expr without calling the LLM; anything else goes to the LLM,
+unless the semantic cache (agent_runtime.semantic) holds the answer to a close
+enough earlier query.
 """
-from typing import TypedDict, Annotated, Sequence
+import re
+from typing import TypedDict, Annotated, Sequence, Optional
 from langgraph.graph import StateGraph, START, END
-from langgraph.graph.message import add_messages
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import AnyMessage, AIMessage, HumanMessage
+from agent_runtime import dual, get_llm, instrument, semantic_cache
+from agent_runtime.state import bounded_messages, last_user_text
+from agent_runtime.expr import (
+    ExpressionError,
+    LimitError,
+    compile_expression,
+    evaluate,
+    evaluate_many,
+    format_number,
+    parse_sweep,
+    sweep,
+)
+from langchain_core.messages import AnyMessage, AIMessage
 from langchain_core.tools import tool
 
-llm = ChatOpenAI(model="gpt-4o-mini")
+llm = get_llm("gpt-4o-mini", graph="tool_agent")
+cache = semantic_cache.namespace("tool_agent", __file__)
+
+# Batches at least this long are evaluated vectorized (float64) instead of exactly
+VECTORIZE_MIN = 64
+# Sweep points listed in the answer
+SWEEP_DISPLAY = 50
 
 
 @tool
 def calculator(expression: str) -> str:
-    """Evaluate a basic Python arithmetic expression, e.g., '2 + 2 * 3'."""
+    """Evaluate an arithmetic expression, e.g., '2 + 2 * 3' or 'sqrt(2) * pi'."""
     try:
-        # Extremely limited, eval used only for demo arithmetic
-        return str(eval(expression, {"__builtins__": {}}, {}))
-    except Exception as e:
+        return format_number(evaluate(expression))
+    except ExpressionError as e:
         return f"calc error: {e}"
 
 
 class State(TypedDict):
-    messages: Annotated[Sequence[AnyMessage], add_messages]
+    messages: Annotated[Sequence[AnyMessage], bounded_messages]
     query: str
     answer: str
 
 
-def _last_user_text(state: State) -> str:
-    for m in reversed(state.get("messages", [])):
-        if isinstance(m, HumanMessage) or getattr(m, "type", None) == "human":
-            return m.content if isinstance(m.content, str) else str(m.content)
-    return state.get("query", "")
+_PREFIX = re.compile(r"^\s*(?:what\s+is|what's|calculate|compute|evaluate|calc)\b\s*:?", re.IGNORECASE)
+_SYMBOLS = str.maketrans({"×": "*", "÷": "/", "−": "-"})
 
 
-def agent_node(state: State):
-    query = state.get("query") or _last_user_text(state)
-    # Very simple tool-use heuristic
-    if any(ch.isdigit() for ch in query) and any(op in query for op in ["+","-","*","/"]):
-        result = calculator.invoke({"expression": query})
-        final = f"Result: {result}"
+def _arithmetic_text(query: str) -> str:
+    text = _PREFIX.sub("", query.translate(_SYMBOLS)).strip().rstrip("?=").strip()
+    return text.replace("^", "**")
+
+
+def _sweep_answer(swept) -> str:
+    source, name, values = swept
+    results = sweep(source, **{name: values})
+    rows = [f"{name}={format_number(float(x))}: {format_number(float(y))}" for x, y in zip(values, results)]
+    if len(rows) > SWEEP_DISPLAY:
+        rows = rows[:SWEEP_DISPLAY] + [f"... ({len(rows) - SWEEP_DISPLAY} more)"]
+    return "\n".join(rows)
+
+
+def _batch_answer(lines: list[str]) -> str:
+    if len(lines) >= VECTORIZE_MIN:
+        values = evaluate_many(lines)
     else:
-        final = llm.invoke(query).content
+        values = []
+        for line in lines:
+            try:
+                values.append(evaluate(line))
+            except ExpressionError:
+                values.append(None)
+    return "\n".join(f"{line} = {'error' if v is None else format_number(v)}" for line, v in zip(lines, values))
+
+
+def calculate(query: str) -> Optional[str]:
+    """Answer for an arithmetic-only query, None if the query needs the LLM."""
+    text = _arithmetic_text(query)
+    try:
+        swept = parse_sweep(text)
+        if swept is not None:
+            return _sweep_answer(swept)
+        lines = [line.strip() for line in re.split(r"[;\n]", text) if line.strip()]
+        expressions = [compile_expression(line) for line in lines]
+    except LimitError as e:
+        return f"Result: calc error: {e}"
+    except ExpressionError:
+        return None
+    if not expressions or any(e.variables for e in expressions) or not any(e.operations for e in expressions):
+        return None
+    if len(lines) > 1:
+        return _batch_answer(lines)
+    try:
+        return f"Result: {format_number(expressions[0]())}"
+    except ExpressionError as e:
+        return f"Result: calc error: {e}"
+
+
+def _answer(final: str) -> dict:
     return {"answer": final, "messages": [AIMessage(content=final)]}
 
 
+def agent_node(state: State):
+    query = state.get("query") or last_user_text(state)
+    final = calculate(query)
+    if final is not None:
+        return _answer(final)
+    hit = cache.lookup(query)
+    if hit is not None:
+        return {"answer": hit.answer, "messages": [hit.message()]}
+    final = llm.invoke(query).content
+    cache.store(query, final)
+    return _answer(final)
+
+
+async def aagent_node(state: State):
+    query = state.get("query") or last_user_text(state)
+    final = calculate(query)
+    if final is not None:
+        return _answer(final)
+    hit = cache.lookup(query)
+    if hit is not None:
+        return {"answer": hit.answer, "messages": [hit.message()]}
+    final = (await llm.ainvoke(query)).content
+    cache.store(query, final)
+    return _answer(final)
+
+
 _builder = StateGraph(State)
-_builder.add_node("agent", agent_node)
+_builder.add_node("agent", dual(agent_node, aagent_node))
 _builder.add_edge(START, "agent")
 _builder.add_edge("agent", END)
 
-app = _builder.compile()
+app = instrument(_builder, "tool_agent").compile()
@@ -1,7 +1,13 @@
+import asyncio
+import hashlib
+import json
 import os
-import signal
 import subprocess
 import sys
+import threading
+import time
+import urllib.error
+import urllib.request
 from pathlib import Path
 from watchfiles import watch
 
@@ -9,46 +15,695 @@ ROOT = Path('/app')
 CONFIG = ROOT / 'langgraph.json'
 AGENTS = ROOT / 'agents'
 
-CMD = [
-    'langgraph', 'dev',
-    '--host', '0.0.0.0',
-    '--port', '8000',
-    '--config', 'langgraph.json',
-    '--no-reload',
-    '--no-browser',
-]
+# Public port (published by docker-compose as 8123:8000)
+PORT = int(os.environ.get('WATCHER_PORT', '8000'))
+# 'bluegreen': start the new server next to the old one and swap traffic when ready
+# 'restart': legacy kill-and-respawn on PORT
+# 'supervisor': WATCHER_WORKERS servers behind nginx, hashed on thread id, restarted when they die
+RELOAD_MODE = os.environ.get('WATCHER_RELOAD_MODE', 'bluegreen')
+# Internal ports used by blue/green backends (the proxy on PORT forwards to one of them)
+BACKEND_PORTS = [int(p) for p in os.environ.get('WATCHER_BACKEND_PORTS', '8001,8002,8003').split(',')]
+READY_TIMEOUT = float(os.environ.get('WATCHER_READY_TIMEOUT', '180'))
+DRAIN_GRACE = float(os.environ.get('WATCHER_DRAIN_GRACE', '300'))
+# A burst of writes ends after COALESCE_MS without events (capped at COALESCE_MAX_MS)
+COALESCE_MS = int(os.environ.get('WATCHER_COALESCE_MS', '750'))
+COALESCE_MAX_MS = int(os.environ.get('WATCHER_COALESCE_MAX_MS', '5000'))
+# One JSON line per server start (time to /ok and to every graph ready); empty to disable
+STARTUP_LOG = os.environ.get('WATCHER_STARTUP_LOG', '')
+# Supervisor mode: worker i listens on WORKER_BASE_PORT + i and keeps its state in WORKER_DIR/i;
+# its server runs on one of two internal ports WORKER_BACKEND_BASE_PORT + 2i (+1), swapped on reload
+WORKERS = int(os.environ.get('WATCHER_WORKERS', '0')) or os.cpu_count() or 1
+WORKER_BASE_PORT = int(os.environ.get('WATCHER_WORKER_BASE_PORT', '8001'))
+WORKER_BACKEND_BASE_PORT = int(os.environ.get('WATCHER_WORKER_BACKEND_BASE_PORT', '9001'))
+WORKER_DIR = Path(os.environ.get('WATCHER_WORKER_DIR', '/data/workers'))
+HEALTH_INTERVAL = float(os.environ.get('WATCHER_HEALTH_INTERVAL', '5'))
+# Consecutive failed /ok probes before a running worker is restarted
+HEALTH_FAILURES = int(os.environ.get('WATCHER_HEALTH_FAILURES', '3'))
+# nginx upstream for the API, rewritten at startup (see nginx_upstream()); empty to disable
+NGINX_UPSTREAM = os.environ.get('WATCHER_NGINX_UPSTREAM', '')
+NGINX_HOST = os.environ.get('WATCHER_NGINX_HOST', 'langgraph-api')
+# Supervisor mode: PORT still answers, forwarding to nginx (host:port), which hashes threads
+# to the workers; empty to leave PORT unbound
+SUPERVISOR_FRONT = os.environ.get('WATCHER_SUPERVISOR_FRONT', 'nginx-proxy:8080')
 
 
-def run_server():
-    print('[watcher] starting langgraph:', ' '.join(CMD), flush=True)
-    return subprocess.Popen(CMD)
+def server_cmd(port):
+    # langgraph dev with DEV_STORE / GRAPH_LOADING applied (agent_runtime/devserver.py)
+    return [
+        sys.executable, '-m', 'agent_runtime.devserver',
+        # Behind a TrafficSwitch except in restart mode
+        '--host', '0.0.0.0' if RELOAD_MODE == 'restart' else '127.0.0.1',
+        '--port', str(port),
+        '--config', 'langgraph.json',
+        '--no-reload',
+        '--no-browser',
+    ]
 
 
-def main():
+CMD = server_cmd(PORT)
+
+
+def log(msg):
+    print(f'[watcher] {msg}', flush=True)
+
+
+def run_server(port=PORT, **popen):
+    cmd = server_cmd(port)
+    log(f'starting langgraph: {" ".join(cmd)}')
+    return subprocess.Popen(cmd, **popen)
+
+
+def stop_server(proc, timeout=10):
+    if proc and proc.poll() is None:
+        try:
+            proc.terminate()
+            try:
+                proc.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        except Exception as e:
+            log(f'error terminating: {e}')
+
+
+def configured_graphs():
+    try:
+        return set(json.loads(CONFIG.read_text()).get('graphs', {}))
+    except (OSError, ValueError) as e:
+        log(f'cannot read {CONFIG}: {e}')
+        return set()
+
+
+def _request_json(url, payload=None, timeout=5):
+    data = json.dumps(payload).encode() if payload is not None else None
+    req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return json.loads(resp.read() or b'null')
+
+
+def probe_healthy(port):
+    try:
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}/ok', timeout=2) as resp:
+            return resp.status == 200
+    except (OSError, ValueError, urllib.error.URLError):
+        return False
+
+
+def record_startup(port, healthy_s, ready_s, graphs):
+    """Log time-to-healthy/time-to-ready of a server start and append it to STARTUP_LOG."""
+    ready = f'{ready_s:.2f}s' if ready_s is not None else 'never'
+    log(f'server :{port} healthy after {healthy_s:.2f}s, {graphs} graphs ready after {ready}')
+    if not STARTUP_LOG:
+        return
+    entry = {'time': time.time(), 'port': port, 'healthy_s': round(healthy_s, 3),
+             'ready_s': round(ready_s, 3) if ready_s is not None else None, 'graphs': graphs}
+    try:
+        with open(STARTUP_LOG, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+    except OSError as e:
+        log(f'cannot write {STARTUP_LOG}: {e}')
+
+
+def wait_ready(proc, port, graph_ids, started, deadline):
+    """Poll until every graph is ready; records the startup and returns False if proc exits or deadline passes."""
+    healthy_s = None
+    while True:
+        if healthy_s is None and probe_healthy(port):
+            healthy_s = time.monotonic() - started
+        if healthy_s is not None and probe_ready(port, graph_ids):
+            record_startup(port, healthy_s, time.monotonic() - started, len(graph_ids))
+            return True
+        if proc.poll() is not None or time.monotonic() > deadline:
+            if healthy_s is not None:
+                record_startup(port, healthy_s, None, len(graph_ids))
+            return False
+        time.sleep(0.25)
+
+
+def probe_ready(port, graph_ids):
+    """True once every graph of langgraph.json is registered and its compiled graph can be fetched."""
+    base = f'http://127.0.0.1:{port}'
+    try:
+        assistants = _request_json(f'{base}/assistants/search', {'limit': 1000})
+        by_graph = {a['graph_id']: a['assistant_id'] for a in assistants}
+        if not graph_ids <= by_graph.keys():
+            return False
+        for graph_id in graph_ids:
+            _request_json(f'{base}/assistants/{by_graph[graph_id]}/graph')
+        return True
+    except (OSError, ValueError, urllib.error.URLError):
+        return False
+
+
+def busy_threads(port):
+    """Threads with a run in progress on the server, None if it cannot be asked (treat it as busy)."""
+    try:
+        return len(_request_json(f'http://127.0.0.1:{port}/threads/search', {'status': 'busy', 'limit': 100}))
+    except (OSError, ValueError, urllib.error.URLError):
+        return None
+
+
+def wait_drained(switch, port, proc):
+    """Wait until the server on `port` has no connection open through `switch` and no
+    run in progress (a failed probe counts as busy), has exited, or DRAIN_GRACE passed."""
+    deadline = time.monotonic() + DRAIN_GRACE
+    while proc and proc.poll() is None and time.monotonic() < deadline:
+        if switch.connections(port) == 0 and busy_threads(port) == 0:
+            return
+        time.sleep(1)
+
+
+def is_tracked(path):
+    path = Path(path)
+    return path == CONFIG or (path.parent.parent == AGENTS and path.name in ('agent.py', 'langgraph.json'))
+
+
+def _digest(path):
+    try:
+        return hashlib.sha256(path.read_bytes()).hexdigest()
+    except OSError:
+        return None
+
+
+class ChangeIndex:
+    """Content hashes of tracked files, used to drop events that do not change anything."""
+
+    def __init__(self):
+        self.hashes = {}
+        self.restarts = 0
+        self.events = 0
+        self.suppressed = 0
+
+    def scan(self):
+        paths = [CONFIG, *AGENTS.glob('*/agent.py'), *AGENTS.glob('*/langgraph.json')]
+        self.hashes = {p: _digest(p) for p in paths}
+        self.hashes = {p: h for p, h in self.hashes.items() if h is not None}
+
+    def changed(self, changes):
+        """Update the index from one burst of watchfiles changes and return the paths whose content changed."""
+        changed = []
+        for path in sorted({Path(p) for _, p in changes}):
+            if not is_tracked(path):
+                continue
+            digest = _digest(path)
+            if digest != self.hashes.get(path):
+                changed.append(path)
+                if digest is None:
+                    self.hashes.pop(path, None)
+                else:
+                    self.hashes[path] = digest
+        self.events += len(changes)
+        if changed:
+            self.restarts += 1
+            self.suppressed += len(changes) - 1
+        else:
+            self.suppressed += len(changes)
+        return changed
+
+
+def reload_triggers():
+    """Yield the changed tracked files once per burst of filesystem events."""
+    index = ChangeIndex()
+    index.scan()
+    log(f'tracking {len(index.hashes)} files, coalescing window {COALESCE_MS}ms')
+    for changes in watch(CONFIG, AGENTS, debounce=COALESCE_MAX_MS, step=COALESCE_MS, stop_event=None):
+        changed = index.changed(changes)
+        names = ', '.join(str(p.relative_to(ROOT)) for p in changed)
+        if changed:
+            log(
+                f'{len(changes)} events -> reload #{index.restarts} ({names}); '
+                f'totals: {index.events} events, {index.restarts} reloads, {index.suppressed} suppressed'
+            )
+            yield changed
+        else:
+            log(
+                f'{len(changes)} events suppressed (no tracked content change); '
+                f'totals: {index.events} events, {index.restarts} reloads, {index.suppressed} suppressed'
+            )
+
+
+class TrafficSwitch:
+    """TCP front door on PORT that forwards each new connection to the active backend.
+
+    Connections already open (SSE streams, in-flight runs) stay pinned to the
+    backend they were accepted for, so swapping `active` never cuts them.
+    """
+
+    def __init__(self, port, label='proxy', host='127.0.0.1'):
+        self.port = port
+        self.label = label
+        self.host = host  # of the backends
+        self.active = None
+        self.open = {}
+        self.accepted = 0
+        self.errors = 0
+        self._loop = asyncio.new_event_loop()
+        self._lock = threading.Lock()
+
+    def start(self):
+        ready = threading.Event()
+
+        def _run():
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(asyncio.start_server(self._handle, '0.0.0.0', self.port))
+            ready.set()
+            self._loop.run_forever()
+
+        threading.Thread(target=_run, name=f'traffic-switch-{self.port}', daemon=True).start()
+        ready.wait()
+        log(f'{self.label} listening on :{self.port}')
+
+    def switch(self, port):
+        self.active = port
+
+    def connections(self, port):
+        with self._lock:
+            return self.open.get(port, 0)
+
+    def counters(self):
+        with self._lock:
+            return self.accepted, self.errors
+
+    async def _handle(self, reader, writer):
+        backend = self.active
+        with self._lock:
+            self.accepted += 1
+        try:
+            if backend is None:
+                raise ConnectionRefusedError('no backend ready')
+            up_reader, up_writer = await asyncio.open_connection(self.host, backend)
+        except OSError:
+            with self._lock:
+                self.errors += 1
+            writer.close()
+            return
+        with self._lock:
+            self.open[backend] = self.open.get(backend, 0) + 1
+        try:
+            await asyncio.gather(_pipe(reader, up_writer), _pipe(up_reader, writer))
+        finally:
+            with self._lock:
+                self.open[backend] -= 1
+            for w in (writer, up_writer):
+                w.close()
+
+
+async def _pipe(reader, writer):
+    try:
+        while data := await reader.read(65536):
+            writer.write(data)
+            await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        if writer.can_write_eof():
+            try:
+                writer.write_eof()
+            except OSError:
+                pass
+
+
+class BlueGreen:
+    """Runs backends on BACKEND_PORTS and swaps the TrafficSwitch once a replacement is ready.
+
+    `watch()` starts a replacement when the active backend dies, or when none
+    is active because the first one never got ready and exited.
+    """
+
+    def __init__(self, switch):
+        self.switch = switch
+        self.procs = {}  # port -> Popen
+        self.active_port = None
+        self._reloading = threading.Lock()
+        self._stop = threading.Event()
+
+    def _free_port(self):
+        for port in BACKEND_PORTS:
+            proc = self.procs.get(port)
+            if proc is None or proc.poll() is not None:
+                return port
+        # Every slot is busy draining: reclaim the oldest non-active one
+        port = next(p for p in BACKEND_PORTS if p != self.active_port)
+        log(f'no free backend port, stopping draining server on :{port}')
+        stop_server(self.procs.pop(port))
+        return port
+
+    def reload(self):
+        with self._reloading:
+            return self._reload()
+
+    def _reload(self):
+        started = time.monotonic()
+        accepted0, errors0 = self.switch.counters()
+        graph_ids = configured_graphs()
+        serving = self._serving()
+        port = self._free_port()
+        proc = run_server(port)
+        self.procs[port] = proc
+
+        if not wait_ready(proc, port, graph_ids, started, started + READY_TIMEOUT):
+            reason = f'exit code {proc.returncode}' if proc.poll() is not None else 'readiness timeout'
+            if not serving and proc.poll() is None:
+                # Nothing else to serve PORT: a server that is up but not (yet) ready beats refusing everything
+                log(f'server :{port} not ready ({reason}) and no other server running; switching to it anyway')
+            else:
+                log(f'reload aborted ({reason}); keeping :{self.active_port}')
+                stop_server(proc)
+                self.procs.pop(port, None)
+                return False
+
+        old_port, self.active_port = self.active_port, port
+        old_proc = self.procs.get(old_port) if old_port != port else None
+        self.switch.switch(port)
+        swap_latency = time.monotonic() - started
+        log(f'traffic switched to :{port} after {swap_latency:.2f}s ({len(graph_ids)} graphs)')
+        if old_proc is not None:
+            threading.Thread(
+                target=self._drain, args=(old_port, old_proc, started, accepted0, errors0), daemon=True
+            ).start()
+        return True
+
+    def _serving(self):
+        proc = self.procs.get(self.active_port)
+        return proc is not None and proc.poll() is None
+
+    def watch(self):
+        """Replace the active backend whenever it is gone, retrying less and less often."""
+        failures, retry_at = 0, 0.0
+        while not self._stop.wait(HEALTH_INTERVAL):
+            if self._serving() or time.monotonic() < retry_at:
+                continue
+            proc = self.procs.get(self.active_port)
+            state = f'exited with code {proc.returncode}' if proc is not None else 'never got ready'
+            log(f'active server :{self.active_port} {state}; starting a replacement')
+            if self.reload():
+                failures = 0
+            else:
+                failures += 1
+                retry_at = time.monotonic() + min(2 ** failures, 60)
+
+    def _drain(self, port, proc, started, accepted0, errors0):
+        wait_drained(self.switch, port, proc)
+        remaining = self.switch.connections(port)
+        stop_server(proc)
+        if self.procs.get(port) is proc:
+            del self.procs[port]
+        accepted, errors = self.switch.counters()
+        accepted, errors = accepted - accepted0, errors - errors0
+        rate = errors / accepted if accepted else 0.0
+        log(
+            f'old server :{port} retired after {time.monotonic() - started:.2f}s '
+            f'({remaining} connections cut); swap window: {accepted} connections, '
+            f'{errors} errors ({rate:.1%})'
+        )
+
+    def stop(self):
+        self._stop.set()
+        for proc in list(self.procs.values()):
+            stop_server(proc, timeout=5)
+
+
+def run_timed_server():
+    """run_server() on PORT, with its time to healthy/ready recorded from a background thread."""
+    started = time.monotonic()
     proc = run_server()
+    threading.Thread(
+        target=wait_ready, args=(proc, PORT, configured_graphs(), started, started + READY_TIMEOUT), daemon=True
+    ).start()
+    return proc
+
+
+def nginx_upstream():
+    """The `langgraph_api` upstream block matching RELOAD_MODE, for nginx.conf to include.
+
+    In supervisor mode requests under /threads/<id> are hashed on the thread id,
+    which the workers mint so that it hashes to the worker that created the
+    thread (agent_runtime/devserver.py); other requests are spread by request id.
+
+    Coupling: devserver.worker_for re-implements nginx's non-consistent `hash`
+    (Cache::Memcached-compatible crc32, modulo the number of servers, all of
+    weight 1) on the id as it appears in the URL. Keep this block in step with
+    it: no `consistent`, no weights, same server order (worker i is the i-th
+    server), and the map must capture the bare id. tests/test_devserver.py
+    pins both sides.
+    """
+    if RELOAD_MODE == 'supervisor':
+        servers = [f'{NGINX_HOST}:{WORKER_BASE_PORT + i}' for i in range(WORKERS)]
+        balance = ['    hash $langgraph_thread;']
+    else:
+        servers, balance = [f'{NGINX_HOST}:{PORT}'], []
+    return '\n'.join([
+        f'# Generated by api_watcher.py (WATCHER_RELOAD_MODE={RELOAD_MODE}, {len(servers)} servers)',
+        'map $uri $langgraph_thread {',
+        '    "~^(/api)?/threads/(?<thread>[0-9a-fA-F-]{36})" $thread;',
+        '    default $request_id;',
+        '}',
+        '',
+        'upstream langgraph_api {',
+        *balance,
+        *(f'    server {server};' for server in servers),
+        '}',
+        '',
+    ])
+
+
+def write_nginx_upstream():
+    if not NGINX_UPSTREAM:
+        return
+    path = Path(NGINX_UPSTREAM)
     try:
-        for changes in watch(CONFIG, AGENTS, stop_event=None):
-            print(f'[watcher] detected changes: {changes}', flush=True)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix('.tmp')
+        tmp.write_text(nginx_upstream())
+        tmp.replace(path)
+        log(f'nginx upstream written to {path} (reload nginx if the worker count changed)')
+    except OSError as e:
+        log(f'cannot write {path}: {e}')
+
+
+def worker_dir(index):
+    """Working directory of worker `index`: links to /app, with its own .langgraph_api."""
+    path = WORKER_DIR / str(index)
+    path.mkdir(parents=True, exist_ok=True)
+    for entry in ROOT.iterdir():
+        link = path / entry.name
+        if entry.name != '.langgraph_api' and not link.is_symlink():
+            link.symlink_to(entry)
+    return path
+
+
+class Supervisor:
+    """Runs WORKERS servers and restarts any that exits or stops answering /ok.
+
+    Worker i is reached on WORKER_BASE_PORT + i (the port nginx hashes threads
+    to) through a TrafficSwitch, so a reload can start its replacement on the
+    worker's spare backend port and swap it in once ready, as in blue/green mode.
+    """
+
+    def __init__(self, count):
+        self.count = count
+        self.workers = {}  # index -> {'proc', 'backend', 'started', 'healthy', 'failures', 'crashes', ...}
+        self.switches = {}  # index -> TrafficSwitch on port(index)
+        self.draining = {}  # backend port -> Popen of a replaced server
+        self.restarts = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def port(self, index):
+        return WORKER_BASE_PORT + index
+
+    def _spare_port(self, index, worker):
+        """The backend port of `index` that `worker` does not use, stopping a server still draining on it."""
+        first = WORKER_BACKEND_BASE_PORT + 2 * index
+        port = first + 1 if worker is not None and worker['backend'] == first else first
+        with self._lock:
+            proc = self.draining.pop(port, None)
+        if proc is not None:
+            log(f'worker {index}: stopping draining server on :{port}')
+            stop_server(proc)
+        return port
+
+    def _launch(self, index, backend, crashes=0):
+        env = dict(os.environ, WORKER_INDEX=str(index), WORKER_COUNT=str(self.count))
+        started = time.monotonic()
+        proc = run_server(backend, cwd=worker_dir(index), env=env)
+        return {
+            'proc': proc, 'backend': backend, 'started': started, 'healthy': False, 'failures': 0,
+            'crashes': crashes, 'retry_at': None, 'restarting': False, 'replacing': False,
+        }
+
+    def _spawn(self, index, backend, crashes=0):
+        """Start worker `index` on `backend` and send its traffic there at once. Caller holds the lock."""
+        worker = self.workers[index] = self._launch(index, backend, crashes)
+        self.switches[index].switch(backend)
+        threading.Thread(target=self._time_startup, args=(worker,), daemon=True).start()
+
+    def start(self):
+        for index in range(self.count):
+            self.switches[index] = TrafficSwitch(self.port(index), f'worker {index}')
+            self.switches[index].start()
+            backend = self._spare_port(index, None)
+            with self._lock:
+                self._spawn(index, backend)
+        threading.Thread(target=self._monitor, daemon=True).start()
+
+    def _time_startup(self, worker):
+        wait_ready(worker['proc'], worker['backend'], configured_graphs(), worker['started'],
+                   worker['started'] + READY_TIMEOUT)
+
+    def _restart(self, index, worker, reason):
+        """Replace a dead or unresponsive worker. Called without the lock: stopping it can take seconds."""
+        stop_server(worker['proc'])
+        backend = self._spare_port(index, worker)
+        with self._lock:
+            if self.workers[index] is not worker or worker['replacing']:
+                # A reload is already replacing it; if the replacement fails, the monitor retries
+                worker['restarting'] = False
+                return
+            self.restarts += 1
+            log(f'worker {index} (:{self.port(index)}) {reason}; restart #{self.restarts} on :{backend}')
+            self._spawn(index, backend, worker['crashes'])
+
+    def _monitor(self):
+        while not self._stop.wait(HEALTH_INTERVAL):
+            for index in range(self.count):
+                self._check(index)
+
+    def _check(self, index):
+        now = time.monotonic()
+        reason = None
+        with self._lock:
+            worker = self.workers[index]
+            if worker['replacing'] or worker['restarting']:
+                return
+            proc = worker['proc']
+            if proc.poll() is not None:
+                if worker['retry_at'] is None:
+                    # A worker that dies before ever answering (import error...) is retried less and less often
+                    worker['crashes'] = 0 if worker['healthy'] else worker['crashes'] + 1
+                    worker['retry_at'] = now + (min(2 ** worker['crashes'], 60) if worker['crashes'] else 0)
+                if now < worker['retry_at']:
+                    return
+                reason = f'exited with code {proc.returncode}'
+        if reason is None:
+            healthy = probe_healthy(worker['backend'])
+            with self._lock:
+                if self.workers[index] is not worker or worker['replacing']:
+                    return
+                if healthy:
+                    worker.update(healthy=True, failures=0, crashes=0)
+                    return
+                # Not answering yet while starting up is expected
+                if not worker['healthy'] and now - worker['started'] < READY_TIMEOUT:
+                    return
+                worker['failures'] += 1
+                if worker['failures'] < HEALTH_FAILURES:
+                    return
+                reason = f'failed {worker["failures"]} health checks'
+        with self._lock:
+            worker['restarting'] = True
+        self._restart(index, worker, reason)
+
+    def reload(self):
+        """Rolling reload: each worker's replacement starts on its spare backend port, takes
+        over the worker's port once ready, and the old server drains; one worker at a time."""
+        started = time.monotonic()
+        graph_ids = configured_graphs()
+        for index in range(self.count):
+            with self._lock:
+                old = self.workers[index]
+                old['replacing'] = True
+            backend = self._spare_port(index, old)
+            new = self._launch(index, backend, 0)
+            if not wait_ready(new['proc'], backend, graph_ids, new['started'], new['started'] + READY_TIMEOUT):
+                log(f'worker {index} replacement not ready; keeping :{old["backend"]}')
+                stop_server(new['proc'])
+                with self._lock:
+                    old['replacing'] = False
+                continue
+            with self._lock:
+                self.workers[index] = new
+                self.switches[index].switch(backend)
+                self.draining[old['backend']] = old['proc']
+            log(f'worker {index} (:{self.port(index)}) switched to :{backend}')
+            threading.Thread(target=self._drain, args=(index, old), daemon=True).start()
+        log(f'{self.count} workers reloaded in {time.monotonic() - started:.2f}s')
+
+    def _drain(self, index, worker):
+        port, proc = worker['backend'], worker['proc']
+        wait_drained(self.switches[index], port, proc)
+        with self._lock:
+            if self.draining.get(port) is not proc:
+                return  # reclaimed by a later reload
+            del self.draining[port]
+        remaining = self.switches[index].connections(port)
+        stop_server(proc)
+        log(f'worker {index}: old server :{port} retired ({remaining} connections cut)')
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            procs = [worker['proc'] for worker in self.workers.values()] + list(self.draining.values())
+        for proc in procs:
+            stop_server(proc, timeout=5)
+
+
+def main_supervisor():
+    if SUPERVISOR_FRONT:
+        # Clients of PORT (published as 8123, the UI) reach the workers through nginx's thread hash
+        host, _, port = SUPERVISOR_FRONT.rpartition(':')
+        front = TrafficSwitch(PORT, f'front door to {SUPERVISOR_FRONT}', host)
+        front.switch(int(port))
+        front.start()
+    supervisor = Supervisor(WORKERS)
+    log(f'supervising {WORKERS} workers on :{WORKER_BASE_PORT}-{WORKER_BASE_PORT + WORKERS - 1}')
+    supervisor.start()
+    try:
+        for _ in reload_triggers():
+            supervisor.reload()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        supervisor.stop()
+
+
+def main_restart():
+    proc = run_timed_server()
+    try:
+        for _ in reload_triggers():
             # Restart the server
-            if proc.poll() is None:
-                try:
-                    proc.terminate()
-                    try:
-                        proc.wait(timeout=10)
-                    except subprocess.TimeoutExpired:
-                        proc.kill()
-                except Exception as e:
-                    print(f'[watcher] error terminating: {e}', flush=True)
-            proc = run_server()
+            stop_server(proc)
+            proc = run_timed_server()
     except KeyboardInterrupt:
         pass
     finally:
-        if proc and proc.poll() is None:
-            proc.terminate()
-            try:
-                proc.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                proc.kill()
+        stop_server(proc, timeout=5)
+
+
+def main_bluegreen():
+    switch = TrafficSwitch(PORT)
+    switch.start()
+    servers = BlueGreen(switch)
+    try:
+        servers.reload()
+        threading.Thread(target=servers.watch, name='bluegreen-watch', daemon=True).start()
+        for _ in reload_triggers():
+            servers.reload()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servers.stop()
+
+
+def main():
+    if sys.argv[1:] == ['nginx-upstream']:
+        print(nginx_upstream(), end='')
+        return 0
+    write_nginx_upstream()
+    if RELOAD_MODE == 'restart':
+        return main_restart()
+    if RELOAD_MODE == 'supervisor':
+        return main_supervisor()
+    return main_bluegreen()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,3 @@
+"""
+Offline benchmarks. Run from the repository root, e.g. `python -m bench.async_fanout`.
+"""
@@ -0,0 +1,100 @@
+"""
+Shared helpers for the benchmarks: offline fake-LLM environment, stats and a
+throwaway dev server.
+"""
+import os
+import resource
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+
+def use_fake_llm(latency: str = "0.2", output_tokens: int = 32) -> None:
+    """Route every get_llm() call to FakeChatModel and lift the shared limits.
+
+    Caches and model cascades are off: the fake's random words would never hit
+    a semantic neighbour nor pass a cascade's verifier."""
+    os.environ.update(
+        LLM_PROVIDER="fake",
+        FAKE_LLM_LATENCY=latency,
+        FAKE_LLM_OUTPUT_TOKENS=str(output_tokens),
+        LLM_MAX_CONCURRENCY="0",
+        LLM_RPM="0",
+        LLM_TPM="0",
+        LLM_CACHE="0",
+        SEMANTIC_CACHE="0",
+        LLM_CASCADE="0",
+    )
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def latency_summary(latencies: list[float]) -> dict:
+    return {
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+    }
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process (Linux reports KiB)."""
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def user_input(i: int, text: str = "topic") -> dict:
+    return {"messages": [{"role": "user", "content": f"{text} {i}"}]}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextmanager
+def dev_server(env: dict, timeout: float = 180, wait_healthy: bool = True) -> Iterator[tuple[int, subprocess.Popen, float]]:
+    """Run agent_runtime.devserver on a free port, from a temporary working directory
+    (links to the repo, fresh .langgraph_api); yields (port, process, start time)."""
+    from api_watcher import probe_healthy
+
+    from agent_runtime.graphs import ROOT
+
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=str(ROOT), LANGSMITH_TRACING="false", **env)
+    cmd = [sys.executable, "-m", "agent_runtime.devserver", "--port", str(port), "--config", "langgraph.json",
+           "--no-reload", "--no-browser"]
+    with tempfile.TemporaryDirectory() as workdir:
+        # The server resolves some paths from its working directory and keeps its state there
+        for entry in ROOT.iterdir():
+            if entry.name != ".langgraph_api":
+                os.symlink(entry, os.path.join(workdir, entry.name))
+        started = time.monotonic()
+        proc = subprocess.Popen(cmd, cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                start_new_session=True)
+        try:
+            while wait_healthy and not probe_healthy(port):
+                if proc.poll() is not None or time.monotonic() > started + timeout:
+                    raise RuntimeError(f"server not healthy (exit code {proc.poll()})")
+                time.sleep(0.05)
+            yield port, proc, started
+        finally:
+            os.killpg(proc.pid, signal.SIGTERM)
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                os.killpg(proc.pid, signal.SIGKILL)
@@ -0,0 +1,124 @@
+"""
+Load test of the admission layer (agent_runtime/admission.py) against a local
+dev server with the fake LLM.
+
+    python -m bench.admission [--mix tool_agent:3,orchestrator_worker:1] [--rate 20] [--duration 15]
+                              [--limits '{"orchestrator_worker": {"concurrency": 2, "queue": 4}}']
+                              [--max-runs 8] [--max-wait 5] [--latency 0.2] [--compare]
+
+Requests arrive open-loop (Poisson, `--rate` per second, graphs drawn from
+`--mix` by weight) on POST /runs/wait for `--duration` seconds, so a server
+that falls behind builds a queue instead of slowing the generator down. Per
+graph: requests sent, completed, shed (429) and failed, latency of the
+completed ones, and the median Retry-After of the shed ones; then the
+server's own admission counters and queue waits (/runtime/metrics.json).
+`--compare` runs the same load with ADMISSION=0 first.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import defaultdict
+
+from ._common import dev_server, latency_summary, percentile, use_fake_llm, user_input
+
+
+def parse_mix(spec: str) -> dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        graph, _, weight = part.partition(":")
+        mix[graph.strip()] = float(weight or 1)
+    return mix
+
+
+async def generate(port: int, mix: dict[str, float], rate: float, duration: float, seed: int = 0) -> dict:
+    import httpx
+
+    rng = random.Random(seed)
+    graphs, weights = list(mix), list(mix.values())
+    rows = defaultdict(lambda: {"sent": 0, "ok": 0, "shed": 0, "errors": 0, "latency": [], "retry_after": []})
+
+    async def one(client, graph: str, i: int):
+        row = rows[graph]
+        row["sent"] += 1
+        started = time.monotonic()
+        try:
+            resp = await client.post("/runs/wait", json={"assistant_id": graph, "input": user_input(i)})
+        except httpx.HTTPError:
+            row["errors"] += 1
+            return
+        if resp.status_code == 429:
+            row["shed"] += 1
+            row["retry_after"].append(float(resp.headers.get("retry-after", 0)))
+        elif resp.status_code == 200:
+            row["ok"] += 1
+            row["latency"].append(time.monotonic() - started)
+        else:
+            row["errors"] += 1
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=100)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=300, limits=limits) as client:
+        tasks, i = [], 0
+        end = time.monotonic() + duration
+        while time.monotonic() < end:
+            tasks.append(asyncio.ensure_future(one(client, rng.choices(graphs, weights)[0], i)))
+            i += 1
+            await asyncio.sleep(rng.expovariate(rate))
+        await asyncio.gather(*tasks)
+        admission = (await client.get("/runtime/metrics.json")).json()["admission"]
+    return {"graphs": dict(rows), "admission": admission}
+
+
+def run(args, enabled: bool) -> dict:
+    env = {
+        "ADMISSION": "1" if enabled else "0",
+        "ADMISSION_MAX_RUNS": str(args.max_runs),
+        "ADMISSION_MAX_WAIT": str(args.max_wait),
+        "ADMISSION_LIMITS": args.limits,
+        "GRAPH_LOADING": "eager",
+    }
+    with dev_server(env) as (port, _, _):
+        return asyncio.run(generate(port, parse_mix(args.mix), args.rate, args.duration, args.seed))
+
+
+def report(result: dict, enabled: bool) -> None:
+    print(f"\nadmission {'on' if enabled else 'off'}")
+    print(f"{'graph':>22}{'sent':>7}{'ok':>7}{'shed':>7}{'errors':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'retry s':>9}")
+    for graph, row in sorted(result["graphs"].items()):
+        lat = latency_summary(row["latency"])
+        retry = percentile(row["retry_after"], 50)
+        print(f"{graph:>22}{row['sent']:>7}{row['ok']:>7}{row['shed']:>7}{row['errors']:>7}"
+              f"{lat['p50_ms']:>10}{lat['p95_ms']:>10}{lat['p99_ms']:>10}{retry:>9}")
+    if not enabled:
+        return
+    print(f"{'graph':>22}{'admitted':>10}{'shed':>7}{'wait p50':>10}{'wait p95':>10}{'expected s':>12}")
+    for graph, s in result["admission"]["graphs"].items():
+        shed = sum(n for outcome, n in s["outcomes"].items() if outcome != "admitted")
+        wait = s["wait_seconds"]
+        print(f"{graph:>22}{s['outcomes']['admitted']:>10}{shed:>7}{wait['p50'] or 0:>10}{wait['p95'] or 0:>10}"
+              f"{s['expected_seconds']:>12}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mix", default="tool_agent:3,orchestrator_worker:1")
+    parser.add_argument("--rate", type=float, default=20)
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--limits", default=json.dumps({"orchestrator_worker": {"concurrency": 2, "queue": 4}}))
+    parser.add_argument("--max-runs", type=int, default=8)
+    parser.add_argument("--max-wait", type=float, default=5)
+    parser.add_argument("--latency", default="0.2")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--compare", action="store_true")
+    args = parser.parse_args(argv)
+
+    use_fake_llm(args.latency)
+    for enabled in ((False, True) if args.compare else (True,)):
+        report(run(args, enabled), enabled)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+Sync vs async execution of the fan-out graphs against a fixed-latency fake LLM.
+
+Each (graph, mode, concurrency) case runs in its own subprocess so peak RSS
+and thread counts are not shared between cases.
+
+    python -m bench.async_fanout [--graphs parallel_sectioning,...] [--concurrency 10,100,1000] [--latency 0.2]
+"""
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ._common import latency_summary, peak_rss_mb, use_fake_llm, user_input
+
+GRAPHS = ["parallel_sectioning", "parallel_voting", "orchestrator_worker"]
+
+
+def _timed_sync(app, i):
+    started = time.perf_counter()
+    app.invoke(user_input(i))
+    return time.perf_counter() - started
+
+
+async def _timed_async(app, i):
+    started = time.perf_counter()
+    await app.ainvoke(user_input(i))
+    return time.perf_counter() - started
+
+
+def run_case(graph: str, mode: str, concurrency: int, latency: str) -> dict:
+    use_fake_llm(latency)
+    from agent_runtime import load_graph
+
+    app = load_graph(graph)
+    peak_threads = threading.active_count()
+    stop = threading.Event()
+
+    def sample():
+        nonlocal peak_threads
+        while not stop.wait(0.05):
+            peak_threads = max(peak_threads, threading.active_count())
+
+    threading.Thread(target=sample, daemon=True).start()
+    started = time.perf_counter()
+    if mode == "sync":
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(lambda i: _timed_sync(app, i), range(concurrency)))
+    else:
+        async def main():
+            return await asyncio.gather(*(_timed_async(app, i) for i in range(concurrency)))
+
+        latencies = asyncio.run(main())
+    elapsed = time.perf_counter() - started
+    stop.set()
+    return {
+        "graph": graph,
+        "mode": mode,
+        "concurrency": concurrency,
+        "runs_per_s": round(concurrency / elapsed, 1),
+        "wall_s": round(elapsed, 3),
+        **latency_summary(latencies),
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_threads": peak_threads,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--graphs", default=",".join(GRAPHS))
+    parser.add_argument("--concurrency", default="10,100,1000")
+    parser.add_argument("--latency", default="0.2", help="fake LLM latency spec (see agent_runtime.fake)")
+    parser.add_argument("--case", nargs=3, metavar=("GRAPH", "MODE", "N"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.case:
+        graph, mode, n = args.case
+        print(json.dumps(run_case(graph, mode, int(n), args.latency)))
+        return 0
+
+    header = f"{'graph':<22}{'mode':<7}{'conc':>6}{'runs/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'rss MB':>9}{'threads':>9}"
+    print(header)
+    print("-" * len(header))
+    for graph in args.graphs.split(","):
+        for n in args.concurrency.split(","):
+            for mode in ("sync", "async"):
+                out = subprocess.run(
+                    [sys.executable, "-m", "bench.async_fanout", "--latency", args.latency, "--case", graph, mode, n],
+                    capture_output=True, text=True, check=True,
+                )
+                r = json.loads(out.stdout.strip().splitlines()[-1])
+                print(
+                    f"{graph:<22}{mode:<7}{r['concurrency']:>6}{r['runs_per_s']:>10}{r['p50_ms']:>10}"
+                    f"{r['p99_ms']:>10}{r['peak_rss_mb']:>9}{r['peak_threads']:>9}",
+                    flush=True,
+                )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
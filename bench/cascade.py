@@ -0,0 +1,95 @@
+"""
+Model cascade on routing's LLM router: small model first, escalation on a bad label,
+vs always calling the large model.
+
+    python -m bench.cascade [--small 0.15] [--large 0.6] [--accuracy 0.85] [--repeat 5]
+
+Both rungs are fake models answering the hand-made labels of
+bench/data/routing_heldout.jsonl: the large one always, the small one with
+probability `--accuracy` (otherwise a sentence the `one_of` verifier rejects),
+with latencies `--small` and `--large` (fake latency specs). Per setup: decision
+latency, agreement with the labels, escalation rate, and the latency saved as
+recorded by metrics.py against the large model's mean latency.
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+from ._common import latency_summary, use_fake_llm
+
+HELDOUT = Path(__file__).resolve().parent / "data" / "routing_heldout.jsonl"
+
+
+def run(routing, examples: list[tuple[str, str]], repeat: int) -> dict:
+    latencies, agree = [], 0
+    for _ in range(repeat):
+        for text, label in examples:
+            started = time.perf_counter()
+            agree += routing.classify_llm(text) == label
+            latencies.append(time.perf_counter() - started)
+    return {**latency_summary(latencies), "agreement": round(agree / len(latencies), 3)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--data", default=str(HELDOUT))
+    parser.add_argument("--small", default="0.15")
+    parser.add_argument("--large", default="0.6")
+    parser.add_argument("--accuracy", type=float, default=0.85)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    use_fake_llm()
+    os.environ["LLM_CASCADE"] = "1"
+    from agent_runtime import FakeChatModel, metrics
+    from agent_runtime.cascade import Cascade
+    from agent_runtime.classifier import load_examples
+    from agent_runtime.graphs import load_module
+
+    routing = load_module("routing")
+    examples = load_examples(args.data)
+    labels = dict(examples)
+    request = re.compile(r"Request: (.*)\nOnly output")
+    rng = random.Random(0)
+
+    def small(prompt: str) -> str:
+        label = labels.get(request.search(prompt).group(1), "tech")
+        return label if rng.random() < args.accuracy else f"This looks like a {label} question."
+
+    def large(prompt: str) -> str:
+        return labels.get(request.search(prompt).group(1), "tech")
+
+    cascade = routing.classifier_llm
+    bottom, top = cascade.rungs[0], cascade.rungs[-1]
+    bottom.client = FakeChatModel(model_name=bottom.model, latency=args.small, responder=small)
+    top.client = FakeChatModel(model_name=top.model, latency=args.large, responder=large)
+    setups = {
+        f"{top.model} only": Cascade("bench", "top_only", [top], cascade.verifier),
+        f"{bottom.model} only": Cascade("bench", "bottom_only", [bottom], cascade.verifier),
+        "cascade": cascade,
+    }
+
+    print(f"{len(examples)} held-out requests x {args.repeat}, small model accuracy {args.accuracy:.0%}")
+    header = f"{'router':<22}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}{'agree':>8}{'escalated':>11}{'saved s':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, setup in setups.items():
+        routing.classifier_llm = setup
+        r = run(routing, examples, args.repeat)
+        stats = next(c for c in metrics.snapshot()["cascades"] if c["node"] == setup.node)
+        saved = stats["saved_seconds"]
+        print(
+            f"{name:<22}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['mean_ms']:>10}{r['agreement']:>8.0%}"
+            f"{stats['escalation_rate']:>11.0%}{'-' if saved is None else saved:>10}",
+            flush=True,
+        )
+    routing.classifier_llm = cascade
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
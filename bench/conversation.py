@@ -0,0 +1,97 @@
+"""
+Long threads: checkpoint size, prompt size and per-turn latency over 1,000+ turns,
+unbounded add_messages vs the bounded_messages reducer.
+
+    python -m bench.conversation [--turns 1000] [--report 1,10,100,1000]
+
+Runs a chat graph shaped like agents/example (one node sending the thread
+history to the model) on an in-memory checkpointer, one thread, one user
+message per turn. "checkpoint KB" is the serialized thread state after the
+turn, "turn ms" the mean latency of the last turns before each report point.
+"""
+import argparse
+import sys
+import time
+from typing import Annotated, Sequence, TypedDict
+
+from ._common import latency_summary, use_fake_llm
+
+WINDOW = 10
+
+
+def build(reducer):
+    from langchain_core.messages import AnyMessage
+    from langgraph.checkpoint.memory import InMemorySaver
+    from langgraph.graph import END, START, StateGraph
+
+    from agent_runtime import get_llm
+    from agent_runtime.state import last_user_text
+
+    llm = get_llm("gpt-3.5-turbo", graph="bench")
+
+    class State(TypedDict):
+        messages: Annotated[Sequence[AnyMessage], reducer]
+
+    def agent_node(state: State):
+        last_user_text(state)
+        return {"messages": [llm.invoke(state["messages"])]}
+
+    builder = StateGraph(State)
+    builder.add_node("agent", agent_node)
+    builder.add_edge(START, "agent")
+    builder.add_edge("agent", END)
+    return builder.compile(checkpointer=InMemorySaver())
+
+
+def run(app, turns: int, report: set[int]) -> list[dict]:
+    from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+    from agent_runtime.llm import estimate_tokens
+
+    serde = JsonPlusSerializer()
+    config = {"configurable": {"thread_id": "bench"}}
+    rows, latencies = [], []
+    for turn in range(1, turns + 1):
+        text = f"turn {turn}: tell me something about topic {turn % 37} " + "with some detail " * 8
+        started = time.perf_counter()
+        app.invoke({"messages": [{"role": "user", "content": text}]}, config)
+        latencies.append(time.perf_counter() - started)
+        if turn in report:
+            messages = app.get_state(config).values["messages"]
+            rows.append({
+                "turn": turn,
+                "turn_ms": latency_summary(latencies[-WINDOW:])["mean_ms"],
+                "checkpoint_kb": round(len(serde.dumps_typed(messages)[1]) / 1024, 1),
+                "messages": len(messages),
+                "prompt_tokens": estimate_tokens(messages),
+            })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--turns", type=int, default=1000)
+    parser.add_argument("--report", default="1,10,100,1000")
+    parser.add_argument("--latency", default="0", help="fake LLM latency spec (see agent_runtime.fake)")
+    args = parser.parse_args(argv)
+
+    use_fake_llm(args.latency, output_tokens=64)
+    from langgraph.graph.message import add_messages
+
+    from agent_runtime.state import bounded_messages
+
+    report = {int(t) for t in args.report.split(",")} | {args.turns}
+    header = f"{'reducer':<18}{'turn':>7}{'turn ms':>10}{'checkpoint KB':>15}{'messages':>10}{'prompt tok':>12}"
+    print(header)
+    print("-" * len(header))
+    for name, reducer in (("add_messages", add_messages), ("bounded_messages", bounded_messages)):
+        for r in run(build(reducer), args.turns, report):
+            print(
+                f"{name:<18}{r['turn']:>7}{r['turn_ms']:>10}{r['checkpoint_kb']:>15}{r['messages']:>10}{r['prompt_tokens']:>12}",
+                flush=True,
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
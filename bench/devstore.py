@@ -0,0 +1,114 @@
+"""
+Dev server persistence: cost of one flush and of a restart as threads accumulate,
+stock pickle files vs agent_runtime.devstore delta logs.
+
+    python -m bench.devstore [--threads 100,1000,5000] [--turns 2]
+
+Builds the checkpointer the dev server uses (an InMemorySaver over
+PersistentDicts in a temporary .langgraph_api), runs `--turns` turns on each
+thread of a small chat graph, then measures after one more turn on a single
+thread: "flush" (what every 10 s sync costs: full pickle vs appended records)
+and "load" (startup: unpickle vs log replay). Each turn adds a checkpoint, its
+writes and its channel blobs.
+"""
+import argparse
+import os
+import pickle
+import sys
+import tempfile
+import time
+from typing import Annotated, Sequence, TypedDict
+
+
+def build(directory: str):
+    from langchain_core.messages import AIMessage, AnyMessage
+    from langgraph.checkpoint.memory import InMemorySaver, PersistentDict
+    from langgraph.graph import END, START, StateGraph
+
+    from agent_runtime.state import bounded_messages
+
+    dicts = []
+
+    def factory(*args):
+        d = PersistentDict(*args, filename=os.path.join(directory, f".langgraph_checkpoint.{len(dicts) + 1}.pckl"))
+        dicts.append(d)
+        return d
+
+    class State(TypedDict):
+        messages: Annotated[Sequence[AnyMessage], bounded_messages]
+
+    def agent_node(state: State):
+        return {"messages": [AIMessage(content="answer " * 40)]}
+
+    builder = StateGraph(State)
+    builder.add_node("agent", agent_node)
+    builder.add_edge(START, "agent")
+    builder.add_edge("agent", END)
+    return builder.compile(checkpointer=InMemorySaver(factory=factory)), dicts
+
+
+def turn(app, thread: int, i: int) -> None:
+    config = {"configurable": {"thread_id": f"thread-{thread}"}}
+    app.invoke({"messages": [{"role": "user", "content": f"question {i} " * 10}]}, config)
+
+
+def measure(threads: int, turns: int) -> dict:
+    from agent_runtime import devstore
+    from langgraph.checkpoint.memory import PersistentDict
+
+    with tempfile.TemporaryDirectory() as directory:
+        app, dicts = build(directory)
+        for t in range(threads):
+            for i in range(turns):
+                turn(app, t, i)
+        for d in dicts:
+            d.sync()  # initial snapshot, as on the first flush after migration
+        turn(app, 0, turns)
+
+        row = {"threads": threads}
+        started, size = time.perf_counter(), 0
+        for d in dicts:
+            with open(d.filename + ".stock", "wb") as f:
+                pickle.dump(dict(d), f, 2)  # what PersistentDict.sync writes
+            size += os.path.getsize(d.filename + ".stock")
+        row["pickle_flush_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        row["pickle_flush_kb"] = round(size / 1024, 1)
+        started = time.perf_counter()
+        for d in dicts:
+            with open(d.filename + ".stock", "rb") as f:
+                pickle.load(f)
+        row["pickle_load_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+        before = sum(os.path.getsize(d._delta_log.path) for d in dicts)
+        started = time.perf_counter()
+        for d in dicts:
+            d.sync()
+        row["delta_flush_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        row["delta_flush_kb"] = round((sum(os.path.getsize(d._delta_log.path) for d in dicts) - before) / 1024, 1)
+        devstore._primaries.clear()
+        started = time.perf_counter()
+        for d in dicts:
+            PersistentDict(*((d.default_factory,) if d.default_factory else ()), filename=d.filename).load()
+        row["delta_load_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return row
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--threads", default="100,1000,5000")
+    parser.add_argument("--turns", type=int, default=2)
+    args = parser.parse_args(argv)
+
+    from agent_runtime import devstore
+
+    devstore.install()
+    columns = ("threads", "pickle_flush_ms", "pickle_flush_kb", "delta_flush_ms", "delta_flush_kb", "pickle_load_ms", "delta_load_ms")
+    print("".join(f"{c:>16}" for c in columns))
+    for threads in (int(t) for t in args.threads.split(",")):
+        row = measure(threads, args.turns)
+        print("".join(f"{row[c]:>16}" for c in columns), flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,310 @@
+"""
+In-process benchmark of every graph in langgraph.json against a deterministic fake LLM.
+
+    python -m bench.graphs run [--graphs routing,...] [--concurrency 1,10,50] [--runs 100]
+                               [--latency 0.05] [--output-tokens 32] [--save bench/baseline.json]
+    python -m bench.graphs compare [--baseline bench/baseline.json] [--tolerance 0.2]
+
+Every get_llm() model becomes a FakeChatModel (LLM_PROVIDER=fake, fixed seed);
+a module-level `llm` built some other way is replaced too. Each graph runs in
+its own subprocess so peak RSS is its own. Per graph and concurrency level:
+runs/s and p50/p95/p99 latency; then a few sequential profiled runs give, per
+node, the wall time, the time spent waiting on the LLM and the difference
+(`overhead_ms`: framework + the node's own code).
+
+`compare` reruns the suite with the baseline's settings and flags every metric
+that got worse by more than `--tolerance` (and by more than a small absolute
+amount, to ignore millisecond-level noise); the exit status is 1 on regressions.
+Baselines are machine-specific: record one on the machine that runs `compare`.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from ._common import latency_summary, peak_rss_mb, use_fake_llm, user_input
+
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+PROFILE_RUNS = 50
+# Levels that finish faster than this are rerun with more runs, for stable numbers
+MIN_SECONDS = 2.0
+# Below these absolute differences a change is noise, whatever the ratio
+NOISE_FLOOR = {"ms": 1.0, "runs_per_s": 1.0, "peak_rss_mb": 5.0}
+
+
+def _interval_union(intervals: list[tuple[float, float]]) -> float:
+    total, end = 0.0, float("-inf")
+    for start, stop in sorted(intervals):
+        if stop > end:
+            total += stop - max(start, end)
+            end = stop
+    return total
+
+
+def _llm_timer():
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class LLMTimer(BaseCallbackHandler):
+        """Records (node, checkpoint ns, start, end) of every chat model call."""
+
+        def __init__(self):
+            self.open = {}
+            self.calls = []
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+            metadata = metadata or {}
+            task = metadata.get("langgraph_checkpoint_ns", "")
+            self.open[run_id] = (metadata.get("langgraph_node"), task, time.perf_counter())
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            if run_id in self.open:
+                node, task, started = self.open.pop(run_id)
+                self.calls.append((node, task, started, time.perf_counter()))
+
+        on_llm_error = on_llm_end
+
+    return LLMTimer()
+
+
+async def profile_nodes(app, runs: int) -> tuple[dict, float]:
+    """Per-node wall / LLM / overhead ms (medians per call) from sequential debug-streamed
+    runs, and the median overhead per run (wall time minus time waiting on the LLM)."""
+    samples, run_overhead = {}, []  # node -> [(wall, llm)]
+    for i in range(runs):
+        timer = _llm_timer()
+        started_at, walls = {}, []
+        run_started = time.perf_counter()
+        async for event in app.astream(user_input(i), {"callbacks": [timer]}, stream_mode="debug"):
+            payload = event["payload"]
+            if event["type"] == "task":
+                started_at[payload["id"]] = time.perf_counter()
+            elif event["type"] == "task_result" and payload["id"] in started_at:
+                walls.append((payload["name"], payload["id"], time.perf_counter() - started_at[payload["id"]]))
+        run_wall = time.perf_counter() - run_started
+        by_task = {}
+        for _, task, start, end in timer.calls:
+            by_task.setdefault(task.rpartition(":")[2], []).append((start, end))
+        for name, task_id, wall in walls:
+            samples.setdefault(name, []).append((wall, _interval_union(by_task.get(task_id, []))))
+        run_overhead.append(run_wall - _interval_union([(s, e) for _, _, s, e in timer.calls]))
+    nodes = {}
+    for name, pairs in samples.items():
+        nodes[name] = {
+            "calls_per_run": round(len(pairs) / runs, 2),
+            "wall_ms": round(statistics.median(w for w, _ in pairs) * 1000, 3),
+            "llm_ms": round(statistics.median(l for _, l in pairs) * 1000, 3),
+            "overhead_ms": round(statistics.median(max(0.0, w - l) for w, l in pairs) * 1000, 3),
+        }
+    return nodes, round(statistics.median(run_overhead) * 1000, 3)
+
+
+async def measure_level(app, concurrency: int, runs: int) -> dict:
+    result = await _measure(app, concurrency, runs)
+    if result["wall_s"] < MIN_SECONDS:
+        runs = min(50_000, int(runs * MIN_SECONDS / max(result["wall_s"], 1e-3)) + 1)
+        result = await _measure(app, concurrency, runs)
+    return result
+
+
+async def _measure(app, concurrency: int, runs: int) -> dict:
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with gate:
+            started = time.perf_counter()
+            await app.ainvoke(user_input(i))
+            return time.perf_counter() - started
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(one(i) for i in range(runs)))
+    elapsed = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "runs": runs,
+        "wall_s": round(elapsed, 3),
+        "runs_per_s": round(runs / elapsed, 1),
+        **latency_summary(latencies),
+    }
+
+
+def run_case(graph: str, levels: list[int], runs: int, latency: str, output_tokens: int) -> dict:
+    use_fake_llm(latency, output_tokens)
+    os.environ["FAKE_LLM_SEED"] = "0"
+    from agent_runtime import FakeChatModel, ManagedChatModel
+    from agent_runtime.graphs import graph_specs, load_module
+
+    module = load_module(graph)
+    if hasattr(module, "llm") and not isinstance(module.llm, ManagedChatModel):
+        module.llm = FakeChatModel.from_env("fake")
+    app = getattr(module, graph_specs()[graph][1])
+
+    async def main():
+        # Warm-up: imports, lazy clients, caches of compiled expressions / prompts
+        for i in range(5):
+            await app.ainvoke(user_input(i))
+        results = [await measure_level(app, c, max(runs, c)) for c in levels]
+        nodes, overhead = await profile_nodes(app, PROFILE_RUNS)
+        return results, nodes, overhead
+
+    results, nodes, overhead = asyncio.run(main())
+    return {"levels": results, "nodes": nodes, "overhead_ms_per_run": overhead, "peak_rss_mb": peak_rss_mb()}
+
+
+def run_suite(graphs: list[str], levels: list[int], runs: int, latency: str, output_tokens: int) -> dict:
+    suite = {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "concurrency": levels,
+            "runs": runs,
+            "latency": latency,
+            "output_tokens": output_tokens,
+        },
+        "graphs": {},
+    }
+    for graph in graphs:
+        out = subprocess.run(
+            [
+                sys.executable, "-m", "bench.graphs", "case", graph,
+                "--concurrency", ",".join(map(str, levels)), "--runs", str(runs),
+                "--latency", latency, "--output-tokens", str(output_tokens),
+            ],
+            capture_output=True, text=True,
+        )
+        if out.returncode != 0:
+            print(f"{graph}: failed\n{out.stderr.strip()[-2000:]}", file=sys.stderr)
+            suite["graphs"][graph] = {"error": out.stderr.strip().splitlines()[-1] if out.stderr.strip() else "failed"}
+            continue
+        suite["graphs"][graph] = result = json.loads(out.stdout.strip().splitlines()[-1])
+        print_graph(graph, result)
+    return suite
+
+
+def print_graph(graph: str, result: dict) -> None:
+    print(f"\n{graph}  (peak RSS {result['peak_rss_mb']} MB, overhead {result['overhead_ms_per_run']} ms/run)")
+    print(f"  {'conc':>6}{'runs/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for level in result["levels"]:
+        print(
+            f"  {level['concurrency']:>6}{level['runs_per_s']:>10}{level['p50_ms']:>10}"
+            f"{level['p95_ms']:>10}{level['p99_ms']:>10}"
+        )
+    print(f"  {'node':<24}{'calls':>7}{'wall ms':>10}{'llm ms':>10}{'overhead':>10}")
+    for name, node in result["nodes"].items():
+        print(
+            f"  {name:<24}{node['calls_per_run']:>7}{node['wall_ms']:>10}{node['llm_ms']:>10}"
+            f"{node['overhead_ms']:>10}"
+        )
+    sys.stdout.flush()
+
+
+def _metrics(result: dict) -> dict[str, tuple[float, bool]]:
+    """Flat metric name -> (value, higher_is_worse)."""
+    metrics = {"peak_rss_mb": (result["peak_rss_mb"], True), "overhead_ms_per_run": (result["overhead_ms_per_run"], True)}
+    for level in result["levels"]:
+        c = level["concurrency"]
+        metrics[f"c{c}.runs_per_s"] = (level["runs_per_s"], False)
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            metrics[f"c{c}.{key}"] = (level[key], True)
+    for name, node in result["nodes"].items():
+        metrics[f"node.{name}.overhead_ms"] = (node["overhead_ms"], True)
+    return metrics
+
+
+def _floor(metric: str) -> float:
+    if metric.endswith("runs_per_s"):
+        return NOISE_FLOOR["runs_per_s"]
+    if metric.endswith("rss_mb"):
+        return NOISE_FLOOR["peak_rss_mb"]
+    return NOISE_FLOOR["ms"]
+
+
+def compare(baseline: dict, current: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for graph, old in baseline["graphs"].items():
+        new = current["graphs"].get(graph)
+        if new is None:
+            continue
+        if "error" in new and "error" not in old:
+            regressions.append(f"{graph}: now fails ({new['error']})")
+            continue
+        if "error" in new or "error" in old:
+            continue
+        new_metrics = _metrics(new)
+        for metric, (before, higher_is_worse) in _metrics(old).items():
+            if metric not in new_metrics:
+                continue
+            after = new_metrics[metric][0]
+            worse = after - before if higher_is_worse else before - after
+            if worse > _floor(metric) and worse > tolerance * abs(before):
+                change = (after - before) / before if before else float("inf")
+                regressions.append(f"{graph}: {metric} {before} -> {after} ({change:+.0%})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name in ("run", "compare", "case"):
+        p = sub.add_parser(name)
+        p.add_argument("--concurrency")
+        p.add_argument("--runs", type=int)
+        p.add_argument("--latency", help="fake LLM latency spec (see agent_runtime.fake)")
+        p.add_argument("--output-tokens", type=int)
+        if name == "case":
+            p.add_argument("graph")
+        else:
+            p.add_argument("--graphs", help="comma-separated graph ids (default: all of langgraph.json)")
+    sub.choices["run"].add_argument("--save", type=Path, nargs="?", const=BASELINE, help=f"write results (default {BASELINE})")
+    sub.choices["compare"].add_argument("--baseline", type=Path, default=BASELINE)
+    sub.choices["compare"].add_argument("--tolerance", type=float, default=0.2)
+    sub.choices["compare"].add_argument("--save", type=Path, help="also write the new results")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.command == "compare":
+        baseline = json.loads(args.baseline.read_text())
+    defaults = baseline["meta"] if baseline else {"concurrency": [1, 10, 50], "runs": 100, "latency": "0.05", "output_tokens": 32}
+    levels = [int(c) for c in args.concurrency.split(",")] if args.concurrency else defaults["concurrency"]
+    runs = args.runs or defaults["runs"]
+    latency = args.latency or defaults["latency"]
+    output_tokens = args.output_tokens or defaults["output_tokens"]
+
+    if args.command == "case":
+        print(json.dumps(run_case(args.graph, levels, runs, latency, output_tokens)))
+        return 0
+
+    from agent_runtime.graphs import graph_specs
+
+    if args.graphs:
+        graphs = args.graphs.split(",")
+    elif baseline:
+        graphs = list(baseline["graphs"])
+    else:
+        graphs = list(graph_specs())
+    suite = run_suite(graphs, levels, runs, latency, output_tokens)
+    if args.save:
+        args.save.write_text(json.dumps(suite, indent=2) + "\n")
+        print(f"\nresults written to {args.save}")
+    if baseline is None:
+        return 0
+
+    regressions = compare(baseline, suite, args.tolerance)
+    print(f"\ncompared with {args.baseline} (created {baseline['meta']['created']}, tolerance {args.tolerance:.0%})")
+    for line in regressions:
+        print(f"  REGRESSION {line}")
+    if not regressions:
+        print("  no regressions")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,405 @@
+"""
+HTTP/SSE load generator for the run streaming endpoints, against a local dev server or a deployed stack.
+
+    python -m bench.load run [--url http://localhost:8080] [--mode open|closed]
+                             [--rate 10] [--users 20] [--think 0] [--duration 30] [--requests N]
+                             [--mix routing:2,tool_agent:1] [--replay bench/data/traffic.jsonl] [--speed 1]
+                             [--endpoint thread|stateless] [--stream-mode values,custom]
+                             [--latency 0.2] [--save bench/load.json]
+    python -m bench.load diff OLD.json NEW.json [--tolerance 0.2]
+
+Without `--url` a dev server is started on a free port with the fake LLM
+(`--latency`, no network); with it, the requests go to that server, e.g.
+nginx (:8080) or langgraph-api (:8123) of docker-compose.yml.
+
+Each request is one streamed run: POST /threads then
+/threads/{thread_id}/runs/stream (`--endpoint thread`, the default) or
+POST /runs/stream (`stateless`), read to the end of its SSE stream.
+
+- open loop (`--mode open`): runs start at Poisson arrivals of `--rate` per
+  second, or at the `at` offsets of the replayed file (divided by `--speed`),
+  whether or not earlier ones have finished, so a slow server piles up open
+  streams instead of slowing the generator down,
+- closed loop (`--mode closed`): `--users` clients each start a run, read it
+  to the end, wait `--think` seconds (exponential) and start the next one.
+
+Sending stops after `--duration` seconds or `--requests` runs, then the
+runs in flight are read to the end. Traffic is synthetic (`--mix`: graphs
+by weight, all graphs of langgraph.json by default) or replayed from a
+JSONL file, one run per line:
+
+    {"graph": "routing", "text": "How do I reset my password?", "at": 0.5, "thread": "alice"}
+
+`graph` (or `assistant_id`), then `input` (run input) or `text` (one user
+message), and optionally `config`, `at` (seconds from the start) and
+`thread`: lines with the same `thread` label are turns of one thread, sent
+in order. Without `at`, lines are sent at the rate of the arrival mode and
+the file is cycled through.
+
+Per graph: runs sent, completed, shed (429) and failed (by kind), time to
+first event (the first SSE event after the run's `metadata`), full-run
+latency and SSE events per run, plus the peak of concurrently open streams.
+`--save` writes the report as JSON (stable key order); `diff` compares two
+reports and exits with 1 when a metric got worse by more than `--tolerance`.
+"""
+import argparse
+import asyncio
+import json
+import random
+import resource
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from ._common import dev_server, latency_summary, use_fake_llm
+
+TRAFFIC = Path(__file__).resolve().parent / "data" / "traffic.jsonl"
+# Below these absolute differences a change is noise, whatever the ratio
+NOISE_FLOOR = {"ms": 5.0, "rate": 0.01}
+
+
+def parse_mix(spec: Optional[str]) -> dict[str, float]:
+    if not spec:
+        from agent_runtime.graphs import graph_specs
+
+        return dict.fromkeys(graph_specs(), 1.0)
+    mix = {}
+    for part in spec.split(","):
+        graph, _, weight = part.partition(":")
+        mix[graph.strip()] = float(weight or 1)
+    return mix
+
+
+def load_traffic(path: Path) -> list[dict]:
+    runs = []
+    for i, line in enumerate(path.read_text().splitlines()):
+        if not line.strip():
+            continue
+        row = json.loads(line)
+        graph = row.get("graph") or row.get("assistant_id")
+        if not graph:
+            raise ValueError(f"{path}:{i + 1}: no graph / assistant_id")
+        text = row.get("text", f"topic {i}")
+        runs.append({
+            "graph": graph,
+            "input": row.get("input") or {"messages": [{"role": "user", "content": text}]},
+            "config": row.get("config"),
+            "at": row.get("at"),
+            "thread": row.get("thread"),
+        })
+    return runs
+
+
+class Traffic:
+    """The runs to send, in order: replayed lines (cycled through) or drawn from a mix."""
+
+    def __init__(self, replay: Optional[list[dict]], mix: dict[str, float], seed: int):
+        self.replay = replay
+        self.rng = random.Random(seed)
+        self.graphs, self.weights = list(mix), list(mix.values())
+        self.i = 0
+
+    @property
+    def timed(self) -> bool:
+        """Replayed with their own arrival times (`at` on every line)."""
+        return bool(self.replay) and all(run["at"] is not None for run in self.replay)
+
+    def next(self) -> Optional[dict]:
+        i, self.i = self.i, self.i + 1
+        if self.replay:
+            if self.timed and i >= len(self.replay):
+                return None
+            # Each pass over the file gets its own threads
+            run = self.replay[i % len(self.replay)]
+            thread = run["thread"] and f"{run['thread']}#{i // len(self.replay)}"
+            return {**run, "thread": thread}
+        graph = self.rng.choices(self.graphs, self.weights)[0]
+        return {"graph": graph, "input": {"messages": [{"role": "user", "content": f"topic {i}"}]},
+                "config": None, "at": None, "thread": None}
+
+
+class Recorder:
+    def __init__(self):
+        self.graphs = defaultdict(lambda: {
+            "sent": 0, "ok": 0, "shed": 0, "errors": defaultdict(int), "ttfe": [], "latency": [], "events": [],
+        })
+        self.open = 0
+        self.peak_open = 0
+
+    def opened(self) -> None:
+        self.open += 1
+        self.peak_open = max(self.peak_open, self.open)
+
+    def closed(self) -> None:
+        self.open -= 1
+
+    def report(self, elapsed: float) -> dict:
+        graphs, total = {}, {"sent": 0, "ok": 0, "shed": 0, "errors": 0}
+        for graph, row in sorted(self.graphs.items()):
+            errors = sum(row["errors"].values())
+            graphs[graph] = {
+                "sent": row["sent"],
+                "ok": row["ok"],
+                "shed": row["shed"],
+                "errors": dict(sorted(row["errors"].items())),
+                "error_rate": round(errors / row["sent"], 4) if row["sent"] else 0.0,
+                "shed_rate": round(row["shed"] / row["sent"], 4) if row["sent"] else 0.0,
+                "ttfe": latency_summary(row["ttfe"]),
+                "latency": latency_summary(row["latency"]),
+                "events_per_run": round(sum(row["events"]) / len(row["events"]), 1) if row["events"] else 0.0,
+            }
+            for key in ("sent", "ok", "shed"):
+                total[key] += row[key]
+            total["errors"] += errors
+        return {
+            "graphs": graphs,
+            "total": {
+                **total,
+                "error_rate": round(total["errors"] / total["sent"], 4) if total["sent"] else 0.0,
+                "runs_per_s": round(total["ok"] / elapsed, 2) if elapsed else 0.0,
+                "peak_open_streams": self.peak_open,
+                "elapsed_s": round(elapsed, 2),
+            },
+        }
+
+
+async def stream_run(client, run: dict, endpoint: str, stream_modes: list[str], threads: dict,
+                     recorder: Recorder) -> None:
+    import httpx
+
+    row = recorder.graphs[run["graph"]]
+    row["sent"] += 1
+    body = {"assistant_id": run["graph"], "input": run["input"], "stream_mode": stream_modes}
+    if run["config"]:
+        body["config"] = run["config"]
+    recorder.opened()
+    try:
+        if endpoint == "stateless":
+            await _read(client, "/runs/stream", body, row)
+        elif run["thread"] is None:
+            await _read(client, f"/threads/{await _new_thread(client)}/runs/stream", body, row)
+        else:
+            # Turns of one labelled thread go one after the other
+            lock, ids = threads.setdefault(run["thread"], (asyncio.Lock(), []))
+            async with lock:
+                if not ids:
+                    ids.append(await _new_thread(client))
+                await _read(client, f"/threads/{ids[0]}/runs/stream", body, row)
+    except httpx.TimeoutException:
+        row["errors"]["timeout"] += 1
+    except httpx.HTTPStatusError as e:
+        row["errors"][f"http_{e.response.status_code}"] += 1
+    except httpx.HTTPError:
+        row["errors"]["connection"] += 1
+    finally:
+        recorder.closed()
+
+
+async def _new_thread(client) -> str:
+    resp = await client.post("/threads", json={})
+    resp.raise_for_status()
+    return resp.json()["thread_id"]
+
+
+async def _read(client, path: str, body: dict, row: dict) -> None:
+    """POST a run and read its SSE stream to the end."""
+    started = time.monotonic()
+    first, events, event = None, 0, None
+    async with client.stream("POST", path, json=body) as resp:
+        if resp.status_code == 429:
+            row["shed"] += 1
+            return
+        resp.raise_for_status()
+        async for line in resp.aiter_lines():
+            if line.startswith("event:"):
+                event = line[6:].strip()
+            elif not line and event is not None:
+                events += 1
+                if event == "error":
+                    row["errors"]["stream_error"] += 1
+                    return
+                if first is None and event != "metadata":
+                    first = time.monotonic() - started
+                event = None
+    row["ok"] += 1
+    row["latency"].append(time.monotonic() - started)
+    row["events"].append(events)
+    if first is not None:
+        row["ttfe"].append(first)
+
+
+async def generate(base_url: str, args, traffic: Traffic) -> dict:
+    import httpx
+
+    recorder, threads, tasks = Recorder(), {}, []
+    stream_modes = args.stream_mode.split(",")
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=args.keepalive)
+    timeout = httpx.Timeout(args.timeout, connect=30)
+    end = time.monotonic() + args.duration
+    budget = args.requests or float("inf")
+
+    def send(run: dict) -> None:
+        tasks.append(asyncio.ensure_future(stream_run(client, run, args.endpoint, stream_modes, threads, recorder)))
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        rng = random.Random(args.seed)
+        started = time.monotonic()
+        if args.mode == "open":
+            while len(tasks) < budget and time.monotonic() < end:
+                run = traffic.next()
+                if run is None:
+                    break
+                if traffic.timed:
+                    await asyncio.sleep(max(0.0, started + run["at"] / args.speed - time.monotonic()))
+                send(run)
+                if not traffic.timed:
+                    await asyncio.sleep(rng.expovariate(args.rate))
+            await asyncio.gather(*tasks)
+        else:
+            sent = 0
+
+            async def user():
+                nonlocal sent
+                while sent < budget and time.monotonic() < end:
+                    run = traffic.next()
+                    if run is None:
+                        return
+                    sent += 1
+                    await stream_run(client, run, args.endpoint, stream_modes, threads, recorder)
+                    if args.think:
+                        await asyncio.sleep(rng.expovariate(1 / args.think))
+
+            await asyncio.gather(*(user() for _ in range(args.users)))
+        return recorder.report(time.monotonic() - started)
+
+
+def raise_fd_limit() -> None:
+    """Every open stream is a socket: lift the soft limit on open files to the hard one."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def print_report(report: dict) -> None:
+    meta, total = report["meta"], report["total"]
+    load = f"rate {meta['rate']}/s" if meta["mode"] == "open" else f"{meta['users']} users, think {meta['think']}s"
+    print(f"\n{meta['target']}  {meta['mode']} loop, {load}, {meta['traffic']}, {meta['endpoint']} endpoint")
+    header = (f"{'graph':>22}{'sent':>7}{'ok':>7}{'shed':>6}{'err %':>7}{'ttfe p50':>10}{'ttfe p95':>10}"
+              f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'events':>8}")
+    print(header)
+    print("-" * len(header))
+    for graph, g in report["graphs"].items():
+        print(f"{graph:>22}{g['sent']:>7}{g['ok']:>7}{g['shed']:>6}{g['error_rate'] * 100:>7.1f}"
+              f"{g['ttfe']['p50_ms']:>10}{g['ttfe']['p95_ms']:>10}{g['latency']['p50_ms']:>10}"
+              f"{g['latency']['p95_ms']:>10}{g['latency']['p99_ms']:>10}{g['events_per_run']:>8}")
+        if g["errors"]:
+            print(f"{'':>22}  errors: " + ", ".join(f"{kind} {n}" for kind, n in g["errors"].items()))
+    print(f"{total['ok']}/{total['sent']} runs in {total['elapsed_s']}s ({total['runs_per_s']} runs/s), "
+          f"{total['shed']} shed, {total['errors']} failed, peak {total['peak_open_streams']} open streams")
+
+
+def _metrics(graph: dict) -> dict[str, float]:
+    """Comparable metrics of one graph, all higher-is-worse."""
+    out = {"error_rate": graph["error_rate"], "shed_rate": graph["shed_rate"]}
+    for kind in ("ttfe", "latency"):
+        for q in ("p50_ms", "p95_ms", "p99_ms"):
+            out[f"{kind}_{q}"] = graph[kind][q]
+    return out
+
+
+def diff(old: dict, new: dict, tolerance: float) -> list[str]:
+    """Print old -> new per graph and metric; returns the regressions."""
+    regressions = []
+    for key in sorted((set(old["meta"]) | set(new["meta"])) - {"created"}):
+        if old["meta"].get(key) != new["meta"].get(key):
+            print(f"note: {key} differs ({old['meta'].get(key)} -> {new['meta'].get(key)}), the loads are not the same")
+    print(f"{'graph':>22}  {'metric':<16}{'old':>10}{'new':>10}{'change':>9}")
+    for graph in sorted(set(old["graphs"]) | set(new["graphs"])):
+        before, after = old["graphs"].get(graph), new["graphs"].get(graph)
+        if before is None or after is None:
+            print(f"{graph:>22}  {'only in ' + ('new' if before is None else 'old')}")
+            continue
+        after_metrics = _metrics(after)
+        for metric, a in _metrics(before).items():
+            b = after_metrics[metric]
+            change = (b - a) / a if a else (0.0 if b == a else float("inf"))
+            floor = NOISE_FLOOR["rate" if metric.endswith("rate") else "ms"]
+            worse = b - a > floor and b - a > tolerance * abs(a)
+            flag = "  <-- worse" if worse else ""
+            print(f"{graph:>22}  {metric:<16}{a:>10}{b:>10}{change:>+9.0%}{flag}")
+            if worse:
+                regressions.append(f"{graph}: {metric} {a} -> {b} ({change:+.0%})")
+    return regressions
+
+
+def run(args) -> dict:
+    replay = load_traffic(args.replay) if args.replay else None
+    traffic = Traffic(replay, parse_mix(args.mix), args.seed)
+    meta = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "target": args.url or "local dev server, fake LLM",
+        "mode": args.mode,
+        "rate": args.rate,
+        "users": args.users,
+        "think": args.think,
+        "duration": args.duration,
+        "requests": args.requests,
+        "traffic": f"replay {args.replay.name} x{args.speed}" if replay else f"mix {args.mix or 'all graphs'}",
+        "endpoint": args.endpoint,
+        "stream_mode": args.stream_mode,
+        "latency": None if args.url else args.latency,
+    }
+    raise_fd_limit()
+    if args.url:
+        return {"meta": meta, **asyncio.run(generate(args.url.rstrip("/"), args, traffic))}
+    use_fake_llm(args.latency)
+    with dev_server({"GRAPH_LOADING": "eager"}) as (port, _, _):
+        return {"meta": meta, **asyncio.run(generate(f"http://127.0.0.1:{port}", args, traffic))}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("run")
+    p.add_argument("--url", help="server to load (default: a local dev server with the fake LLM)")
+    p.add_argument("--mode", choices=("open", "closed"), default="open")
+    p.add_argument("--rate", type=float, default=10.0, help="open loop: runs started per second")
+    p.add_argument("--users", type=int, default=20, help="closed loop: concurrent clients")
+    p.add_argument("--think", type=float, default=0.0, help="closed loop: mean seconds between a user's runs")
+    p.add_argument("--duration", type=float, default=30.0)
+    p.add_argument("--requests", type=int, help="stop after this many runs")
+    p.add_argument("--mix", help="graph:weight,... (default: all graphs of langgraph.json)")
+    p.add_argument("--replay", type=Path, nargs="?", const=TRAFFIC, help=f"JSONL traffic file (default {TRAFFIC})")
+    p.add_argument("--speed", type=float, default=1.0, help="replay: divides the `at` offsets")
+    p.add_argument("--endpoint", choices=("thread", "stateless"), default="thread")
+    p.add_argument("--stream-mode", default="values", help="comma-separated stream modes")
+    p.add_argument("--timeout", type=float, default=300, help="seconds without data before a run fails")
+    p.add_argument("--keepalive", type=int, default=100, help="idle connections kept for reuse")
+    p.add_argument("--latency", default="0.2", help="local server: fake LLM latency spec")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--save", type=Path, help="write the report as JSON")
+    d = sub.add_parser("diff")
+    d.add_argument("old", type=Path)
+    d.add_argument("new", type=Path)
+    d.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    if args.command == "diff":
+        regressions = diff(json.loads(args.old.read_text()), json.loads(args.new.read_text()), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+
+    report = run(args)
+    print_report(report)
+    if args.save:
+        args.save.write_text(json.dumps(report, indent=2, sort_keys=True) + "\n")
+        print(f"report written to {args.save}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""
+Routing decision latency and agreement: LLM only vs local classifier + LLM fallback.
+
+    python -m bench.routing_fastpath [--thresholds 0.5,0.7,0.9] [--latency 0.4]
+    python -m bench.routing_fastpath --llm     # reference labels from the real model
+
+The held-out set (bench/data/routing_heldout.jsonl) is labeled by hand. By
+default the fake LLM answers with those labels, so "agree" measures how often
+the routing decision matches what the LLM router would have said; with --llm
+the reference labels come from the configured model instead.
+"""
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+from ._common import latency_summary, use_fake_llm
+
+HELDOUT = Path(__file__).resolve().parent / "data" / "routing_heldout.jsonl"
+
+
+def run(router, examples: list[tuple[str, str]], threshold: float) -> dict:
+    latencies, local, agree = [], 0, 0
+    config = {"configurable": {"route_threshold": threshold}}
+    for text, reference in examples:
+        started = time.perf_counter()
+        update = router({"messages": [], "topic": text}, config)
+        latencies.append(time.perf_counter() - started)
+        local += update["route_source"] == "local"
+        agree += update["route"] == reference
+    return {
+        **latency_summary(latencies),
+        "local_share": round(local / len(examples), 3),
+        "agreement": round(agree / len(examples), 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--data", default=str(HELDOUT))
+    parser.add_argument("--thresholds", default="0.5,0.6,0.7,0.8,0.9")
+    parser.add_argument("--latency", default="0.4", help="fake LLM latency spec (see agent_runtime.fake)")
+    parser.add_argument("--llm", action="store_true", help="use the configured provider for reference labels")
+    args = parser.parse_args(argv)
+
+    if not args.llm:
+        use_fake_llm(args.latency)
+    from agent_runtime.classifier import load_examples
+    from agent_runtime.graphs import load_module
+
+    routing = load_module("routing")
+    examples = load_examples(args.data)
+    if args.llm:
+        examples = [(text, routing.classify_llm(text)) for text, _ in examples]
+    else:
+        labels = dict(examples)
+        request = re.compile(r"Request: (.*)\nOnly output")
+        routing.classifier_llm.rungs[0].client.responder = lambda prompt: labels.get(request.search(prompt).group(1), "tech")
+
+    cases = [("llm only", 1.01)] + [(f"local >= {t}", float(t)) for t in args.thresholds.split(",")] + [("local >= 0", 0.0)]
+    print(f"{len(examples)} held-out requests, {len(routing.classifier.idf)} classifier features")
+    header = f"{'router':<16}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'mean ms':>10}{'local':>8}{'agree':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, threshold in cases:
+        r = run(routing.router, examples, threshold)
+        print(
+            f"{name:<16}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{r['mean_ms']:>10}"
+            f"{r['local_share']:>8.0%}{r['agreement']:>8.0%}",
+            flush=True,
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
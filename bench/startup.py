@@ -0,0 +1,178 @@
+"""
+API cold start: what each graph costs to load, and how long the dev server takes
+to answer with each GRAPH_LOADING mode (agent_runtime/devserver.py).
+
+    python -m bench.startup imports [--graphs routing,...] [--no-preload]
+    python -m bench.startup server [--modes eager,lazy,warm] [--graph example]
+
+`imports` loads every graph of langgraph.json in its own subprocess, after
+importing what the server has already imported by then (langgraph,
+langchain_core, agent_runtime; `--no-preload` starts from nothing), and splits
+the load time into: new modules imported (`imports_ms`, outermost imports
+only), get_llm() calls (`llm_ms`), StateGraph.compile() (`compile_ms`) and the
+rest of the agent module's own top-level code (`own_ms`).
+
+`server` starts the dev server once per mode on a free port, from a temporary
+working directory (links to the repo, fresh .langgraph_api) with the fake LLM, and reports the
+time to the first 200 on /ok (`healthy_s`), to the end of a first run of
+`--graph` started as soon as the server is healthy (`first_run_s`), and to every
+graph being fetchable (`ready_s`, api_watcher's readiness probe).
+"""
+import argparse
+import builtins
+import json
+import subprocess
+import sys
+import time
+import urllib.request
+
+from ._common import dev_server, use_fake_llm, user_input
+
+PRELOAD = ("langgraph.graph", "langchain_core.messages", "agent_runtime")
+
+
+def profile_graph(graph_id: str, preload: bool = True) -> dict:
+    """Load one graph in this process and split its load time (see module docstring)."""
+    import importlib
+
+    if preload:
+        for name in PRELOAD:
+            importlib.import_module(name)
+    spent = {"imports": 0.0, "llm": 0.0, "compile": 0.0}
+    depth = [0]  # > 0 while inside a timed call: nested time is already counted
+    modules = len(sys.modules)
+
+    def timed(kind, fn):
+        def wrapper(*args, **kwargs):
+            if depth[0]:
+                return fn(*args, **kwargs)
+            depth[0] += 1
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                spent[kind] += time.perf_counter() - started
+                depth[0] -= 1
+
+        return wrapper
+
+    # Without preload these are the graph's first imports: counted as such
+    setup = time.perf_counter()
+    from langgraph.graph import StateGraph
+
+    from agent_runtime import graphs
+    from agent_runtime.llm import LLMRegistry
+
+    spent["imports"] = setup = time.perf_counter() - setup
+
+    original_import = builtins.__import__
+    timed_import = timed("imports", original_import)
+
+    def _import(name, globals=None, locals=None, fromlist=(), level=0):
+        if level == 0 and name in sys.modules:
+            return original_import(name, globals, locals, fromlist, level)
+        return timed_import(name, globals, locals, fromlist, level)
+
+    patches = [
+        (builtins, "__import__", _import),
+        (LLMRegistry, "get", timed("llm", LLMRegistry.get)),
+        (StateGraph, "compile", timed("compile", StateGraph.compile)),
+    ]
+    saved = [(owner, name, getattr(owner, name)) for owner, name, _ in patches]
+    for owner, name, value in patches:
+        setattr(owner, name, value)
+    started = time.perf_counter()
+    try:
+        graphs.load_graph(graph_id)
+    finally:
+        total = time.perf_counter() - started + setup
+        for owner, name, value in saved:
+            setattr(owner, name, value)
+    row = {"graph": graph_id, "total_ms": total * 1000}
+    row.update({f"{kind}_ms": seconds * 1000 for kind, seconds in spent.items()})
+    row["own_ms"] = max(0.0, total - sum(spent.values())) * 1000
+    row = {k: round(v, 1) if isinstance(v, float) else v for k, v in row.items()}
+    row["modules"] = len(sys.modules) - modules
+    return row
+
+
+def run_imports(graph_ids: list[str], preload: bool) -> list[dict]:
+    rows = []
+    for graph_id in graph_ids:
+        cmd = [sys.executable, "-m", "bench.startup", "_profile", graph_id]
+        if not preload:
+            cmd.append("--no-preload")
+        out = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+        rows.append(json.loads(out.strip().splitlines()[-1]))
+    return rows
+
+
+def _post(url: str, payload: dict, timeout: float = 60):
+    req = urllib.request.Request(url, data=json.dumps(payload).encode(), headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return json.loads(resp.read() or b"null")
+
+
+def measure_server(mode: str, graph_id: str, timeout: float) -> dict:
+    from api_watcher import probe_healthy, probe_ready
+
+    from agent_runtime.graphs import CONFIG
+
+    graph_ids = set(json.loads(CONFIG.read_text())["graphs"])
+    row = {"mode": mode}
+    with dev_server({"GRAPH_LOADING": mode}, timeout, wait_healthy=False) as (port, proc, started):
+        deadline = started + timeout
+        while not probe_healthy(port):
+            if proc.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError(f"{mode}: server not healthy (exit code {proc.poll()})")
+            time.sleep(0.05)
+        row["healthy_s"] = time.monotonic() - started
+        _post(f"http://127.0.0.1:{port}/runs/wait", {"assistant_id": graph_id, "input": user_input(0)})
+        row["first_run_s"] = time.monotonic() - started
+        while not probe_ready(port, graph_ids):
+            if proc.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError(f"{mode}: graphs not ready (exit code {proc.poll()})")
+            time.sleep(0.05)
+        row["ready_s"] = time.monotonic() - started
+    return {k: round(v, 2) if isinstance(v, float) else v for k, v in row.items()}
+
+
+def _print(rows: list[dict], columns: tuple) -> None:
+    print("".join(f"{c:>22}" if i == 0 else f"{c:>12}" for i, c in enumerate(columns)))
+    for row in rows:
+        print("".join(f"{row[c]:>22}" if i == 0 else f"{row[c]:>12}" for i, c in enumerate(columns)), flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    sub = parser.add_subparsers(dest="command", required=True)
+    imports = sub.add_parser("imports")
+    imports.add_argument("--graphs", default="")
+    imports.add_argument("--no-preload", action="store_true")
+    server = sub.add_parser("server")
+    server.add_argument("--modes", default="eager,lazy,warm")
+    server.add_argument("--graph", default="example")
+    server.add_argument("--timeout", type=float, default=180)
+    profile = sub.add_parser("_profile")  # one graph, in a subprocess of `imports`
+    profile.add_argument("graph")
+    profile.add_argument("--no-preload", action="store_true")
+    args = parser.parse_args(argv)
+
+    use_fake_llm("0.05")
+    if args.command == "_profile":
+        print(json.dumps(profile_graph(args.graph, preload=not args.no_preload)))
+        return 0
+    if args.command == "imports":
+        from agent_runtime.graphs import graph_specs
+
+        graph_ids = args.graphs.split(",") if args.graphs else list(graph_specs())
+        rows = run_imports(graph_ids, preload=not args.no_preload)
+        _print(rows, ("graph", "total_ms", "imports_ms", "llm_ms", "compile_ms", "own_ms", "modules"))
+        return 0
+    rows = [measure_server(mode, args.graph, args.timeout) for mode in args.modes.split(",")]
+    _print(rows, ("mode", "healthy_s", "first_run_s", "ready_s"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+"""
+Tail latency of parallel_voting: wait-for-all vs quorum vs quorum + hedging,
+against a fake LLM with heavy-tailed (Pareto) latency.
+
+    python -m bench.voting_latency [--runs 300] [--concurrency 50] [--latency pareto:0.1,1.5]
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from ._common import latency_summary, use_fake_llm, user_input
+
+MODES = {
+    "all": {"voting_mode": "all"},
+    "quorum 2/3": {"voting_mode": "quorum", "quorum": 2},
+    "quorum 2/3 + hedge": {"voting_mode": "quorum", "quorum": 2, "hedge": True},
+}
+
+
+async def run_mode(app, configurable: dict, runs: int, concurrency: int) -> list[float]:
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with gate:
+            started = time.perf_counter()
+            await app.ainvoke(user_input(i), {"configurable": configurable})
+            return time.perf_counter() - started
+
+    return await asyncio.gather(*(one(i) for i in range(runs)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", default="pareto:0.1,1.5")
+    args = parser.parse_args(argv)
+
+    use_fake_llm(args.latency)
+    from agent_runtime import load_graph
+
+    app = load_graph("parallel_voting")
+    print(f"{'mode':<22}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, configurable in MODES.items():
+        latencies = asyncio.run(run_mode(app, configurable, args.runs, args.concurrency))
+        s = latency_summary(latencies)
+        print(f"{name:<22}{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}", flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
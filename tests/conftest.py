@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Run from the repository root without installing it; never call a real LLM
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LLM_PROVIDER", "fake")
@@ -0,0 +1,123 @@
+import asyncio
+import json
+
+import pytest
+
+from agent_runtime.admission import AdmissionController, AdmissionMiddleware, Shed
+
+
+def _controller(**kwargs):
+    kwargs.setdefault("max_wait", 5.0)
+    return AdmissionController(**kwargs)
+
+
+def test_full_queue_is_shed_with_retry_after():
+    async def scenario():
+        controller = _controller(limits={"slow": {"concurrency": 1, "queue": 1}})
+        await controller.acquire("slow")
+        controller.release("slow", 4.0)  # runs of "slow" take 4s
+        await controller.acquire("slow")
+        queued = asyncio.ensure_future(controller.acquire("slow"))
+        await asyncio.sleep(0)
+        with pytest.raises(Shed) as shed:
+            await controller.acquire("slow")
+        queued.cancel()
+        await asyncio.gather(queued, return_exceptions=True)
+        return shed.value, controller.stats()["graphs"]["slow"]["outcomes"]
+
+    shed, outcomes = asyncio.run(scenario())
+    assert (shed.reason, shed.retry_after) == ("queue_full", 8)  # one run ahead, then its own
+    assert outcomes["queue_full"] == 1
+
+
+def test_expected_wait_over_max_wait_is_shed_at_once():
+    async def scenario():
+        controller = _controller(max_wait=5.0, limits={"slow": {"concurrency": 1}})
+        await controller.acquire("slow")
+        controller.release("slow", 30.0)
+        await controller.acquire("slow")
+        with pytest.raises(Shed) as shed:
+            await controller.acquire("slow")
+        return shed.value
+
+    shed = asyncio.run(scenario())
+    assert (shed.reason, shed.retry_after) == ("wait_too_long", 30)
+
+
+def test_queued_request_times_out():
+    async def scenario():
+        controller = _controller(max_wait=0.05, limits={"g": {"concurrency": 1}})
+        await controller.acquire("g")
+        with pytest.raises(Shed) as shed:
+            await controller.acquire("g")
+        return shed.value, controller.stats()["graphs"]["g"]["queued"]
+
+    shed, queued = asyncio.run(scenario())
+    assert shed.reason == "timeout" and shed.retry_after >= 1
+    assert queued == 0
+
+
+def test_freed_slot_goes_to_the_shortest_graph():
+    async def scenario():
+        controller = _controller(max_runs=1)
+        for name, seconds in (("long", 4.0), ("short", 0.5)):
+            await controller.acquire(name)
+            controller.release(name, seconds)
+        await controller.acquire("long")
+        order = []
+
+        async def run(name):
+            await controller.acquire(name)
+            order.append(name)
+            controller.release(name)
+
+        waiting = [asyncio.ensure_future(run(name)) for name in ("long", "short")]
+        await asyncio.sleep(0)
+        controller.release("long")
+        await asyncio.gather(*waiting)
+        return order
+
+    assert asyncio.run(scenario()) == ["short", "long"]
+
+
+async def _request(app, path="/runs/wait", body=b"{}"):
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        await asyncio.Event().wait()  # the client stays connected
+
+    async def send(message):
+        sent.append(message)
+
+    await app({"type": "http", "method": "POST", "path": path}, receive, send)
+    start = next(m for m in sent if m["type"] == "http.response.start")
+    body = b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body")
+    return start["status"], dict(start["headers"]), body
+
+
+def test_middleware_answers_429_with_retry_after():
+    async def server(scope, receive, send):
+        await receive()
+        await asyncio.sleep(0.1)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    async def scenario():
+        controller = _controller(limits={"assistant": {"concurrency": 1, "queue": 0}})
+        app = AdmissionMiddleware(server, controller)
+        first = asyncio.ensure_future(_request(app))
+        await asyncio.sleep(0.01)
+        shed = await _request(app, "/threads/t1/runs/stream")
+        # Other routes are not held
+        other = await _request(app, "/threads")
+        return await first, shed, other
+
+    (status, _, body), (shed_status, headers, shed_body), (other_status, _, _) = asyncio.run(scenario())
+    assert (status, body) == (200, b"ok")
+    assert shed_status == 429
+    assert headers[b"retry-after"] == b"1"
+    assert json.loads(shed_body)["reason"] == "queue_full"
+    assert other_status == 200
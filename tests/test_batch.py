@@ -0,0 +1,83 @@
+import asyncio
+import json
+
+from langchain_core.messages import AIMessage
+
+from agent_runtime.batch import BatchRunner, Journal, input_hash
+
+
+class EchoGraph:
+    """Stands in for a compiled graph: echoes the user text, fails on "boom"."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def ainvoke(self, payload, config):
+        text = payload["messages"][-1]["content"]
+        self.calls.append(text)
+        await asyncio.sleep(0.01)
+        if text == "boom":
+            raise RuntimeError("provider down")
+        return {"messages": [AIMessage(content=text.upper())]}
+
+
+def _lines(*rows):
+    return [(number, json.dumps(row)) for number, row in enumerate(rows, 1)]
+
+
+def _run(path, rows, app, **kwargs):
+    journal = Journal(path, dedup_entries=100)
+    try:
+        return asyncio.run(BatchRunner(app, journal, concurrency=4, **kwargs).run(iter(rows)))
+    finally:
+        journal.close()
+
+
+def _journal(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_identical_inputs_run_once(tmp_path):
+    out, app = tmp_path / "out.jsonl", EchoGraph()
+    counts = _run(out, _lines({"text": "hi", "id": "a"}, {"prompt": "hi", "id": "b"}, {"text": "yo"}), app)
+
+    assert sorted(app.calls) == ["hi", "yo"]
+    assert counts["ran"] == 2 and counts["deduplicated"] == 1
+    rows = {row["line"]: row for row in _journal(out)}
+    assert rows[1]["output"] == rows[2]["output"] == "HI"
+    assert [rows[n].get("deduplicated", False) for n in (1, 2)].count(True) == 1
+    assert rows[2]["id"] == "b"
+
+
+def test_resume_skips_done_lines_and_retries_failed_ones(tmp_path):
+    out, rows = tmp_path / "out.jsonl", _lines({"text": "hi"}, {"text": "boom"}, {"text": "yo"})
+    payload = {"messages": [{"role": "user", "content": "hi"}]}
+    out.write_text(
+        json.dumps({"line": 1, "input_hash": input_hash(payload, {}), "output": "HI"}) + "\n"
+        + json.dumps({"line": 2, "input_hash": "x", "error": "RuntimeError: provider down"}) + "\n"
+        + '{"line": 3, "inp'  # torn tail of a killed job
+    )
+    app = EchoGraph()
+    counts = _run(out, rows, app)
+
+    assert counts["skipped"] == 1
+    assert app.calls.count("hi") == 0 and app.calls.count("yo") == 1
+    journal = _journal(out)  # the torn line was dropped, not glued to the next row
+    assert sorted(row["line"] for row in journal) == [1, 2, 2, 3]
+    retried = {row["line"]: row for row in journal[2:]}
+    assert retried[2]["error"] == "RuntimeError: provider down"
+
+    # Only the still-failing line runs again; its earlier output is reused for duplicates
+    app = EchoGraph()
+    counts = _run(out, rows + [(4, json.dumps({"body": "yo"}))], app)
+    assert app.calls == ["boom"]
+    assert counts["deduplicated"] == 1
+    assert {"line": 4, "id": None, "input_hash": retried[3]["input_hash"], "output": "YO",
+            "deduplicated": True} in _journal(out)
+
+
+def test_no_dedup_runs_every_row(tmp_path):
+    app = EchoGraph()
+    counts = _run(tmp_path / "out.jsonl", _lines({"text": "hi"}, {"text": "hi"}), app, dedup=False)
+
+    assert app.calls == ["hi", "hi"] and counts["deduplicated"] == 0
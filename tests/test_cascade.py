@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from agent_runtime.cascade import Cascade, all_of, confidence, length, matches, one_of
+from agent_runtime.deadline import DeadlineExceeded
+
+
+class Rung:
+    """Stands in for a ManagedChatModel: a fixed answer, or DeadlineExceeded."""
+
+    def __init__(self, model, answer):
+        self.model = model
+        self.answer = answer
+        self.calls = 0
+
+    def invoke(self, input, config=None, **kwargs):
+        self.calls += 1
+        if self.answer is DeadlineExceeded:
+            raise DeadlineExceeded("run deadline reached")
+        return AIMessage(content=self.answer, usage_metadata={"input_tokens": 10, "output_tokens": 5, "total_tokens": 15})
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        return self.invoke(input, config, **kwargs)
+
+
+def _cascade(*answers, verifier=one_of(["yes", "no"]), enabled=True):
+    rungs = [Rung(f"model-{i}", answer) for i, answer in enumerate(answers)]
+    return Cascade("graph", "node", rungs, verifier, enabled=enabled), rungs
+
+
+@pytest.fixture(params=["invoke", "ainvoke"])
+def call(request):
+    if request.param == "invoke":
+        return lambda cascade: cascade.invoke("prompt")
+    return lambda cascade: asyncio.run(cascade.ainvoke("prompt"))
+
+
+def test_accepted_answer_does_not_escalate(call):
+    cascade, rungs = _cascade("yes", "no")
+    message = call(cascade)
+
+    assert message.content == "yes"
+    assert [r.calls for r in rungs] == [1, 0]
+    assert "cascade" not in message.response_metadata
+
+
+def test_rejected_answer_escalates_and_sums_usage(call):
+    cascade, rungs = _cascade("maybe", "perhaps", "no")
+    message = call(cascade)
+
+    assert message.content == "no"
+    assert [r.calls for r in rungs] == [1, 1, 1]
+    assert message.response_metadata["cascade"] == {"model": "model-2", "rejected": ["model-0", "model-1"]}
+    assert message.usage_metadata == {"input_tokens": 30, "output_tokens": 15, "total_tokens": 45}
+
+
+def test_last_rung_answers_even_if_rejected(call):
+    cascade, _ = _cascade("maybe", "dunno")
+    assert call(cascade).content == "dunno"
+
+
+def test_deadline_during_escalation_keeps_the_last_answer(call):
+    cascade, rungs = _cascade("maybe", DeadlineExceeded, "yes")
+    message = call(cascade)
+
+    assert message.content == "maybe"
+    assert [r.calls for r in rungs] == [1, 1, 0]
+
+
+def test_deadline_on_the_first_rung_raises(call):
+    cascade, _ = _cascade(DeadlineExceeded, "yes")
+    with pytest.raises(DeadlineExceeded):
+        call(cascade)
+
+
+def test_disabled_cascade_only_uses_the_first_rung(call):
+    cascade, rungs = _cascade("maybe", "yes", enabled=False)
+
+    assert call(cascade).content == "maybe"
+    assert [r.calls for r in rungs] == [1, 0]
+
+
+def test_verifiers():
+    assert one_of(["Billing", "tech"])("  billing\n") and not one_of(["tech"])("technical")
+    assert matches(r"VERDICT:\s*(PASS|REVISE)")("ok\nverdict: pass")
+    assert length(2, 5)("abc") and not length(2, 5)("abcdef")
+    assert confidence(0.7)("answer\nCONFIDENCE: 0.8") and not confidence(0.7)("CONFIDENCE: 0.9\nCONFIDENCE: .5")
+    assert not confidence()("no confidence line")
+    assert all_of(length(1), matches("x"))("x") and not all_of(length(1), matches("x"))("y")
@@ -0,0 +1,89 @@
+import asyncio
+import os
+
+import pytest
+
+from agent_runtime import devserver
+from agent_runtime.devserver import worker_for
+
+
+@pytest.fixture
+def inmem(monkeypatch):
+    # Settings `langgraph dev` gives the in-memory runtime, read when langgraph_api is imported
+    for key, value in (("REDIS_URI", "fake"), ("DATABASE_URI", ":memory:"), ("MIGRATIONS_PATH", "__inmem"),
+                       ("LANGGRAPH_RUNTIME_EDITION", "inmem")):
+        monkeypatch.setenv(key, os.environ.get(key, value))
+    from langgraph_api.api import threads
+    from langgraph_runtime_inmem import ops
+
+    monkeypatch.setattr(threads, "uuid7", threads.uuid7)
+    monkeypatch.setattr(ops, "uuid4", ops.uuid4)
+    monkeypatch.setattr(ops.Threads, "copy", ops.Threads.__dict__["copy"])
+    return threads, ops
+
+
+def test_thread_affinity_redraws_thread_ids_only(inmem):
+    threads, ops = inmem
+    devserver.install_thread_affinity(1, 3)
+
+    assert {worker_for(str(threads.uuid7()), 3) for _ in range(30)} == {1}
+    # Run, assistant and cron ids are left alone
+    assert len({worker_for(str(ops.uuid4()), 3) for _ in range(60)}) > 1
+
+    async def copy(*args, **kwargs):
+        return ops.uuid4()
+
+    async def copies():
+        owned_copy = devserver._copy_owned(copy)
+        return await asyncio.gather(*(owned_copy() for _ in range(30)))
+
+    ids = asyncio.run(copies())
+    assert {worker_for(str(i), 3) for i in ids} == {1}
+
+
+@pytest.mark.parametrize(
+    "key, count, index",
+    [
+        # crc32("123456789") = 0xCBF43926 (the CRC-32 check value): (0xCBF4 & 0x7FFF) = 19444
+        ("123456789", 2, 0),
+        ("123456789", 3, 1),
+        ("123456789", 5, 4),
+        # crc32("a") = 0xE8B7BE43: 0x68B7 = 26807
+        ("a", 3, 2),
+        ("a", 4, 3),
+        ("", 7, 0),
+    ],
+)
+def test_worker_for_matches_nginx_hash(key, count, index):
+    # ngx_http_upstream_hash_module, first try: ((crc32(key) >> 16) & 0x7fff) % total weight
+    assert worker_for(key, count) == index
+
+
+def test_nginx_upstream_hashes_the_thread_id_over_workers_in_order(monkeypatch):
+    import re
+
+    import api_watcher
+
+    monkeypatch.setattr(api_watcher, "RELOAD_MODE", "supervisor")
+    monkeypatch.setattr(api_watcher, "WORKERS", 3)
+    block = api_watcher.nginx_upstream()
+    assert "    hash $langgraph_thread;\n" in block and "consistent" not in block
+    servers = re.findall(r"server (\S+);", block)
+    assert servers == [f"{api_watcher.NGINX_HOST}:{api_watcher.WORKER_BASE_PORT + i}" for i in range(3)]
+    # The key nginx hashes is the id captured from the URL, as the worker minted it
+    pattern = re.search(r'"~(.+)" \$thread;', block).group(1).replace("(?<thread>", "(?P<thread>")
+    thread_id = "0b7e6c1a-3f2d-4c5e-9a8b-7d6e5f4a3b2c"
+    assert re.match(pattern, f"/api/threads/{thread_id}/runs/stream")["thread"] == thread_id
+
+
+@pytest.mark.parametrize("version, hook", [("0.17.0", "_graph_from_spec"), ("0.16.0", None)])
+def test_graph_loading_keeps_stock_loader_on_unknown_api(inmem, monkeypatch, version, hook):
+    import langgraph_api
+    from langgraph_api import graph as server_graph
+
+    monkeypatch.setattr(langgraph_api, "__version__", version)
+    monkeypatch.setattr(server_graph, "_graph_from_spec", server_graph._graph_from_spec if hook else None)
+    stock = server_graph._graph_from_spec
+    devserver.install_graph_loading("lazy")
+
+    assert server_graph._graph_from_spec is stock
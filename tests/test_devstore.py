@@ -0,0 +1,63 @@
+import os
+
+from agent_runtime.devstore import DeltaLog
+
+
+def _open(path):
+    log, data = DeltaLog(path, depth=1), {}
+    log.load(data)
+    return log, data
+
+
+def _reload(path):
+    return _open(path)[1]
+
+
+def test_compaction_keeps_records_appended_by_the_other_process(tmp_path):
+    path = str(tmp_path / "threads.pckl")
+    blue, blue_data = DeltaLog(path, depth=1), {"a": 1}
+    blue.sync(blue_data, None)
+    green, green_data = _open(path)
+
+    green_data["b"] = 2
+    green.sync(green_data, {"b"})
+    blue_data["c"] = 3
+    blue.sync(blue_data, {"c"})
+    blue.compact(blue_data)
+
+    assert blue_data == {"a": 1, "b": 2, "c": 3}
+    assert _reload(path) == {"a": 1, "b": 2, "c": 3}
+
+
+def test_appends_after_the_other_process_compacted(tmp_path):
+    path = str(tmp_path / "threads.pckl")
+    blue, blue_data = DeltaLog(path, depth=1), {"a": 1, "gone": 0}
+    blue.sync(blue_data, None)
+    green, green_data = _open(path)
+
+    del green_data["gone"]
+    green_data["b"] = 2
+    green.sync(green_data, {"gone", "b"})
+    green.compact(green_data)
+    blue_data["a"] = 10  # changed here and not written yet: kept
+    blue.sync(blue_data, {"a"})
+
+    assert blue_data == {"a": 10, "b": 2}
+    assert _reload(path) == {"a": 10, "b": 2}
+    green.sync(green_data, set())
+    assert green_data == {"a": 10, "b": 2}
+
+
+def test_torn_tail_of_the_other_process_is_dropped_before_appending(tmp_path):
+    path = str(tmp_path / "threads.pckl")
+    blue, blue_data = DeltaLog(path, depth=1), {"a": 1}
+    blue.sync(blue_data, None)
+    green, green_data = _open(path)
+    with open(blue.path, "ab") as f:
+        f.write(b"\x01\x00\x00")  # killed in the middle of a record
+
+    green_data["b"] = 2
+    green.sync(green_data, {"b"})
+
+    assert _reload(path) == {"a": 1, "b": 2}
+    assert os.path.getsize(green.path) == green.log_bytes
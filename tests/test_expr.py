@@ -0,0 +1,79 @@
+import pytest
+
+from agent_runtime.expr import (
+    MAX_RESULT_BITS,
+    ExpressionError,
+    LimitError,
+    evaluate,
+    format_number,
+    parse_sweep,
+    sweep,
+)
+
+HUGE_PRODUCT = " * ".join(["2**4000"] * 5)
+
+
+def test_product_of_large_powers_is_limited():
+    with pytest.raises(LimitError):
+        evaluate(HUGE_PRODUCT)
+
+
+def test_floor_division_result_is_limited():
+    with pytest.raises(LimitError):
+        evaluate("(2**4000 * 2**95 + 2**4000 * 2**95) // 1")
+
+
+def test_results_within_limit_are_exact():
+    assert evaluate("2**4000 * 2**90") == 2**4090
+    assert evaluate("7 // 2 * 3") == 9
+    assert len(format_number(evaluate("2**4000 * 2**90"))) > 1000
+
+
+def test_format_number_rejects_unprintable_int():
+    with pytest.raises(ExpressionError):
+        format_number(1 << (MAX_RESULT_BITS * 4))
+
+
+def test_sweep_range_rejects_malformed_numbers():
+    assert parse_sweep("x for x in 1.2.3..5") is None
+    assert parse_sweep("x for x in 0..5 step 1.2.3") is None
+
+
+def test_sweep_range_accepts_decimals():
+    expression, variable, values = parse_sweep("x**2 for x in .5..2 step 0.5")
+    assert (expression, variable) == ("x**2", "x")
+    assert values.tolist() == [0.5, 1.0, 1.5, 2.0]
+
+
+def test_sweep_of_constant_expression_has_one_value_per_point():
+    _, variable, values = parse_sweep("2 for x in 0..3")
+    assert sweep("2", **{variable: values}).tolist() == [2.0, 2.0, 2.0, 2.0]
+
+
+def test_calculator_answers_calc_error_instead_of_raising():
+    from agents.tool_agent.agent import calculate, calculator
+
+    assert calculate(HUGE_PRODUCT).startswith("Result: calc error")
+    assert calculator.invoke({"expression": HUGE_PRODUCT}).startswith("calc error")
+    assert calculate("2 for x in 0..3").splitlines() == ["x=0: 2", "x=1: 2", "x=2: 2", "x=3: 2"]
+    assert calculate("x for x in 1.2.3..5") is None
+
+
+@pytest.mark.parametrize("source", ["round(5, -10000000)", "round(7, -99999999999)", "round(2.5, 10**9)"])
+def test_round_digits_are_limited(source):
+    with pytest.raises(LimitError):
+        evaluate(source)
+
+
+def test_round_digits_must_be_integer():
+    with pytest.raises(ExpressionError):
+        evaluate("round(2.5, 4 / 2)")
+    assert evaluate("round(1234.5678, 2)") == 1234.57
+    assert evaluate("round(1234, -2)") == 1200
+    assert evaluate("round(2.5)") == 2
+
+
+def test_calculator_round_with_huge_digits_answers_at_once():
+    from agents.tool_agent.agent import calculate
+
+    assert calculate("what is round(7, -99999999999)?").startswith("Result: calc error")
@@ -0,0 +1,90 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from agent_runtime.llm import LLMRegistry, ModelGate
+
+
+async def _queued(gate: ModelGate) -> asyncio.Task:
+    task = asyncio.ensure_future(gate.aacquire("g", 1))
+    await asyncio.sleep(0)
+    return task
+
+
+def test_release_skips_cancelled_waiter_and_hands_slot_on():
+    async def scenario():
+        gate = ModelGate("m", concurrency=1)
+        await gate.aacquire("g", 1)
+        cancelled = await _queued(gate)
+        waiting = await _queued(gate)
+        cancelled.cancel()
+        # Before the cancelled task has run its except block
+        gate.release()
+        await asyncio.wait_for(waiting, 1)
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        return gate.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["in_flight"] == 1
+    assert stats["queued"] == {}
+
+
+def test_release_with_only_cancelled_waiters_frees_the_slot():
+    async def scenario():
+        gate = ModelGate("m", concurrency=1)
+        await gate.aacquire("g", 1)
+        cancelled = await _queued(gate)
+        cancelled.cancel()
+        gate.release()
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        await asyncio.wait_for(gate.aacquire("g", 1), 1)
+        return gate.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["in_flight"] == 1
+    assert stats["queued"] == {}
+
+
+def test_cancel_after_grant_passes_the_slot_on():
+    async def scenario():
+        gate = ModelGate("m", concurrency=1)
+        await gate.aacquire("g", 1)
+        granted = await _queued(gate)
+        waiting = await _queued(gate)
+        gate.release()  # grants `granted`, which is cancelled before it resumes
+        granted.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await granted
+        await asyncio.wait_for(waiting, 1)
+        return gate.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["in_flight"] == 1
+    assert stats["queued"] == {}
+
+
+class _SlowGateRegistry(LLMRegistry):
+    def gate(self, model):
+        time.sleep(0.01)  # widen the window between the lookup and the insert
+        return super().gate(model)
+
+
+def test_registry_builds_one_handle_per_key_across_threads():
+    registry, start, handles = _SlowGateRegistry(), threading.Barrier(16), []
+
+    def get():
+        start.wait()
+        handles.append(registry.get("gpt-4o-mini", "g", temperature=0))
+
+    threads = [threading.Thread(target=get) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({id(handle) for handle in handles}) == 1
+    assert handles[0].gate is registry.gate("gpt-4o-mini")
@@ -0,0 +1,60 @@
+import math
+
+import numpy as np
+import pytest
+
+from agent_runtime.semantic import HashingEmbedder, SemanticCache
+
+
+class AngleEmbedder:
+    """2-d unit vectors at the angle given by the text ("0.3" -> cos 0.3, sin 0.3)."""
+
+    name = "angle"
+    dim = 2
+
+    def embed(self, texts):
+        return np.array([[math.cos(float(t)), math.sin(float(t))] for t in texts], dtype=np.float32)
+
+
+def _namespace(threshold, embedder=None, **kwargs):
+    return SemanticCache(threshold=threshold, embedder=embedder or AngleEmbedder(), **kwargs).namespace("g")
+
+
+@pytest.mark.parametrize("angle, hit", [(0.0, True), (0.44, True), (0.46, False), (1.5, False)])
+def test_hit_needs_threshold_similarity(angle, hit):
+    ns = _namespace(threshold=math.cos(0.45))
+    ns.store("0", "cached answer")
+
+    found = ns.lookup(str(angle))
+    assert (found is not None) == hit
+    if hit:
+        assert found.answer == "cached answer"
+        assert found.similarity == pytest.approx(math.cos(angle), abs=1e-6)
+    assert ns.stats()["hits"] == int(hit)
+
+
+def test_best_match_above_threshold_wins():
+    ns = _namespace(threshold=0.9)
+    ns.store("0", "zero")
+    ns.store("0.3", "point three")
+
+    assert ns.lookup("0.25").answer == "point three"
+    assert ns.lookup("0.05").answer == "zero"
+
+
+def test_expired_entries_do_not_hit():
+    ns = _namespace(threshold=0.9, ttl=60)
+    ns.store("0", "old")
+    ns._entries[0]["created"] -= 61
+
+    assert ns.lookup("0") is None
+    assert ns.stats()["expirations"] == 1
+
+
+def test_default_embedder_separates_paraphrases_from_negations():
+    ns = _namespace(threshold=0.9, embedder=HashingEmbedder())
+    ns.store("Should I buy an electric car?", "yes")
+
+    assert ns.lookup("should i buy an electric car please") is not None
+    assert ns.lookup("Should I not buy an electric car?") is None
+    assert ns.lookup("best pizza in Naples") is None
@@ -0,0 +1,118 @@
+import asyncio
+import time
+
+import pytest
+
+from agent_runtime import deadline
+from agent_runtime.singleflight import SingleFlight
+
+KEY = ("invoke", "same prompt")
+
+
+def _upstream(seen: list, seconds: float = 0.2):
+    async def call():
+        seen.append(deadline.remaining())
+        await asyncio.sleep(seconds)
+        return "reply"
+
+    return call
+
+
+async def _caller(flights: SingleFlight, fn, seconds=None):
+    deadline.enter(time.time() + seconds if seconds is not None else None)
+    return await flights.acall(KEY, fn, "g", "m", deadline.timeout())
+
+
+def test_leader_deadline_does_not_apply_to_joined_callers():
+    async def scenario():
+        flights, seen = SingleFlight(), []
+        leader = asyncio.ensure_future(_caller(flights, _upstream(seen), seconds=0.05))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(_caller(flights, _upstream(seen)))
+        return await asyncio.gather(leader, follower, return_exceptions=True), seen
+
+    (leader, follower), seen = asyncio.run(scenario())
+    assert isinstance(leader, TimeoutError)
+    assert follower == "reply"
+    assert seen == [None]  # one upstream call, run without the leader's deadline
+
+
+def test_joined_caller_is_bounded_by_its_own_deadline():
+    async def scenario():
+        flights, seen = SingleFlight(), []
+        leader = asyncio.ensure_future(_caller(flights, _upstream(seen)))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(_caller(flights, _upstream(seen), seconds=0.05))
+        return await asyncio.gather(leader, follower, return_exceptions=True)
+
+    leader, follower = asyncio.run(scenario())
+    assert leader == "reply"
+    assert isinstance(follower, TimeoutError)
+
+
+def test_upstream_call_is_cancelled_once_every_caller_gave_up():
+    async def scenario():
+        flights, seen = SingleFlight(), []
+        callers = [asyncio.ensure_future(_caller(flights, _upstream(seen, 5), seconds=0.05)) for _ in range(2)]
+        results = await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0.01)
+        return results, flights.stats()["in_flight"]
+
+    results, in_flight = asyncio.run(scenario())
+    assert all(isinstance(r, TimeoutError) for r in results)
+    assert in_flight == 0
+
+
+def test_deadline_passed_before_joining():
+    with pytest.raises(deadline.DeadlineExceeded):
+        asyncio.run(_caller(SingleFlight(), _upstream([]), seconds=-1))
+
+
+def _sync_upstream(seen: list, seconds: float = 0.3):
+    def call():
+        seen.append(deadline.remaining())
+        time.sleep(seconds)
+        return "reply"
+
+    return call
+
+
+def _sync_caller(flights: SingleFlight, fn, seconds=None, out=None):
+    deadline.enter(time.time() + seconds if seconds is not None else None)
+    try:
+        out.append(flights.call(KEY, fn, "g", "m", deadline.timeout()))
+    except TimeoutError as e:
+        out.append(e)
+
+
+def test_sync_leader_deadline_does_not_apply_to_joined_callers():
+    import threading
+
+    flights, seen, leader, follower = SingleFlight(), [], [], []
+    first = threading.Thread(target=_sync_caller, args=(flights, _sync_upstream(seen), 0.05, leader))
+    first.start()
+    time.sleep(0.02)
+    second = threading.Thread(target=_sync_caller, args=(flights, _sync_upstream(seen), None, follower))
+    second.start()
+    first.join()
+    second.join()
+    assert isinstance(leader[0], TimeoutError)
+    assert follower == ["reply"]
+    assert seen == [None]
+
+
+def test_sync_stream_stops_once_every_reader_left():
+    flights, produced = SingleFlight(), []
+
+    def chunks():
+        for i in range(100):
+            produced.append(i)
+            time.sleep(0.01)
+            yield i
+
+    stream = flights.stream(KEY, chunks, "g", "m", 1)
+    assert next(stream) == 0
+    stream.close()
+    time.sleep(0.1)
+    assert len(produced) < 10
+    assert flights.stats()["in_flight"] == 0
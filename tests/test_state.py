@@ -0,0 +1,59 @@
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage
+
+from agent_runtime.state import SUMMARY_HEADER, SUMMARY_ID, Conversation, last_user_text, message_window
+
+
+def _turns(reducer, count):
+    value = []
+    for i in range(count):
+        value = reducer(value, [HumanMessage(content=f"question {i}", id=f"h{i}")])
+        value = reducer(value, [AIMessage(content=f"answer {i}", id=f"a{i}")])
+    return value
+
+
+def test_keeps_newest_whole_turns_and_folds_the_rest_into_a_summary():
+    value = _turns(message_window(max_messages=4, max_tokens=0, summary_tokens=800), 5)
+
+    summary, *kept = value
+    assert summary.id == SUMMARY_ID
+    assert [m.content for m in kept] == ["question 3", "answer 3", "question 4", "answer 4"]
+    assert summary.content.splitlines() == [
+        SUMMARY_HEADER,
+        *(line for i in range(3) for line in (f"- user: question {i}", f"- assistant: answer {i}")),
+    ]
+
+
+def test_summary_is_capped_oldest_lines_first():
+    # 10 tokens = 40 chars: room for "- assistant: answer 4" (21 + newline), not one more line
+    value = _turns(message_window(max_messages=2, max_tokens=0, summary_tokens=10), 6)
+
+    assert value[0].content.splitlines()[1:] == ["- assistant: answer 4"]
+
+
+def test_latest_turn_is_kept_whole_over_the_caps():
+    reducer = message_window(max_messages=1, max_tokens=5, summary_tokens=0)
+    value = _turns(reducer, 2)
+    value = reducer(value, [AIMessage(content="a long answer " * 50, id="a1-more")])
+
+    # No summary with summary_tokens=0; the last turn is kept although it is over both caps
+    assert [m.id for m in value] == ["h1", "a1", "a1-more"]
+
+
+def test_merges_like_add_messages():
+    reducer = message_window(max_messages=10, max_tokens=0)
+    value = _turns(reducer, 2)
+    value = reducer(value, [AIMessage(content="edited", id="a0"), RemoveMessage(id="h1")])
+
+    assert [(m.id, m.content) for m in value] == [("h0", "question 0"), ("a0", "edited"), ("a1", "answer 1")]
+
+
+def test_last_user_text_follows_the_latest_human_message():
+    reducer = message_window(max_messages=2, max_tokens=0)
+    value = _turns(reducer, 3)
+    assert isinstance(value, Conversation)
+    assert last_user_text({"messages": value}) == "question 2"
+
+    # Restored from a checkpoint as a plain list: the index is rebuilt on the next update
+    value = reducer(list(value), [AIMessage(content="more", id="a2-more")])
+    assert last_user_text({"messages": value}) == "question 2"
+    assert last_user_text({"messages": [], "topic": "shoes"}, "topic") == "shoes"
@@ -0,0 +1,305 @@
+import crypto from 'crypto';
+import fs from 'fs';
+import path from 'path';
+
+// Index of the agents in agents/ for /api/agents: one entry per agent folder
+// (name, mtime, size, content hash, registered in the root langgraph.json),
+// kept up to date incrementally. Files are re-read and re-hashed only when
+// their mtime or size changed; the code itself is read only when one agent
+// is requested. Listings are served from the index and revalidated in the
+// background (stale-while-revalidate), so their cost does not grow with the
+// number of agents; saves and deletes made through the API update it at once.
+//
+// Writes to the root langgraph.json go through one FIFO queue: each update
+// reads the current file, applies its change and replaces the file
+// atomically (temp file + rename), so concurrent saves cannot lose each
+// other's registrations.
+
+const AGENTS_DIR = process.env.AGENTS_DIR || '/app/agents';
+const ROOT_CONFIG = process.env.ROOT_CONFIG || '/app/langgraph.json';
+// Index older than this is revalidated in the background on the next listing
+const REVALIDATE_MS = Number(process.env.AGENTS_REVALIDATE_MS || 2000);
+// Files stat'ed / read at once during a rescan
+const SCAN_CONCURRENCY = 32;
+const FILES = ['agent.py', 'langgraph.json'];
+const NAME = /^[A-Za-z0-9_][A-Za-z0-9_.-]*$/;
+
+export const isValidName = (name) => typeof name === 'string' && NAME.test(name) && name.length <= 100;
+
+const graphPath = (name) => `./agents/${name}/agent.py:app`;
+
+// A missing file, or a path through something that is not a directory
+const statOrNull = async (file) => {
+  try {
+    return await fs.promises.stat(file);
+  } catch (e) {
+    if (e.code === 'ENOENT' || e.code === 'ENOTDIR') return null;
+    throw e;
+  }
+};
+
+const readOrEmpty = async (file, fallback = '') => {
+  try {
+    return await fs.promises.readFile(file, 'utf8');
+  } catch (e) {
+    if (e.code === 'ENOENT') return fallback;
+    throw e;
+  }
+};
+
+// Run `fn` over `items` with at most `limit` calls in flight
+const mapLimit = async (items, limit, fn) => {
+  const results = new Array(items.length);
+  let next = 0;
+  const worker = async () => {
+    while (next < items.length) {
+      const i = next++;
+      results[i] = await fn(items[i], i);
+    }
+  };
+  await Promise.all(Array.from({ length: Math.min(limit, items.length) }, worker));
+  return results;
+};
+
+// Replace `file` with `data` atomically. A file bind-mounted on its own
+// (docker-compose mounts ./langgraph.json) cannot be renamed over: it is then
+// rewritten in place with a single write.
+export const writeAtomic = async (file, data) => {
+  const tmp = `${file}.${process.pid}.${crypto.randomBytes(4).toString('hex')}.tmp`;
+  const handle = await fs.promises.open(tmp, 'w');
+  try {
+    await handle.writeFile(data);
+    await handle.sync();
+  } finally {
+    await handle.close();
+  }
+  try {
+    await fs.promises.rename(tmp, file);
+  } catch (e) {
+    await fs.promises.unlink(tmp).catch(() => {});
+    if (!['EBUSY', 'EXDEV', 'EPERM'].includes(e.code)) throw e;
+    await fs.promises.writeFile(file, data);
+  }
+};
+
+const contentHash = (code, config) => crypto.createHash('sha1').update(code).update('\0').update(config).digest('hex');
+
+// (mtime, size) of the files of one agent: unchanged means no need to re-read them
+const stamp = (stats) => stats.map((s) => (s ? `${s.mtimeMs}:${s.size}` : '-')).join('|');
+
+class AgentRegistry {
+  constructor(agentsDir = AGENTS_DIR, rootConfig = ROOT_CONFIG) {
+    this.agentsDir = agentsDir;
+    this.rootConfig = rootConfig;
+    this.entries = new Map();
+    this.sorted = null; // names in listing order, rebuilt when agents come or go
+    this.registered = new Set();
+    this.rootStamp = null;
+    // Changes with every change of the index; with the instance id, the base of the listing ETags
+    this.version = 0;
+    this.instance = crypto.randomBytes(4).toString('hex');
+    this.scannedAt = 0;
+    this.scanning = null;
+    this.queue = Promise.resolve();
+  }
+
+  agentDir(name) {
+    return path.join(this.agentsDir, name);
+  }
+
+  touch() {
+    this.version += 1;
+  }
+
+  // -- index -----------------------------------------------------------
+
+  async refreshAgent(name) {
+    const dir = this.agentDir(name);
+    const stats = await Promise.all(FILES.map((f) => statOrNull(path.join(dir, f))));
+    const current = this.entries.get(name);
+    const key = stamp(stats);
+    if (current && current.stamp === key) return current;
+    const [code, config] = await Promise.all(FILES.map((f, i) => (stats[i] ? readOrEmpty(path.join(dir, f)) : '')));
+    const hash = contentHash(code, config);
+    const mtime = Math.max(0, ...stats.filter(Boolean).map((s) => s.mtimeMs));
+    const entry = { name, path: dir, stamp: key, hash, size: Buffer.byteLength(code), mtime };
+    if (!current) this.sorted = null;
+    if (!current || current.hash !== hash || current.mtime !== mtime) this.touch();
+    this.entries.set(name, entry);
+    return entry;
+  }
+
+  forget(name) {
+    if (this.entries.delete(name)) {
+      this.sorted = null;
+      this.touch();
+    }
+  }
+
+  async refreshRootConfig() {
+    const stats = await statOrNull(this.rootConfig);
+    const key = stamp([stats]);
+    if (key === this.rootStamp) return;
+    const cfg = await this.readRootConfig();
+    this.rootStamp = key;
+    const names = new Set(Object.keys(cfg.graphs || {}));
+    const same = names.size === this.registered.size && [...names].every((n) => this.registered.has(n));
+    if (!same) {
+      this.registered = names;
+      this.touch();
+    }
+  }
+
+  async rescan() {
+    await fs.promises.mkdir(this.agentsDir, { recursive: true });
+    const dirents = await fs.promises.readdir(this.agentsDir, { withFileTypes: true });
+    const names = dirents.filter((d) => d.isDirectory()).map((d) => d.name);
+    const present = new Set(names);
+    for (const name of [...this.entries.keys()]) {
+      if (!present.has(name)) this.forget(name);
+    }
+    await mapLimit(names, SCAN_CONCURRENCY, (name) => this.refreshAgent(name));
+    await this.refreshRootConfig();
+    this.scannedAt = Date.now();
+  }
+
+  // Full scan on first use; later on, a stale index is served while it is revalidated
+  async ready() {
+    if (Date.now() - this.scannedAt > REVALIDATE_MS && !this.scanning) {
+      this.scanning = this.rescan().finally(() => {
+        this.scanning = null;
+      });
+      this.scanning.catch((e) => console.error('Agent index rescan failed:', e));
+    }
+    if (!this.scannedAt) await this.scanning;
+  }
+
+  names() {
+    if (!this.sorted) this.sorted = [...this.entries.keys()].sort();
+    return this.sorted;
+  }
+
+  summary(entry) {
+    return {
+      name: entry.name,
+      path: entry.path,
+      registered: this.registered.has(entry.name),
+      size: entry.size,
+      hash: entry.hash,
+      updated: new Date(entry.mtime).toISOString(),
+    };
+  }
+
+  // One page of the listing, without code
+  async list(offset = 0, limit = 100) {
+    await this.ready();
+    const names = this.names();
+    const page = names.slice(offset, offset + limit);
+    const next = offset + limit < names.length ? offset + limit : null;
+    return {
+      etag: `"${this.instance}-${this.version}-${offset}-${limit}"`,
+      body: {
+        agents: page.map((name) => this.summary(this.entries.get(name))),
+        total: names.length,
+        offset,
+        limit,
+        next,
+      },
+    };
+  }
+
+  // Code and config of one agent; `etag` is its content hash, checked against
+  // the files' mtime/size first so a matching If-None-Match reads nothing.
+  // `load` reads the files again, outside the write queue: its own `etag` is
+  // the hash of the bytes it returns, so a save in between cannot pair new
+  // code with the old hash.
+  async get(name) {
+    const stats = await statOrNull(this.agentDir(name));
+    if (!stats || !stats.isDirectory()) {
+      this.forget(name);
+      return null;
+    }
+    const entry = await this.refreshAgent(name);
+    return {
+      etag: `"${entry.hash}"`,
+      load: async () => {
+        const [code, config] = await Promise.all([
+          readOrEmpty(path.join(entry.path, 'agent.py')),
+          readOrEmpty(path.join(entry.path, 'langgraph.json'), null),
+        ]);
+        const hash = contentHash(code, config ?? '');
+        return {
+          etag: `"${hash}"`,
+          body: { ...this.summary(entry), hash, size: Buffer.byteLength(code), code, config: config ?? '{}' },
+        };
+      },
+    };
+  }
+
+  // -- writes ----------------------------------------------------------
+
+  // Serialize `fn` after every update queued before it
+  enqueue(fn) {
+    const run = this.queue.then(fn);
+    this.queue = run.catch(() => {});
+    return run;
+  }
+
+  async readRootConfig() {
+    const raw = await readOrEmpty(this.rootConfig);
+    const cfg = raw.trim() ? JSON.parse(raw) : {};
+    if (!cfg.graphs) cfg.graphs = {};
+    return cfg;
+  }
+
+  // Apply `change` (mutates the config, returns false when it changed nothing)
+  // to the current root config; the file is only rewritten when it changed.
+  async updateRootConfig(change) {
+    await fs.promises.mkdir(path.dirname(this.rootConfig), { recursive: true });
+    const cfg = await this.readRootConfig();
+    if (change(cfg) !== false) {
+      await writeAtomic(this.rootConfig, JSON.stringify(cfg, null, 2));
+    }
+    this.rootStamp = null;
+    await this.refreshRootConfig();
+    return cfg;
+  }
+
+  save(name, code, config) {
+    return this.enqueue(async () => {
+      const dir = this.agentDir(name);
+      await fs.promises.mkdir(dir, { recursive: true });
+      await writeAtomic(path.join(dir, 'agent.py'), code || '');
+      await writeAtomic(path.join(dir, 'langgraph.json'), config || '{}');
+      const entry = await this.refreshAgent(name);
+      // Register into root langgraph.json so the API can discover it
+      const rootCfg = await this.updateRootConfig((cfg) => {
+        if (cfg.graphs[name] === graphPath(name)) return false;
+        cfg.graphs[name] = graphPath(name);
+        return true;
+      });
+      return { entry: this.summary(entry), rootCfg };
+    });
+  }
+
+  remove(name) {
+    return this.enqueue(async () => {
+      const dir = this.agentDir(name);
+      if (!(await statOrNull(dir))) return false;
+      // rm récursif (Node >=14.14)
+      await fs.promises.rm(dir, { recursive: true, force: true });
+      this.forget(name);
+      await this.updateRootConfig((cfg) => {
+        if (!(name in cfg.graphs)) return false;
+        delete cfg.graphs[name];
+        return true;
+      });
+      return true;
+    });
+  }
+}
+
+// One registry per server process (kept across hot reloads in `next dev`)
+export const registry = globalThis.__agentRegistry || (globalThis.__agentRegistry = new AgentRegistry());
+
+export default AgentRegistry;
@@ -1,108 +1,80 @@
-import fs from 'fs';
-import path from 'path';
+import { isValidName, registry } from '../../lib/agentRegistry';
 
-export default function handler(req, res) {
-  const agentsDir = '/app/agents';
-  const rootConfigPath = '/app/langgraph.json';
+// GET    /api/agents?offset=0&limit=100   listing (no code), paginated, ETag
+// GET    /api/agents?name=foo             code and config of one agent, ETag
+// POST   /api/agents {name, code, config} save and register in the root langgraph.json
+// DELETE /api/agents?name=foo             delete and unregister
+// The agents are indexed by lib/agentRegistry.js.
 
-  const upsertRootConfig = (name) => {
-    try {
-      // Ensure parent dir exists (should be /app mounted)
-      const dir = path.dirname(rootConfigPath);
-      if (!fs.existsSync(dir)) {
-        fs.mkdirSync(dir, { recursive: true });
-      }
-      let rootCfg = { graphs: {} };
-      if (fs.existsSync(rootConfigPath)) {
-        const raw = fs.readFileSync(rootConfigPath, 'utf8');
-        rootCfg = raw ? JSON.parse(raw) : { graphs: {} };
-      }
-      if (!rootCfg.graphs) rootCfg.graphs = {};
-      rootCfg.graphs[name] = `./agents/${name}/agent.py:app`;
-      fs.writeFileSync(rootConfigPath, JSON.stringify(rootCfg, null, 2));
-      return { ok: true, rootCfg };
-    } catch (e) {
-      console.error('Failed to update langgraph.json:', e);
-      return { ok: false, error: e?.message || String(e) };
-    }
-  };
+const MAX_LIMIT = 1000;
 
-  const removeFromRootConfig = (name) => {
-    try {
-      if (!fs.existsSync(rootConfigPath)) return;
-      const rootCfg = JSON.parse(fs.readFileSync(rootConfigPath, 'utf8'));
-      if (rootCfg.graphs && rootCfg.graphs[name]) {
-        delete rootCfg.graphs[name];
-        fs.writeFileSync(rootConfigPath, JSON.stringify(rootCfg, null, 2));
-      }
-    } catch (e) {
-      console.error('Failed to update langgraph.json:', e);
-    }
-  };
-  
+const intParam = (value, fallback, max) => {
+  const n = Number.parseInt(Array.isArray(value) ? value[0] : value, 10);
+  return Number.isNaN(n) || n < 0 ? fallback : Math.min(n, max);
+};
+
+// 304 when the client already has this version
+const notModified = (req, res, etag) => {
+  res.setHeader('ETag', etag);
+  res.setHeader('Cache-Control', 'no-cache');
+  const sent = req.headers['if-none-match'];
+  if (sent && sent.split(',').some((t) => t.trim() === etag || t.trim() === `W/${etag}`)) {
+    res.status(304).end();
+    return true;
+  }
+  return false;
+};
+
+export default async function handler(req, res) {
   if (req.method === 'GET') {
-    // Liste tous les agents
+    const { name } = req.query;
     try {
-      if (!fs.existsSync(agentsDir)) {
-        fs.mkdirSync(agentsDir, { recursive: true });
+      if (name !== undefined) {
+        // Un seul agent, avec son code
+        if (!isValidName(name)) {
+          return res.status(400).json({ error: 'Invalid agent name' });
+        }
+        const agent = await registry.get(name);
+        if (!agent) {
+          return res.status(404).json({ error: 'Agent not found' });
+        }
+        if (notModified(req, res, agent.etag)) return;
+        const { etag, body } = await agent.load();
+        res.setHeader('ETag', etag);
+        return res.status(200).json(body);
       }
-      
-      const agents = fs.readdirSync(agentsDir)
-        .filter(file => fs.statSync(path.join(agentsDir, file)).isDirectory())
-        .map(name => {
-          const agentPath = path.join(agentsDir, name);
-          let code = '';
-          let config = '{}';
-          
-          try {
-            if (fs.existsSync(path.join(agentPath, 'agent.py'))) {
-              code = fs.readFileSync(path.join(agentPath, 'agent.py'), 'utf8');
-            }
-            if (fs.existsSync(path.join(agentPath, 'langgraph.json'))) {
-              config = fs.readFileSync(path.join(agentPath, 'langgraph.json'), 'utf8');
-            }
-          } catch (err) {
-            console.error(`Error reading agent ${name}:`, err);
-          }
-          
-          return {
-            name,
-            code,
-            config,
-            path: agentPath
-          };
-        });
-      
-      res.status(200).json(agents);
+      // Liste des agents, sans le code
+      const offset = intParam(req.query.offset, 0, Number.MAX_SAFE_INTEGER);
+      const limit = intParam(req.query.limit, 100, MAX_LIMIT) || 100;
+      const page = await registry.list(offset, limit);
+      if (notModified(req, res, page.etag)) return;
+      res.status(200).json(page.body);
     } catch (error) {
       console.error('Error listing agents:', error);
       res.status(500).json({ error: error.message });
     }
-  } 
+  }
   else if (req.method === 'POST') {
     // Crée ou met à jour un agent
     try {
       const { name, code, config } = req.body;
-      
+
       if (!name) {
         return res.status(400).json({ error: 'Agent name is required' });
       }
-      
-      const agentDir = path.join(agentsDir, name);
-      
-      if (!fs.existsSync(agentDir)) {
-        fs.mkdirSync(agentDir, { recursive: true });
+      if (!isValidName(name)) {
+        return res.status(400).json({ error: 'Invalid agent name (letters, digits, _ . -)' });
       }
-      
-      fs.writeFileSync(path.join(agentDir, 'agent.py'), code || '');
-      fs.writeFileSync(path.join(agentDir, 'langgraph.json'), config || '{}');
-      // Register into root langgraph.json so the API can discover it
-      const result = upsertRootConfig(name);
-      if (!result.ok) {
-        return res.status(500).json({ success: false, message: 'Agent saved but failed to register in root langraph.json', error: result.error });
+
+      let result;
+      try {
+        result = await registry.save(name, code, config);
+      } catch (e) {
+        console.error('Failed to save or register agent:', e);
+        return res.status(500).json({ success: false, message: 'Failed to save or register the agent in root langgraph.json', error: e?.message || String(e) });
       }
       // Echo back updated root config for observability
-      return res.status(200).json({ success: true, message: 'Agent saved and registered.', rootConfig: result.rootCfg });
+      return res.status(200).json({ success: true, message: 'Agent saved and registered.', agent: result.entry, rootConfig: result.rootCfg });
     } catch (error) {
       console.error('Error saving agent:', error);
       res.status(500).json({ error: error.message });
@@ -115,13 +87,12 @@ export default function handler(req, res) {
       if (!name || typeof name !== 'string') {
         return res.status(400).json({ error: 'Agent name is required' });
       }
-      const agentDir = path.join(agentsDir, name);
-      if (!fs.existsSync(agentDir)) {
+      if (!isValidName(name)) {
+        return res.status(400).json({ error: 'Invalid agent name' });
+      }
+      if (!(await registry.remove(name))) {
         return res.status(404).json({ error: 'Agent not found' });
       }
-      // rm récursif (Node >=14.14)
-      fs.rmSync(agentDir, { recursive: true, force: true });
-      removeFromRootConfig(name);
       return res.status(200).json({ success: true, message: 'Agent deleted and unregistered. Restart API to apply.' });
     } catch (error) {
       console.error('Error deleting agent:', error);
@@ -17,15 +17,16 @@ export default function AgentStudio() {
 
   const agentTemplate = `from typing import TypedDict, Annotated
 from langgraph.graph import StateGraph, END
-from langgraph.graph.message import add_messages
-from langchain_openai import ChatOpenAI
+from agent_runtime import get_llm, instrument
+from agent_runtime.state import bounded_messages
+
+llm = get_llm("gpt-3.5-turbo")
 
 class State(TypedDict):
-    messages: Annotated[list, add_messages]
+    messages: Annotated[list, bounded_messages]
 
 def agent_node(state: State):
     """Nœud principal de l'agent"""
-    llm = ChatOpenAI(model="gpt-3.5-turbo")
     response = llm.invoke(state["messages"])
     return {"messages": [response]}
 
@@ -35,8 +36,8 @@ graph.add_node("agent", agent_node)
 graph.set_entry_point("agent")
 graph.add_edge("agent", END)
 
-# Compilation
-app = graph.compile()
+# Compilation (instrument: métriques par nœud sur /runtime/metrics)
+app = instrument(graph).compile()
 `;
 
   const configTemplate = `{
@@ -54,13 +55,38 @@ app = graph.compile()
 
   const loadAgents = async () => {
     try {
-      const response = await axios.get('/api/agents');
-      setAgents(response.data);
+      // Liste paginée, sans le code (chargé à la sélection d'un agent)
+      const all = [];
+      let offset = 0;
+      while (offset !== null) {
+        const response = await axios.get('/api/agents', { params: { offset, limit: 500 } });
+        all.push(...response.data.agents);
+        offset = response.data.next;
+      }
+      setAgents(all);
     } catch (error) {
       console.error('Error loading agents:', error);
     }
   };
 
+  const selectAgent = async (agent) => {
+    setSelectedAgent(agent);
+    try {
+      // Réponse revalidée par ETag: le code n'est retransmis que s'il a changé
+      const response = await axios.get('/api/agents', { params: { name: agent.name } });
+      setCode(response.data.code);
+      setConfig(response.data.config);
+    } catch (error) {
+      if (agent.code !== undefined) {
+        // Agent pas encore sauvegardé
+        setCode(agent.code);
+        setConfig(agent.config);
+      } else {
+        addLog(`Erreur chargement de ${agent.name}: ${error.message}`, 'error');
+      }
+    }
+  };
+
   const createNewAgent = () => {
     const name = prompt("Nom de l'agent:");
     if (name) {
@@ -245,11 +271,7 @@ app = graph.compile()
             {agents.map((agent, idx) => (
               <div
                 key={idx}
-                onClick={() => {
-                  setSelectedAgent(agent);
-                  setCode(agent.code);
-                  setConfig(agent.config);
-                }}
+                onClick={() => selectAgent(agent)}
                 className={`p-2 rounded cursor-pointer hover:bg-gray-700 transition-colors ${
                   selectedAgent?.name === agent.name ? 'bg-gray-700' : ''
                 }`}